@@ -0,0 +1,285 @@
+"""
+Buffered ActivityLog / AuditLog writes.
+
+log_activity() and log_audit() append to an in-process buffer instead of
+inserting inside the request. The buffer is written with bulk_create once it
+reaches ACTIVITY_LOG_BUFFER_SIZE entries, every ACTIVITY_LOG_FLUSH_INTERVAL
+seconds from a background thread, at request end through
+ActivityLogMiddleware, and at interpreter exit.
+
+Every entry is also appended to a journal file before it is buffered. Each
+buffer names its journal after the process id and a random token, so a
+restarted process that is given a dead one's pid never appends to, rotates
+or deletes the dead process's journal. A flush rotates the journal and
+deletes it once the rows are committed, so entries of a process that died
+before flushing are replayed by recover_journals() on the next start. Delivery is at least once: a crash
+between the commit and the journal delete replays those entries again.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog, AuditLog
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'activity': ActivityLog, 'audit': AuditLog}
+
+# Journal tokens of the buffers open in this process.
+_live_tokens = set()
+
+
+def _describe(obj):
+    if obj is None:
+        return '', ''
+    return obj.__class__.__name__, str(obj.pk)
+
+
+def log_activity(user, action, obj=None):
+    """Record that `user` did `action`, optionally on `obj`."""
+    object_type, object_id = _describe(obj)
+    _record({
+        'model': 'activity',
+        'user_id': getattr(user, 'pk', user),
+        'action': action,
+        'related_object_type': object_type,
+        'related_object_id': object_id,
+        'timestamp': timezone.now().isoformat(),
+    })
+
+
+def log_audit(user, action, obj):
+    """Record an audited change of `obj` by `user`."""
+    model_name, object_id = _describe(obj)
+    _record({
+        'model': 'audit',
+        'user_id': getattr(user, 'pk', user),
+        'action': action,
+        'model_name': model_name,
+        'object_id': object_id,
+        'created_at': timezone.now().isoformat(),
+    })
+
+
+def _record(entry):
+    if settings.ACTIVITY_LOG_BUFFERED:
+        get_buffer().add(entry)
+    else:
+        write_entries([entry])
+
+
+def _instance(entry):
+    fields = dict(entry)
+    model = MODELS[fields.pop('model')]
+    for name in ('timestamp', 'created_at'):
+        if name in fields:
+            fields[name] = parse_datetime(fields[name])
+    return model(**fields)
+
+
+def write_entries(entries):
+    """bulk_create a list of journal entries, one INSERT batch per model."""
+    by_model = {}
+    for entry in entries:
+        instance = _instance(entry)
+        by_model.setdefault(type(instance), []).append(instance)
+    with transaction.atomic():
+        for model, instances in by_model.items():
+            model.objects.bulk_create(instances, batch_size=500)
+    return len(entries)
+
+
+class LogBuffer:
+    """Thread-safe, journal-backed buffer of pending log entries."""
+
+    def __init__(self, size=None, interval=None, journal_dir=None):
+        self.size = size or settings.ACTIVITY_LOG_BUFFER_SIZE
+        self.interval = interval or settings.ACTIVITY_LOG_FLUSH_INTERVAL
+        self.journal_dir = journal_dir if journal_dir is not None else settings.ACTIVITY_LOG_JOURNAL_DIR
+        self.entries = []
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._sequence = 0
+        self.token = uuid.uuid4().hex
+        self._thread = None
+        self._stopped = threading.Event()
+        if self.journal_dir:
+            Path(self.journal_dir).mkdir(parents=True, exist_ok=True)
+            _live_tokens.add(self.token)
+            self._journal = self._open_journal()
+
+    def _journal_path(self):
+        return Path(self.journal_dir) / f"{os.getpid()}-{self.token}.jsonl"
+
+    def _open_journal(self):
+        return open(self._journal_path(), 'a', encoding='utf-8')
+
+    def add(self, entry):
+        with self._lock:
+            if self._journal:
+                self._journal.write(json.dumps(entry) + "\n")
+                self._journal.flush()
+            self.entries.append(entry)
+            full = len(self.entries) >= self.size
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def due(self):
+        return bool(self.entries) and (
+            len(self.entries) >= self.size or time.monotonic() - self.last_flush >= self.interval
+        )
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of entries written."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self.entries = self.entries, []
+                self.last_flush = time.monotonic()
+                rotated = self._rotate_journal() if entries else None
+            if not entries:
+                return 0
+            try:
+                write_entries(entries)
+            except Exception:
+                logger.exception("Flushing %d log entries failed; keeping them buffered", len(entries))
+                with self._lock:
+                    if self._journal:
+                        self._journal.writelines(json.dumps(entry) + "\n" for entry in entries)
+                        self._journal.flush()
+                    self.entries[:0] = entries
+                if rotated:
+                    rotated.unlink()
+                return 0
+            if rotated:
+                rotated.unlink()
+            return len(entries)
+
+    def _rotate_journal(self):
+        if not self._journal:
+            return None
+        self._journal.close()
+        self._sequence += 1
+        rotated = self._journal_path().with_suffix(f".{self._sequence}.flushing")
+        self._journal_path().rename(rotated)
+        self._journal = self._open_journal()
+        return rotated
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="activity-log-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush_if_due()
+            except Exception:
+                logger.exception("Activity log flusher failed")
+            finally:
+                close_old_connections()
+
+    def close(self):
+        """
+        Stop the flusher thread and write out what is left. If that write
+        fails the journal is kept, for the next process to replay.
+        """
+        self._stopped.set()
+        self.flush()
+        with self._lock:
+            if not self._journal:
+                return
+            self._journal.close()
+            self._journal = None
+            if not self.entries:
+                self._journal_path().unlink(missing_ok=True)
+                _live_tokens.discard(self.token)
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill() would terminate the process on Windows; assume alive.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_journals(journal_dir=None, force=False):
+    """
+    Replay journals left behind by processes that exited without flushing.
+    With force=True every journal is replayed, whoever owned it; only do that
+    when no web process is running.
+    """
+    journal_dir = journal_dir or settings.ACTIVITY_LOG_JOURNAL_DIR
+    if not journal_dir or not Path(journal_dir).is_dir():
+        return 0
+    recovered = 0
+    for path in sorted(Path(journal_dir).iterdir()):
+        # {pid}-{token}.jsonl, or {pid}.jsonl as written before tokens.
+        pid, _, token = path.name.split('.', 1)[0].partition('-')
+        pid = int(pid)
+        if token in _live_tokens:
+            continue
+        # Our own pid on a journal we did not open is an earlier process's.
+        if not force and pid != os.getpid() and _pid_alive(pid):
+            continue
+        with open(path, encoding='utf-8') as journal:
+            # A torn last line means the process died mid-write; skip it.
+            entries = []
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping unreadable journal line in %s", path)
+        if entries:
+            recovered += write_entries(entries)
+        path.unlink()
+    return recovered
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The process-wide buffer, created (and old journals replayed) on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            try:
+                recover_journals()
+            except Exception:
+                logger.exception("Replaying activity log journals failed")
+            _buffer = LogBuffer()
+            atexit.register(_buffer.close)
+        return _buffer
+
+
+def close_buffer():
+    """Flush and close the process-wide buffer, if there is one."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.close()
@@ -1,3 +1,248 @@
-from django.contrib import admin
+import itertools
 
-# Register your models here.
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.forms import UserChangeForm as BaseUserChangeForm
+from django.core.files.uploadedfile import UploadedFile
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .bulk_users import csv_lines, export_rows, file_format, import_users
+from .keyset import InvalidCursor, approximate_count, keyset_page
+from .models import ActivityLog, AuditLog, Notification, NotificationBatch, Trash, User
+
+CURSOR_VAR = 'cursor'
+
+
+class ImportUsersForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with a header row; username is required.")
+    role = forms.ChoiceField(choices=User.ROLE_CHOICES, initial='student', help_text="For rows without a role.")
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        try:
+            self.format = file_format(upload.name)
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
+        return upload
+
+
+class UserChangeForm(BaseUserChangeForm):
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        self.cleaned_image = None
+        if isinstance(image, UploadedFile):
+            # Imported here so Pillow loads with the first upload, not at startup.
+            from .profile_images import clean_upload
+
+            self.cleaned_image = clean_upload(image)
+        return image
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    form = UserChangeForm
+    change_list_template = 'admin/AuthApp/user/change_list.html'
+    list_display = ('username', 'email', 'first_name', 'last_name', 'role', 'sub_role', 'is_active')
+    list_filter = ('role', 'sub_role', 'is_active', 'is_staff')
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ("Role", {'fields': ('role', 'sub_role', 'is_temporary')}),
+        ("Profile", {'fields': ('image', 'bio', 'date_of_birth', 'phone', 'gender', 'location', 'country')}),
+    )
+    add_fieldsets = BaseUserAdmin.add_fieldsets + (
+        ("Role", {'fields': ('role', 'sub_role')}),
+    )
+    actions = ['export_csv']
+
+    def save_model(self, request, obj, form, change):
+        # The image is saved by set_profile_image(), re-encoded and with
+        # variants, rather than as uploaded; the form left it on obj.
+        image_changed = change and 'image' in form.changed_data
+        if image_changed:
+            obj.image = form.initial.get('image')
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            from .profile_images import remove_profile_image, set_profile_image
+
+            if form.cleaned_image:
+                set_profile_image(obj, form.cleaned_data['image'], form.cleaned_image)
+            else:
+                remove_profile_image(obj)
+
+    @admin.action(description="Export selected users as CSV")
+    def export_csv(self, request, queryset):
+        response = StreamingHttpResponse(csv_lines(export_rows(queryset)), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="users.csv"'
+        return response
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='AuthApp_user_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:AuthApp_user_changelist')
+        form = ImportUsersForm(request.POST or None, request.FILES or None)
+        result = None
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_users(upload.file, form.format, default_role=form.cleaned_data['role'])
+            except ValueError as exc:
+                form.add_error('file', str(exc))
+            else:
+                self.message_user(request, f"Created {result.created} user(s).", messages.SUCCESS)
+                if result.reset_tokens:
+                    self.message_user(
+                        request,
+                        f"{len(result.reset_tokens)} user(s) were created without a password "
+                        "and must set one through password reset.",
+                        messages.WARNING,
+                    )
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'title': "Import users",
+            'form': form,
+            'result': result,
+        }
+        return TemplateResponse(request, 'admin/AuthApp/user/import.html', context)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    A changelist paged by keyset (see AuthApp.keyset) instead of OFFSET, with
+    an estimated total instead of COUNT(*).
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing filters or search starts again from the first page.
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    def get_results(self, request):
+        model_admin = self.model_admin
+        try:
+            page = keyset_page(self.queryset, self.cursor, self.list_per_page, model_admin.keyset_fields)
+        except InvalidCursor as exc:
+            raise IncorrectLookupParameters(exc)
+
+        if self.queryset.query.where:
+            # Filtered: count only up to a limit, which stays cheap.
+            limit = model_admin.count_limit
+            self.result_count = min(self.queryset[:limit + 1].count(), limit + 1)
+            self.result_count_capped = self.result_count > limit
+            self.result_count_estimated = False
+        else:
+            self.result_count = approximate_count(self.model)
+            self.result_count_capped = False
+            self.result_count_estimated = True
+
+        self.result_list = page.object_list
+        self.next_url = page.next_cursor and self.get_query_string({CURSOR_VAR: page.next_cursor})
+        self.previous_url = page.previous_cursor and self.get_query_string({CURSOR_VAR: page.previous_cursor})
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = bool(page.next_cursor or page.previous_cursor)
+        self.paginator = None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin for append-heavy tables: keyset pages newest first on
+    keyset_fields (which need an index in that order), estimated counts,
+    and a streaming CSV export. Columns are not sortable, since any other
+    order would need OFFSET paging again.
+    """
+    change_list_template = 'admin/AuthApp/keyset_change_list.html'
+    keyset_fields = ('created_at', 'id')
+    count_limit = 1000
+    list_per_page = 100
+    sortable_by = ()
+    show_full_result_count = False
+    export_fields = None
+    actions = ['export_csv']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_export_fields(self):
+        return self.export_fields or [field.attname for field in self.model._meta.concrete_fields]
+
+    @admin.action(description="Export selected rows as CSV")
+    def export_csv(self, request, queryset):
+        fields = self.get_export_fields()
+        rows = queryset.order_by(*[f"-{field}" for field in self.keyset_fields]).values_list(*fields)
+        response = StreamingHttpResponse(
+            csv_lines(itertools.chain([fields], rows.iterator(chunk_size=2000))),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.model._meta.model_name}.csv"'
+        return response
+
+
+class ReadOnlyMixin:
+    """Log rows are written by the application, never edited by hand."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('created_at', 'user', 'message', 'is_read')
+    list_filter = ('is_read',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username',)
+
+
+@admin.register(NotificationBatch)
+class NotificationBatchAdmin(LargeTableAdmin):
+    list_display = ('created_at', '__str__', 'status', 'delivered', 'created_by', 'finished_at')
+    list_filter = ('status', 'role', 'sub_role')
+    list_select_related = ('created_by',)
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('status', 'delivered', 'last_user_id', 'error', 'finished_at')
+
+
+@admin.register(AuditLog)
+class AuditLogAdmin(ReadOnlyMixin, LargeTableAdmin):
+    list_display = ('created_at', 'user', 'action', 'model_name', 'object_id')
+    list_select_related = ('user',)
+    search_fields = ('=user__username',)
+
+
+@admin.register(ActivityLog)
+class ActivityLogAdmin(ReadOnlyMixin, LargeTableAdmin):
+    keyset_fields = ('timestamp', 'id')
+    list_display = ('timestamp', 'user', 'action', 'related_object_type', 'related_object_id')
+    list_select_related = ('user',)
+    search_fields = ('=user__username',)
+
+
+@admin.register(Trash)
+class TrashAdmin(ReadOnlyMixin, LargeTableAdmin):
+    keyset_fields = ('deleted_at', 'id')
+    list_display = ('deleted_at', 'model_name', 'object_id', 'batch', 'deleted_by')
+    list_select_related = ('deleted_by',)
+    export_fields = ('id', 'model_name', 'object_id', 'batch', 'deleted_by_id', 'deleted_at')
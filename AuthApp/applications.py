@@ -0,0 +1,327 @@
+"""
+Job application intake.
+
+Resumes are streamed, not buffered. ResumeUploadHandler writes each upload
+to a temporary file RESUME_UPLOAD_CHUNK_SIZE bytes at a time, hashing it as
+it goes, and drops it once it passes RESUME_MAX_BYTES, so a request holds
+one chunk of its resume in memory however large the file is. (Django holds
+up to FILE_UPLOAD_MAX_MEMORY_SIZE of each request body in memory before
+spilling to disk, under ASGI for every request in flight, so that setting
+is kept small too.)
+
+Storage is content-addressed: a resume is saved as
+resumes/<first two hex digits>/<sha256><extension>, and a file that is
+already there is not written again, so the same CV sent to fifty posts is
+stored once. Files are shared between applications and are never deleted
+with one.
+
+An address applies to a post once. The unique index on (lower(email), job)
+answers the duplicate check from its first entries instead of a scan, and
+also settles two concurrent submissions.
+
+Text is extracted after commit by a small thread pool (RESUME_TEXT_WORKERS,
+0 to extract inline) into ResumeText, once per digest, for screening.
+Plain text, DOCX and ODT are read with the standard library; PDF text uses
+pypdf when it is installed and a best-effort reader of the page content
+streams otherwise. The extract_resume_text job picks up anything the pool
+did not finish.
+"""
+import hashlib
+import io
+import logging
+import re
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Exists, OuterRef, Value
+from django.db.models.functions import Lower
+
+from .models import JobApplication, ResumeText
+
+logger = logging.getLogger(__name__)
+
+
+class ApplicationError(ValueError):
+    pass
+
+
+class DuplicateApplication(ApplicationError):
+    pass
+
+
+def _storage():
+    return JobApplication._meta.get_field('resume').storage
+
+
+# Uploads
+
+class ResumeUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams file uploads to temporary files, hashing them on the way, and
+    skips any larger than RESUME_MAX_BYTES. The finished file carries its
+    SHA-256 as .sha256. Install it before the request body is read.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = settings.RESUME_UPLOAD_CHUNK_SIZE
+        self.max_bytes = settings.RESUME_MAX_BYTES
+        # Fields whose file was too large.
+        self.skipped = []
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_bytes:
+            self.skipped.append(self.field_name)
+            self.file.close()
+            raise SkipFile()
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hash.hexdigest()
+        return file
+
+
+def digest_of(upload):
+    """The SHA-256 of an uploaded file, from the upload handler or by reading it in chunks."""
+    digest = getattr(upload, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        upload.seek(0)
+        for chunk in upload.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        upload.seek(0)
+    return digest
+
+
+def resume_name(digest, extension):
+    return f"resumes/{digest[:2]}/{digest}{extension}"
+
+
+def _extension(upload):
+    extension = PurePosixPath(upload.name or '').suffix.lower()
+    if extension not in settings.RESUME_EXTENSIONS:
+        raise ApplicationError(f"Resumes must be one of: {', '.join(settings.RESUME_EXTENSIONS)}.")
+    return extension
+
+
+def store_resume(upload):
+    """Save an uploaded resume under its digest, unless it is stored already. Returns (name, digest)."""
+    extension = _extension(upload)
+    if upload.size > settings.RESUME_MAX_BYTES:
+        raise ApplicationError("The resume is too large.")
+    digest = digest_of(upload)
+    name = resume_name(digest, extension)
+    storage = _storage()
+    if not storage.exists(name):
+        saved = storage.save(name, upload)
+        if saved != name:
+            # Stored meanwhile by a concurrent upload of the same file.
+            storage.delete(saved)
+    return name, digest
+
+
+# Intake
+
+def already_applied(job, email):
+    # Compared as the index stores it: iexact is a LIKE, which it cannot answer.
+    return JobApplication.objects.alias(email_key=Lower('applicant_email')).filter(
+        email_key=Lower(Value(email)), job=job,
+    ).exists()
+
+
+def apply(job, applicant_name, applicant_email, resume=None, applicant=None):
+    """
+    Record an application to `job`, storing `resume` (an uploaded file) if
+    given. Raises DuplicateApplication when the address has applied
+    already and ApplicationError when the post is not open or the resume
+    is refused. Returns the JobApplication.
+    """
+    if job.status != 'open':
+        raise ApplicationError("This job post is not open.")
+    # Checked before the resume is stored; the unique index has the final say.
+    if already_applied(job, applicant_email):
+        raise DuplicateApplication(f"{applicant_email} has already applied for {job.title}.")
+    name, digest = store_resume(resume) if resume is not None else (None, '')
+    try:
+        with transaction.atomic():
+            application = JobApplication.objects.create(
+                job=job, applicant=applicant, applicant_name=applicant_name, applicant_email=applicant_email,
+                resume=name, resume_digest=digest,
+            )
+            if digest:
+                transaction.on_commit(lambda: schedule_extraction(digest, name))
+    except IntegrityError:
+        raise DuplicateApplication(f"{applicant_email} has already applied for {job.title}.")
+    return application
+
+
+# Text extraction
+
+def _docx_text(archive, limit):
+    namespace = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+    root = ElementTree.fromstring(archive.open('word/document.xml').read(limit))
+    return "\n".join(
+        "".join(node.text or '' for node in paragraph.iter(f'{namespace}t'))
+        for paragraph in root.iter(f'{namespace}p')
+    )
+
+
+def _odt_text(archive, limit):
+    namespace = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+    root = ElementTree.fromstring(archive.open('content.xml').read(limit))
+    return "\n".join(
+        "".join(paragraph.itertext())
+        for paragraph in root.iter() if paragraph.tag in (f'{namespace}p', f'{namespace}h')
+    )
+
+
+# A string literal's body: escapes and one level of balanced parentheses.
+_STRING = rb'(?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*'
+_PDF_STREAM = re.compile(rb'<<(.{0,4096}?)>>\s*stream\r?\n(.*?)\r?\nendstream', re.S)
+_PDF_TEXT = re.compile(rb'\(' + _STRING + rb'\)\s*Tj|\[(?:\(' + _STRING + rb'\)|[^\]])*\]\s*TJ|T\*|Td|TD|\'|"', re.S)
+_PDF_STRING = re.compile(rb'\((' + _STRING + rb')\)', re.S)
+_PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def _pdf_unescape(raw):
+    def replace(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        return _PDF_ESCAPES.get(escaped, escaped)
+    return re.sub(rb'\\([0-7]{1,3}|.)', replace, raw, flags=re.S)
+
+
+def _pdf_text(data, limit):
+    try:
+        import pypdf
+    except ImportError:
+        pypdf = None
+    if pypdf is not None:
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        return "\n".join(page.extract_text() or '' for page in reader.pages)
+
+    # Text-showing operators of each content stream, in order. Enough for
+    # the simple single-byte fonts most CV exporters write.
+    lines = []
+    for header, stream in _PDF_STREAM.findall(data):
+        if b'/FlateDecode' in header:
+            try:
+                stream = zlib.decompressobj().decompress(stream, limit)
+            except zlib.error:
+                continue
+        line = []
+        for match in _PDF_TEXT.finditer(stream):
+            token = match.group(0)
+            if token.endswith((b'Tj', b'TJ')):
+                line.extend(_pdf_unescape(part) for part in _PDF_STRING.findall(token))
+            elif line:
+                lines.append(b"".join(line))
+                line = []
+        if line:
+            lines.append(b"".join(line))
+    return "\n".join(line.decode('latin-1') for line in lines)
+
+
+def extract_text(data, extension):
+    """The text of a resume's bytes, as well as can be read; '' for formats not understood."""
+    limit = settings.RESUME_TEXT_MAX_CHARS
+    if extension == '.txt':
+        text = data.decode('utf-8', errors='replace')
+    elif extension in ('.docx', '.odt'):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            # Read at most a few times the text limit, whatever the archive claims.
+            text = (_docx_text if extension == '.docx' else _odt_text)(archive, limit * 20)
+    elif extension == '.pdf':
+        text = _pdf_text(data, limit * 20)
+    else:
+        text = ''
+    return re.sub(r'[ \t]+', ' ', text).strip()[:limit]
+
+
+def extract_resume(digest, name):
+    """Extract and save the text of the stored resume `name`. Returns the ResumeText."""
+    try:
+        with _storage().open(name, 'rb') as file:
+            data = file.read()
+        text, error = extract_text(data, PurePosixPath(name).suffix), ''
+    except Exception as exc:
+        logger.warning("Cannot extract text from %s: %s", name, exc)
+        text, error = '', str(exc)[:200] or type(exc).__name__
+    resume, _ = ResumeText.objects.update_or_create(digest=digest, defaults={'text': text, 'error': error})
+    return resume
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = set()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.RESUME_TEXT_WORKERS, thread_name_prefix='resume-text')
+        return _pool
+
+
+def schedule_extraction(digest, name):
+    """Extract `name`'s text in the pool, or inline when RESUME_TEXT_WORKERS is 0. False if already queued."""
+    with _pool_lock:
+        if digest in _pending:
+            return False
+        _pending.add(digest)
+    if settings.RESUME_TEXT_WORKERS == 0:
+        _run(digest, name, close=False)
+    else:
+        _get_pool().submit(_run, digest, name)
+    return True
+
+
+def _run(digest, name, close=True):
+    try:
+        if not ResumeText.objects.filter(digest=digest).exists():
+            extract_resume(digest, name)
+    except Exception:
+        logger.exception("Extracting text from %s failed", name)
+    finally:
+        with _pool_lock:
+            _pending.discard(digest)
+        if close:
+            close_old_connections()
+
+
+def pending_extractions():
+    """(digest, name) of stored resumes without extracted text."""
+    return (
+        JobApplication.objects.exclude(resume_digest='')
+        .filter(~Exists(ResumeText.objects.filter(digest=OuterRef('resume_digest'))))
+        .order_by().values_list('resume_digest', 'resume').distinct()
+    )
+
+
+def extract_pending(limit=200):
+    """Extract the text of resumes that have none yet. Returns how many were extracted."""
+    extracted = 0
+    for digest, name in pending_extractions()[:limit]:
+        if ResumeText.objects.filter(digest=digest).exists():
+            continue
+        extract_resume(digest, name)
+        extracted += 1
+    return extracted
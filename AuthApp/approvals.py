@@ -0,0 +1,376 @@
+"""
+Approval workflow.
+
+An Approval names its target only by action_type and target_id. Each action
+type has a Handler (HANDLERS) that knows the target model, the permission
+needed to decide it, and what approving or rejecting does to the targets.
+
+inbox() lists pending approvals a page at a time, newest first, from
+approval_inbox_idx (status, action_type, timestamp, id): a page of one
+action type is read straight from the index, and a page of several sorts
+just the pending approvals of those types. The targets on the page are
+loaded with one in_bulk() query per action type, plus whatever each
+handler selects with them, instead of one query per row; each approval
+gets them as .target (None when the target is gone).
+
+approve() and reject() decide many approvals in batches of
+APPROVAL_BATCH_SIZE. Each batch is one transaction: the pending approvals
+are locked, their targets loaded as for the inbox, and each action type's
+handler runs once for all of its approvals in a savepoint. Handlers that
+have to act one target at a time (claiming a seat, approving leave) give
+each target a savepoint of its own, so one full course or clashing leave
+fails that approval alone. Approvals that could not be decided stay
+pending and are reported with the reason; the others are marked decided
+with one UPDATE.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import history
+from .activity import log_audit
+from .enrollments import approve_enrollment
+from .keyset import keyset_page
+from .leave import approve_leave, reject_leave
+from .ledger import post_entry
+from .models import Approval, Course, Enrollment, JobPost, LeaveRequest, User
+from .search import index_objects
+from .summaries import enrollments_changed, users_changed
+from .trash import trash_queryset
+
+
+class ApprovalError(ValueError):
+    pass
+
+
+# Handlers
+
+class Handler:
+    """
+    What deciding one action type does. approve() and reject() get every
+    approval of the type in a batch, each with its .target loaded, and
+    return {approval pk: reason} for those that failed.
+    """
+    model = None
+    permission = None
+    # Passed to select_related() when targets are loaded.
+    related = ()
+
+    def targets(self, ids):
+        """{target_id: target} for the `ids` that still exist, in one query."""
+        pk = self.model._meta.pk
+        keys = []
+        for value in ids:
+            try:
+                keys.append(pk.to_python(value))
+            except ValidationError:
+                pass
+        targets = self.model._base_manager.select_related(*self.related).in_bulk(keys)
+        return {str(key): target for key, target in targets.items()}
+
+    def approve(self, approvals, by):
+        return {}
+
+    def reject(self, approvals, by):
+        return {}
+
+
+class EachTarget(Handler):
+    """A handler that decides its targets one at a time, each in a savepoint."""
+
+    def approve_one(self, approval, by):
+        pass
+
+    def reject_one(self, approval, by):
+        pass
+
+    def _each(self, decide, approvals, by):
+        failed = {}
+        for approval in approvals:
+            try:
+                with transaction.atomic():
+                    decide(approval, by)
+            except ValueError as error:
+                failed[approval.pk] = str(error)
+        return failed
+
+    def approve(self, approvals, by):
+        return self._each(self.approve_one, approvals, by)
+
+    def reject(self, approvals, by):
+        return self._each(self.reject_one, approvals, by)
+
+
+def _trash(model, approvals, by):
+    trash_queryset(model._base_manager.filter(pk__in=[approval.target.pk for approval in approvals]), by)
+    return {}
+
+
+class AddCourse(Handler):
+    """Courses are created up front; a rejected one is trashed."""
+    model = Course
+    permission = 'AuthApp.review_requests'
+
+    def reject(self, approvals, by):
+        return _trash(Course, approvals, by)
+
+
+class DeleteCourse(Handler):
+    model = Course
+    permission = 'AuthApp.review_requests'
+
+    def approve(self, approvals, by):
+        return _trash(Course, approvals, by)
+
+
+class AddUser(Handler):
+    """Users are created inactive; approving activates them and rejecting trashes them."""
+    model = User
+    permission = 'AuthApp.add_user'
+
+    def approve(self, approvals, by):
+        users = [approval.target for approval in approvals if not approval.target.is_active]
+        for user in users:
+            user.is_active = True
+        history.bulk_update(users, ['is_active'])
+        # Written with an UPDATE, so the rollups and search are told here.
+        changes = {}
+        for user in users:
+            key = user.role, user.sub_role or ''
+            changes[key] = (0, changes.get(key, (0, 0))[1] + 1)
+        users_changed(changes)
+        index_objects(users)
+        return {}
+
+    def reject(self, approvals, by):
+        return _trash(User, approvals, by)
+
+
+class DeleteUser(Handler):
+    model = User
+    permission = 'AuthApp.delete_user'
+
+    def approve(self, approvals, by):
+        return _trash(User, approvals, by)
+
+
+class EnrollStudent(EachTarget):
+    model = Enrollment
+    permission = 'AuthApp.review_requests'
+    related = ('student', 'course')
+
+    def approve_one(self, approval, by):
+        approve_enrollment(approval.target, by)
+
+    def reject(self, approvals, by):
+        enrollments = [approval.target for approval in approvals if approval.target.status == 'pending']
+        Enrollment.objects.filter(pk__in=[enrollment.pk for enrollment in enrollments], status='pending').update(status='rejected')
+        by_course = {}
+        for enrollment in enrollments:
+            by_course[enrollment.course_id] = by_course.get(enrollment.course_id, 0) + 1
+        for course_id, count in by_course.items():
+            enrollments_changed(course_id, pending=-count, rejected=count)
+        return {}
+
+
+class _JobStatus(Handler):
+    model = JobPost
+    permission = 'AuthApp.manage_job_posts'
+
+    def _set_status(self, approvals, status):
+        posts = [approval.target for approval in approvals]
+        JobPost.objects.filter(pk__in=[post.pk for post in posts]).update(status=status)
+        for post in posts:
+            post.status = status
+        # The status decides who may find the post.
+        index_objects(posts)
+        return {}
+
+
+class AddJob(_JobStatus):
+    """Job posts wait as 'pending'; approving opens them and rejecting closes them."""
+
+    def approve(self, approvals, by):
+        return self._set_status(approvals, 'open')
+
+    def reject(self, approvals, by):
+        return self._set_status(approvals, 'closed')
+
+
+class DeleteJob(Handler):
+    model = JobPost
+    permission = 'AuthApp.manage_job_posts'
+
+    def approve(self, approvals, by):
+        return _trash(JobPost, approvals, by)
+
+
+class Leave(EachTarget):
+    model = LeaveRequest
+    permission = 'AuthApp.approve_leave'
+    related = ('user',)
+
+    def approve_one(self, approval, by):
+        approve_leave(approval.target, by)
+
+    def reject_one(self, approval, by):
+        reject_leave(approval.target, by)
+
+
+class Salary(EachTarget):
+    """Approving posts approval.amount to the ledger as the target user's salary."""
+    model = User
+    permission = 'AuthApp.approve_salaries'
+
+    def approve_one(self, approval, by):
+        if approval.amount is None:
+            raise ApprovalError("A salary approval needs an amount.")
+        post_entry('salary', approval.amount, description=f"Salary: {approval.target.username}", created_by=by)
+
+
+HANDLERS = {
+    'add_course': AddCourse(),
+    'delete_course': DeleteCourse(),
+    'add_user': AddUser(),
+    'delete_user': DeleteUser(),
+    'enroll_student': EnrollStudent(),
+    'add_job': AddJob(),
+    'delete_job': DeleteJob(),
+    'leave_request': Leave(),
+    'salary_approval': Salary(),
+}
+
+
+# Requesting
+
+def request_approval(action_type, target, requested_by, note='', amount=None):
+    """Ask for `action_type` on `target` to be approved. Returns the Approval."""
+    handler = HANDLERS.get(action_type)
+    if handler is None:
+        raise ApprovalError(f"Unknown action type {action_type!r}.")
+    if not isinstance(target, handler.model):
+        raise ApprovalError(f"{action_type} needs a {handler.model.__name__}, not {type(target).__name__}.")
+    return Approval.objects.create(
+        action_type=action_type, target_id=str(target.pk), requested_by=requested_by, note=note, amount=amount,
+    )
+
+
+# Inbox
+
+def decidable_types(user):
+    """The action types `user` may decide."""
+    return [action_type for action_type, handler in HANDLERS.items() if user.has_perm(handler.permission)]
+
+
+def attach_targets(approvals):
+    """Set .target on each approval, loading the targets with one query per action type."""
+    by_type = {}
+    for approval in approvals:
+        by_type.setdefault(approval.action_type, []).append(approval)
+    for action_type, group in by_type.items():
+        handler = HANDLERS.get(action_type)
+        targets = handler.targets({approval.target_id for approval in group}) if handler else {}
+        for approval in group:
+            approval.target = targets.get(approval.target_id)
+    return approvals
+
+
+def inbox(user, action_types=None, cursor=None, size=50):
+    """
+    A KeysetPage of the pending approvals `user` may decide, newest first,
+    optionally only of `action_types`, with targets and requesters loaded.
+    """
+    allowed = decidable_types(user)
+    if action_types:
+        allowed = [action_type for action_type in allowed if action_type in action_types]
+    pending = Approval.objects.filter(status='pending', action_type__in=allowed).select_related('requested_by')
+    page = keyset_page(pending, cursor=cursor, size=size, fields=('timestamp', 'id'))
+    attach_targets(page.object_list)
+    return page
+
+
+# Deciding
+
+class Decision:
+    def __init__(self):
+        self.decided = []
+        self.failed = []
+
+    def fail(self, approval_id, message):
+        self.failed.append((approval_id, message))
+
+
+def _decide_batch(ids, status, by, note, result):
+    now = timezone.now()
+    with transaction.atomic():
+        approvals = attach_targets(list(
+            Approval.objects.select_for_update().filter(pk__in=ids, status='pending')
+        ))
+        found = {approval.pk for approval in approvals}
+        for approval_id in ids:
+            if approval_id not in found:
+                result.fail(approval_id, "Not pending.")
+
+        by_type = {}
+        for approval in approvals:
+            handler = HANDLERS.get(approval.action_type)
+            if handler is None:
+                result.fail(approval.pk, f"Unknown action type {approval.action_type!r}.")
+            elif by is not None and not by.has_perm(handler.permission):
+                result.fail(approval.pk, "Not permitted.")
+            elif approval.target is None and status == 'approved':
+                result.fail(approval.pk, "The target no longer exists.")
+            else:
+                by_type.setdefault(approval.action_type, []).append(approval)
+
+        decided = []
+        for action_type, group in by_type.items():
+            handler = HANDLERS[action_type]
+            # A rejected target that is already gone has nothing left to undo.
+            present = [approval for approval in group if approval.target is not None]
+            decide = handler.approve if status == 'approved' else handler.reject
+            try:
+                with transaction.atomic():
+                    failed = decide(present, by) if present else {}
+            except ValueError as error:
+                failed = {approval.pk: str(error) for approval in present}
+            for approval in group:
+                if approval.pk in failed:
+                    result.fail(approval.pk, failed[approval.pk])
+                else:
+                    decided.append(approval)
+
+        changes = {'status': status, 'approved_by': by, 'decided_at': now}
+        if note:
+            changes['note'] = note
+        Approval.objects.filter(pk__in=[approval.pk for approval in decided]).update(**changes)
+    for approval in decided:
+        approval.status, approval.approved_by, approval.decided_at = status, by, now
+        if by is not None:
+            log_audit(by, 'approve' if status == 'approved' else 'reject', approval)
+    result.decided.extend(decided)
+
+
+def _decide(approvals, status, by, note):
+    pk = Approval._meta.pk
+    ids = [pk.to_python(getattr(approval, 'pk', approval)) for approval in approvals]
+    batch_size = settings.APPROVAL_BATCH_SIZE
+    result = Decision()
+    for start in range(0, len(ids), batch_size):
+        _decide_batch(ids[start:start + batch_size], status, by, note, result)
+    return result
+
+
+def approve(approvals, by=None, note=''):
+    """
+    Approve `approvals` (Approval objects or pks) as `by`, which must have
+    each action type's permission. Returns a Decision with the approvals
+    decided and (pk, reason) for the rest, which stay pending.
+    """
+    return _decide(approvals, 'approved', by, note)
+
+
+def reject(approvals, by=None, note=''):
+    """Reject `approvals` as approve() approves them."""
+    return _decide(approvals, 'rejected', by, note)
@@ -0,0 +1,1485 @@
+"""
+Benchmarks run by `manage.py benchmark <name>`.
+
+Each benchmark is a function taking (out, size) registered under a name.
+The command runs them against a throwaway test database, so they are free
+to create as many rows as they like; run_benchmarks() empties it between
+benchmarks.
+"""
+import os
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test.utils import override_settings
+
+from .models import Notification, NotificationBatch, User
+
+BENCHMARKS = {}
+
+
+def register(name, size):
+    """Register a benchmark under `name` with a default row count."""
+    def decorator(func):
+        func.default_size = size
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def run_benchmarks(names, out, size=None, style=None):
+    """Run the benchmarks `names` in turn, each starting from an empty database."""
+    for index, name in enumerate(names):
+        if index:
+            call_command('flush', interactive=False, verbosity=0)
+            # The flush restarts ids, so counts cached by id would be stale.
+            for cache in caches.all():
+                if isinstance(cache, LocMemCache):
+                    cache.clear()
+        func = BENCHMARKS[name]
+        heading = f"{name} (size {size or func.default_size})"
+        out.write(style.MIGRATE_HEADING(heading) if style else heading)
+        func(out, size or func.default_size)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def report(out, label, seconds, rows=None, unit="rows"):
+    line = f"{label:<40} {seconds * 1000:>10.1f} ms"
+    if rows:
+        line += f" {rows / seconds:>12,.0f} {unit}/s"
+    out.write(line)
+
+
+def make_users(count, prefix="bench", **fields):
+    """Bulk-create `count` users with unusable passwords."""
+    fields.setdefault('role', 'student')
+    User.objects.bulk_create(
+        [User(username=f"{prefix}{i}", password="!", **fields) for i in range(count)],
+        batch_size=2000,
+    )
+    return User.objects.filter(username__startswith=prefix)
+
+
+@register('notifications', size=50000)
+def bench_notifications(out, size):
+    from .notifications import notify_audience
+
+    make_users(size)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+
+    def per_row():
+        for user_id in user_ids:
+            Notification.objects.create(user_id=user_id, message="Per-row announcement")
+
+    _, seconds = timed(per_row)
+    report(out, "per-row Notification.objects.create", seconds, size)
+    Notification.objects.all().delete()
+
+    with override_settings(NOTIFICATION_FANOUT_ASYNC=True):
+        batch, seconds = timed(notify_audience, "Queued announcement", role='student')
+        report(out, "notify_audience (request thread)", seconds)
+
+        start = time.perf_counter()
+        while NotificationBatch.objects.filter(pk=batch.pk, status__in=['pending', 'running']).exists():
+            time.sleep(0.01)
+        seconds = time.perf_counter() - start
+    report(out, "fan-out worker (bulk_create)", seconds, Notification.objects.count())
+
+
+@register('unread', size=200000)
+def bench_unread(out, size):
+    from .notifications import unread_count
+
+    users = list(make_users(100))
+    Notification.objects.bulk_create(
+        [Notification(user=users[i % len(users)], message="Unread") for i in range(size)],
+        batch_size=2000,
+    )
+    user = users[0]
+
+    def live_count(n):
+        for _ in range(n):
+            Notification.objects.filter(user=user, is_read=False).count()
+
+    def cached_count(n):
+        for _ in range(n):
+            unread_count(user)
+
+    _, seconds = timed(live_count, 1000)
+    report(out, "COUNT(*) per page view x1000", seconds)
+    _, seconds = timed(cached_count, 1000)
+    report(out, "unread_count() x1000", seconds)
+
+
+@register('activity', size=2000)
+def bench_activity(out, size):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from .activity import get_buffer, log_activity, log_audit
+    from .middleware import ActivityLogMiddleware
+
+    user = make_users(1).get()
+    request = RequestFactory().get("/")
+
+    def view(request):
+        log_activity(user, "view dashboard")
+        log_activity(user, "open course", user)
+        log_audit(user, "update", user)
+        return HttpResponse("ok")
+
+    handler = ActivityLogMiddleware(view)
+
+    def serve(n):
+        latencies = []
+        for _ in range(n):
+            start = time.perf_counter()
+            handler(request)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return latencies
+
+    for label, buffered in (("synchronous INSERTs", False), ("buffered", True)):
+        with override_settings(ACTIVITY_LOG_BUFFERED=buffered):
+            latencies, seconds = timed(serve, size)
+            get_buffer().flush()
+        report(out, f"{label}: {size} requests", seconds)
+        out.write(
+            f"    p50 {latencies[len(latencies) // 2] * 1000:.3f} ms"
+            f"  p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms"
+        )
+
+
+@register('trash', size=100000)
+def bench_trash(out, size):
+    import json
+
+    from django.core import serializers
+
+    from .models import Trash, TrashBlob
+    from .trash import restore_batch, trash_queryset
+
+    users = list(make_users(50))
+
+    def seed(count):
+        Notification.objects.bulk_create(
+            [Notification(user=users[i % 50], message=f"Fee reminder #{i % 20} for this term") for i in range(count)],
+            batch_size=2000,
+        )
+
+    # The naive path: one full-JSON Trash row and one DELETE per object.
+    baseline = max(size // 10, 1)
+    seed(baseline)
+
+    def per_row():
+        for note in Notification.objects.all():
+            data = json.loads(serializers.serialize('json', [note]))[0]['fields']
+            Trash.objects.create(model_name="Notification", object_data=data)
+            note.delete()
+
+    _, seconds = timed(per_row)
+    report(out, f"per-row JSON trash ({baseline} rows)", seconds, baseline)
+    legacy_bytes = sum(len(json.dumps(data)) for data in Trash.objects.values_list('object_data', flat=True))
+    out.write(f"    {legacy_bytes / baseline:.0f} bytes/row")
+    Trash.objects.all().delete()
+
+    seed(size)
+    batch, seconds = timed(trash_queryset, Notification.objects.all())
+    report(out, f"trash_queryset ({size} rows)", seconds, size)
+    stored = sum(len(payload) for payload in Trash.objects.values_list('payload', flat=True))
+    stored += sum(len(data) for data in TrashBlob.objects.values_list('data', flat=True))
+    out.write(f"    {stored / size:.0f} bytes/row")
+
+    restored, seconds = timed(restore_batch, batch)
+    report(out, f"restore_batch ({restored} rows)", seconds, restored)
+
+
+@register('sqlite_concurrency', size=4000)
+def bench_sqlite_concurrency(out, size):
+    """
+    Writers doing read-then-insert transactions alongside dashboard readers,
+    on a stock SQLite file versus the tuned profile from instracore.db.
+    """
+    import os
+    import sqlite3
+    import tempfile
+    import threading
+
+    from instracore.db import SQLITE_PRAGMAS, sqlite_init_command
+
+    profiles = [
+        ("stock (rollback journal, BEGIN)", {}, "BEGIN", 5.0),
+        ("tuned (WAL + pragmas, BEGIN IMMEDIATE)", SQLITE_PRAGMAS, "BEGIN IMMEDIATE", SQLITE_PRAGMAS['busy_timeout'] / 1000),
+    ]
+    writers, readers = 8, 4
+
+    for label, pragmas, begin, timeout in profiles:
+        path = os.path.join(tempfile.mkdtemp(), "load.sqlite3")
+        setup = sqlite3.connect(path)
+        setup.executescript(
+            "CREATE TABLE log (id INTEGER PRIMARY KEY, user_id INTEGER, action TEXT);"
+            "CREATE INDEX log_user ON log (user_id);"
+        )
+        setup.close()
+
+        counts = {'writes': 0, 'reads': 0, 'locked': 0}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def connect():
+            conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+            conn.executescript(sqlite_init_command(pragmas))
+            return conn
+
+        def write(worker):
+            conn = connect()
+            for i in range(size // writers):
+                try:
+                    conn.execute(begin)
+                    conn.execute("SELECT COUNT(*) FROM log WHERE user_id = ?", (worker,)).fetchone()
+                    conn.execute("INSERT INTO log (user_id, action) VALUES (?, ?)", (worker, f"action {i}"))
+                    conn.execute("COMMIT")
+                    key = 'writes'
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    key = 'locked'
+                with lock:
+                    counts[key] += 1
+            conn.close()
+
+        def read(worker):
+            conn = connect()
+            while not done.is_set():
+                try:
+                    conn.execute("SELECT user_id, COUNT(*) FROM log GROUP BY user_id").fetchall()
+                    key = 'reads'
+                except sqlite3.OperationalError:
+                    key = 'locked'
+                with lock:
+                    counts[key] += 1
+            conn.close()
+
+        write_threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        read_threads = [threading.Thread(target=read, args=(n,)) for n in range(readers)]
+        start = time.perf_counter()
+        for thread in read_threads + write_threads:
+            thread.start()
+        for thread in write_threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        done.set()
+        for thread in read_threads:
+            thread.join()
+
+        report(out, label, seconds, counts['writes'])
+        out.write(
+            f"    {counts['reads'] / seconds:,.0f} reads/s, "
+            f"{counts['locked']} 'database is locked' errors"
+        )
+
+
+@register('permissions', size=5000)
+def bench_permissions(out, size):
+    from django.contrib.auth.backends import ModelBackend
+    from django.db import connection
+
+    from .permissions import RolePermissionBackend
+
+    make_users(size, role='employee', sub_role='teacher')
+    users = list(User.objects.all())
+
+    for label, backend in (("ModelBackend", ModelBackend()), ("RolePermissionBackend", RolePermissionBackend())):
+        # A fresh user object per "request", as the auth middleware loads one.
+        for user in users:
+            user.__dict__.pop('_perm_cache', None)
+            user.__dict__.pop('_role_perm_cache', None)
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            _, seconds = timed(lambda: [backend.has_perm(user, 'AuthApp.mark_attendance') for user in users])
+        report(out, f"{label}: first check per request", seconds, len(users), unit="checks")
+        out.write(f"    {len(queries) / len(users):.1f} queries/request")
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+@register('stream', size=2000)
+def bench_stream(out, size):
+    """
+    Hold `size` idle SSE connections open on one event loop through the real
+    ASGI application, then push one notification to every user.
+    """
+    import asyncio
+    import threading
+    import tracemalloc
+
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+
+    from instracore.asgi import application
+
+    from .notifications import delivered
+    from .pubsub import broker
+
+    users = list(make_users(size))
+    cookies = []
+    for user in users:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookies.append(f"{settings.SESSION_COOKIE_NAME}={session.session_key}".encode())
+
+    # Saved up front: the ORM is sync-only, and delivery is what is measured.
+    notifications = Notification.objects.bulk_create(
+        [Notification(user=user, message="Live") for user in users]
+    )
+
+    async def run():
+        disconnect = asyncio.Event()
+        opened = asyncio.Semaphore(0)
+        received = asyncio.Semaphore(0)
+
+        async def connection(cookie):
+            requested = False
+            bodies = 0
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                nonlocal bodies
+                if message['type'] == 'http.response.body' and message.get('body'):
+                    bodies += 1
+                    (opened if bodies == 1 else received).release()
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': '/notifications/stream/',
+                'root_path': '', 'query_string': b'', 'headers': [(b'host', b'localhost'), (b'cookie', cookie)],
+                'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+            await application(scope, receive, send)
+
+        tracemalloc.start()
+        rss_before, heap_before = _rss_bytes(), tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(connection(cookie)) for cookie in cookies]
+        for _ in tasks:
+            await opened.acquire()
+        connect_seconds = time.perf_counter() - start
+        heap = tracemalloc.get_traced_memory()[0] - heap_before
+        rss_after = _rss_bytes()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        threading.Thread(target=delivered, args=(notifications,)).start()
+        for _ in tasks:
+            await received.acquire()
+        push_seconds = time.perf_counter() - start
+
+        open_connections = broker.connections
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return connect_seconds, push_seconds, heap, rss_before, rss_after, open_connections
+
+    connect_seconds, push_seconds, heap, rss_before, rss_after, open_connections = asyncio.run(run())
+    report(out, f"open {size} streams", connect_seconds, size, unit="connections")
+    out.write(f"    {open_connections} concurrent streams on one event loop")
+    out.write(f"    {heap / size / 1024:.1f} KiB Python heap per connection")
+    if rss_before and rss_after:
+        out.write(f"    {(rss_after - rss_before) / size / 1024:.1f} KiB RSS per connection")
+    report(out, f"push to {size} open streams", push_seconds, size, unit="events")
+    out.write(f"    {broker.connections} streams left after disconnect")
+
+
+@register('images', size=24)
+def bench_images(out, size):
+    """Render thumbnails for `size` 12-megapixel photos, serially and in the process pool."""
+    import io
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    from PIL import Image, ImageOps
+
+    from .imaging import clean_image, render_variants
+
+    sizes = (64, 160, 400)
+    noise = Image.effect_noise((4000, 3000), 64)
+    photo = Image.merge('RGB', (noise, noise.transpose(Image.Transpose.ROTATE_180), noise))
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=90)
+    photos = [buffer.getvalue()] * size
+    out.write(f"    {len(photos[0]) / 1024 / 1024:.1f} MiB JPEG, 4000x3000")
+
+    def naive(data):
+        # Full decode, every size resized from the full image.
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert('RGB')
+        for edge in sizes:
+            ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS).save(io.BytesIO(), 'WEBP')
+
+    for label, max_edge in (("full size", None), ("max_edge 1600", 1600)):
+        _, seconds = timed(
+            lambda: [clean_image(data, 50 * 1024 * 1024, 40_000_000, ('JPEG',), max_edge) for data in photos[:4]]
+        )
+        report(out, f"clean_image in the request, {label} (per image)", seconds / 4)
+    _, seconds = timed(lambda: [naive(data) for data in photos])
+    report(out, "full decode + resize, serial", seconds, size, unit="images")
+    _, seconds = timed(lambda: [render_variants(data, sizes) for data in photos])
+    report(out, "render_variants, serial", seconds, size, unit="images")
+
+    workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pool.submit(int).result()  # start the workers outside the timing
+        _, seconds = timed(lambda: list(pool.map(render_variants, photos, [sizes] * size)))
+    report(out, f"render_variants, {workers} worker process(es)", seconds, size, unit="images")
+
+
+@register('user_import', size=10000)
+def bench_user_import(out, size):
+    """Import `size` users from CSV, compare with create_user, then export them."""
+    import io
+
+    from .bulk_users import csv_lines, export_rows, import_users
+
+    def intake(count, prefix, password=""):
+        lines = ["username,email,first_name,last_name,role,password"]
+        lines += [f"{prefix}{i},{prefix}{i}@example.com,First,Last,student,{password}" for i in range(count)]
+        return io.BytesIO("\n".join(lines).encode())
+
+    sample = 40
+    _, seconds = timed(lambda: [
+        User.objects.create_user(f"per-row{i}", f"per-row{i}@example.com", "pass-word-1", role='student')
+        for i in range(sample)
+    ])
+    report(out, f"create_user x{sample} (PBKDF2 each)", seconds, sample)
+    out.write(f"    extrapolated to {size}: {seconds / sample * size / 60:.1f} min")
+
+    result, seconds = timed(import_users, intake(sample, "hashed", "pass-word-1"))
+    report(out, f"import_users x{sample} with passwords ({os.cpu_count()} CPU)", seconds, result.created)
+
+    result, seconds = timed(import_users, intake(size, "intake"))
+    report(out, f"import_users x{size}, reset tokens", seconds, result.created)
+
+    streamed = 0
+    start = time.perf_counter()
+    for line in csv_lines(export_rows(User.objects.all())):
+        streamed += len(line)
+    report(out, f"export {User.objects.count()} users as CSV", time.perf_counter() - start, User.objects.count())
+    out.write(f"    {streamed / 1024 / 1024:.1f} MiB streamed")
+
+
+@register('admin_pages', size=500000)
+def bench_admin_pages(out, size):
+    """OFFSET vs keyset pages and COUNT(*) vs estimates on a `size`-row notification table."""
+    from django.core.paginator import Paginator
+
+    from .keyset import approximate_count, encode_cursor, keyset_page, NEXT
+
+    users = list(make_users(1000))
+    for start in range(0, size, 50000):
+        Notification.objects.bulk_create(
+            [Notification(user=users[i % len(users)], message="n") for i in range(start, min(start + 50000, size))],
+            batch_size=5000,
+        )
+    newest_first = Notification.objects.order_by('-created_at', '-id')
+
+    def repeat(func, n=20):
+        for _ in range(n):
+            func()
+
+    _, seconds = timed(repeat, lambda: Notification.objects.count())
+    report(out, "COUNT(*) x20", seconds)
+    _, seconds = timed(repeat, lambda: approximate_count(Notification))
+    report(out, "approximate_count x20", seconds)
+
+    for depth in (0, size // 2, size - 100):
+        page_number = depth // 100 + 1
+        _, seconds = timed(repeat, lambda: list(Paginator(newest_first, 100).page(page_number).object_list))
+        report(out, f"OFFSET page at row {depth:,} x20 (with COUNT)", seconds)
+        row = newest_first[depth - 1] if depth else None
+        cursor = encode_cursor(NEXT, [row.created_at, row.id]) if row else None
+        _, seconds = timed(repeat, lambda: list(keyset_page(Notification.objects.all(), cursor, 100)))
+        report(out, f"keyset page at row {depth:,} x20", seconds)
+
+
+@register('seats', size=2000)
+def bench_seats(out, size):
+    """
+    `size` pending enrollments approved by 16 threads at once against
+    courses with half as many seats: the design's read-check-increment
+    approval versus AuthApp.enrollments. Fails if any course is oversold.
+    """
+    import threading
+
+    from django.db import connection, DatabaseError
+    from django.db.models import Count, F, Q
+
+    from .enrollments import SeatUnavailable, approve_enrollment, approve_waitlist
+    from .models import Course, Enrollment, SeatAssignment
+
+    threads, courses_count = 16, 10
+    students = list(make_users(size, prefix="seats"))
+    teacher = User.objects.create(username="seats-teacher", password="!", role='teacher')
+
+    def setup(label):
+        courses = Course.objects.bulk_create([
+            Course(name=f"{label} {i}", code=f"{label[:4]}{i}", teacher=teacher, total_seats=size // courses_count // 2)
+            for i in range(courses_count)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, course=courses[i % courses_count])
+            for i, student in enumerate(students)
+        ])
+        return list(Enrollment.objects.filter(course__in=courses).order_by('?'))
+
+    def naive_approve(enrollment):
+        # Enrollment.approve() from DOC/DOCUMENTATION/models.py.
+        course = Course.objects.get(pk=enrollment.course_id)
+        if course.seats_filled >= course.total_seats:
+            raise SeatUnavailable("No seats available")
+        Course.objects.filter(pk=course.pk).update(seats_filled=F('seats_filled') + 1)
+        Enrollment.objects.filter(pk=enrollment.pk).update(status='active')
+
+    def run(label, approve, enrollments):
+        counts = {'approved': 0, 'full': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def work(share):
+            for enrollment in share:
+                try:
+                    approve(enrollment)
+                    key = 'approved'
+                except SeatUnavailable:
+                    key = 'full'
+                except DatabaseError:
+                    # Lock timeouts, and the capacity check refusing an oversell.
+                    key = 'failed'
+                with lock:
+                    counts[key] += 1
+            connection.close()
+
+        workers = [threading.Thread(target=work, args=(enrollments[n::threads],)) for n in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - start
+        report(out, label, seconds, counts['approved'], unit="approvals")
+        out.write(f"    {counts['full']} refused as full, {counts['failed']} failed with a database error")
+
+    def check(label):
+        courses = Course.objects.filter(name__startswith=label).annotate(
+            active=Count('enrollments', filter=Q(enrollments__status='active')),
+        )
+        for course in courses:
+            seats = SeatAssignment.objects.filter(course=course)
+            numbers = set(seats.values_list('seat_number', flat=True))
+            if not (course.active == course.seats_filled == len(numbers) <= course.total_seats):
+                raise AssertionError(
+                    f"{course.name}: {course.active} active enrollments, {course.seats_filled} seats filled, "
+                    f"{len(numbers)} distinct seat numbers, {course.total_seats} seats"
+                )
+
+    # Without the capacity check constraint, every database error below
+    # would have been an oversold seat.
+    run("read-check-increment (design)", naive_approve, setup("design"))
+
+    run("conditional UPDATE claim", approve_enrollment, setup("claim"))
+    check("claim")
+
+    setup("waitlist")
+    start = time.perf_counter()
+    approved = sum(len(approve_waitlist(course)) for course in Course.objects.filter(name__startswith="waitlist"))
+    report(out, "approve_waitlist, one call per course", time.perf_counter() - start, approved, unit="approvals")
+    check("waitlist")
+    out.write("    no course oversold")
+
+
+@register('dashboard', size=200000)
+def bench_dashboard(out, size):
+    """The admin dashboard's counts computed live versus read from the rollups, over `size` users."""
+    import random
+
+    from django.db.models import Count, Q, Sum
+
+    from .models import Course, Enrollment
+    from .summaries import dashboard_summary, reconcile_all
+
+    roles = [('student', None)] * 8 + [('employee', 'teacher'), ('employee', 'hr'), ('employee', 'finance')]
+    rng = random.Random(0)
+    User.objects.bulk_create(
+        [
+            User(username=f"dash{i}", password="!", role=role, sub_role=sub_role, is_active=rng.random() > 0.05)
+            for i, (role, sub_role) in enumerate(rng.choice(roles) for _ in range(size))
+        ],
+        batch_size=5000,
+    )
+    teacher = User.objects.filter(sub_role='teacher').first()
+    courses = Course.objects.bulk_create([
+        Course(name=f"Course {i}", teacher=teacher, total_seats=200) for i in range(max(1, size // 500))
+    ])
+    statuses = [status for status, _ in Enrollment.STATUS_CHOICES]
+    student_ids = list(User.objects.filter(role='student').values_list('pk', flat=True))
+    Enrollment.objects.bulk_create(
+        [Enrollment(student_id=pk, course=rng.choice(courses), status=rng.choice(statuses)) for pk in student_ids],
+        batch_size=5000,
+    )
+
+    def live():
+        active = User.objects.filter(is_active=True)
+        enrollments = Enrollment.objects.aggregate(**{
+            status: Count('pk', filter=Q(status=status)) for status in statuses
+        })
+        return {
+            'students': active.filter(role='student').count(),
+            'teachers': active.filter(role='employee', sub_role='teacher').count(),
+            'staff': active.filter(role='employee').exclude(sub_role='teacher').count(),
+            'users': User.objects.count(),
+            'active_users': active.count(),
+            'courses': Course.objects.count(),
+            'seats': Course.objects.aggregate(seats=Sum('total_seats'))['seats'],
+            'enrollments': enrollments,
+        }
+
+    def repeat(func, n=20):
+        for _ in range(n):
+            result = func()
+        return result
+
+    _, seconds = timed(reconcile_all)
+    report(out, "full reconciliation", seconds, size + len(student_ids))
+    expected, seconds = timed(repeat, live)
+    report(out, "live aggregates x20", seconds, 20, unit="pages")
+    summary, seconds = timed(repeat, dashboard_summary)
+    report(out, "rollup read x20", seconds, 20, unit="pages")
+
+    totals = summary['totals']
+    for name in ('students', 'teachers', 'staff', 'courses', 'seats', 'enrollments'):
+        if totals[name] != expected[name]:
+            raise AssertionError(f"{name}: rollup {totals[name]} != live {expected[name]}")
+
+
+@register('ledger', size=1000000)
+def bench_ledger(out, size):
+    """
+    Statements over a `size`-entry ledger spread across three years, from
+    the entries alone versus with closed monthly periods; balances read from
+    balance_after versus summed; and concurrent postings.
+    """
+    import datetime
+    import random
+    import threading
+    from decimal import Decimal
+
+    from django.db import connection
+    from django.db.models import Case, F, Sum, When
+    from django.utils import timezone
+
+    from .ledger import BALANCE_EFFECT, TYPES, balance_at, close_periods, post_entry, statement
+    from .models import FinanceTransaction
+
+    rng = random.Random(0)
+    students = list(make_users(1000, prefix="ledger"))
+    start = timezone.make_aware(datetime.datetime(2023, 1, 1))
+    span = (timezone.make_aware(datetime.datetime(2026, 1, 1)) - start).total_seconds()
+
+    balances = {}
+
+    def entries(first, count):
+        # In date order, carrying each student's running balance as post_entry() would.
+        for i in range(first, first + count):
+            kind = rng.choice(TYPES)
+            amount = Decimal(rng.randrange(100, 100000)) / 100
+            student = balance = None
+            if kind in BALANCE_EFFECT:
+                student = rng.choice(students)
+                balance = balances[student.pk] = balances.get(student.pk, 0) + BALANCE_EFFECT[kind] * amount
+            yield FinanceTransaction(
+                transaction_type=kind, amount=amount, student=student, balance_after=balance,
+                created_at=start + datetime.timedelta(seconds=span * (i + rng.random()) / size),
+            )
+
+    _, seconds = timed(lambda: [
+        FinanceTransaction.objects.bulk_create(list(entries(done, min(50000, size - done))), batch_size=5000)
+        for done in range(0, size, 50000)
+    ])
+    report(out, "load ledger", seconds, size)
+
+    first, last = datetime.date(2024, 1, 1), datetime.date(2025, 12, 31)
+    within = dict(created_at__gte=timezone.make_aware(datetime.datetime(2024, 1, 1)),
+                  created_at__lt=timezone.make_aware(datetime.datetime(2026, 1, 1)))
+    _, seconds = timed(lambda: FinanceTransaction.objects.filter(**within).values('transaction_type').annotate(total=Sum('amount')).count())
+    report(out, "2-year totals from entries (GROUP BY)", seconds)
+    _, seconds = timed(statement, first, last)
+    report(out, "2-year statement before closing", seconds)
+    closed, seconds = timed(close_periods)
+    report(out, f"close_periods ({len(closed)} months)", seconds, size)
+    report_, seconds = timed(statement, first, last)
+    report(out, "2-year statement from periods", seconds)
+    _, seconds = timed(statement, datetime.date(2024, 1, 15), datetime.date(2025, 12, 15))
+    report(out, "statement with partial edge months", seconds)
+
+    expected = {
+        row['transaction_type']: row['total']
+        for row in FinanceTransaction.objects.filter(**within).values('transaction_type').annotate(total=Sum('amount'))
+    }
+    for kind in TYPES:
+        if abs(report_['totals'][kind] - expected.get(kind, 0)) > Decimal('0.01'):
+            raise AssertionError(f"{kind}: statement {report_['totals'][kind]} != ledger {expected.get(kind)}")
+
+    threads, per_thread = 8, max(size // 4000, 25)
+    lock = threading.Lock()
+    posted = []
+
+    def post(n):
+        for i in range(per_thread):
+            entry = post_entry('payment' if i % 2 else 'fee', '10.00', students[(n + i) % 10])
+            with lock:
+                posted.append(entry)
+        connection.close()
+
+    workers = [threading.Thread(target=post, args=(n,)) for n in range(threads)]
+    begin = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    report(out, f"post_entry, {threads} threads, 10 accounts", time.perf_counter() - begin, len(posted), unit="entries")
+
+    now = timezone.now()
+    student = students[0]
+    owed = Sum(Case(
+        When(transaction_type__in=['fee', 'refund'], then=F('amount')),
+        When(transaction_type='payment', then=-F('amount')),
+    ))
+    balance_at(student, now)
+    _, seconds = timed(lambda: [balance_at(student, now) for _ in range(100)])
+    report(out, "balance_at x100", seconds)
+    _, seconds = timed(lambda: [
+        FinanceTransaction.objects.filter(student=student, created_at__lte=now).aggregate(owed=owed) for _ in range(100)
+    ])
+    report(out, "balance summed from entries x100", seconds)
+
+
+@register('results', size=5000)
+def bench_results(out, size):
+    """
+    Publishing a `size`-student course row by row, with a notification per
+    row, versus publish_results(); half the students have a parent account.
+    """
+    import random
+    from decimal import Decimal
+
+    from django.db import transaction
+    from django.utils import timezone
+
+    from .models import Course, Enrollment, Parent, Result
+    from .results import assign_grades, ingest_marks, publish_results
+
+    rng = random.Random(0)
+    students = list(make_users(size, prefix="exam"))
+    parents = list(make_users(size // 2, prefix="guardian", role='candidate'))
+    Parent.objects.bulk_create([Parent(full_name=user.username, parent_user=user) for user in parents])
+    Parent.students.through.objects.bulk_create([
+        Parent.students.through(parent=parent, user=student)
+        for parent, student in zip(Parent.objects.order_by('full_name'), students)
+    ])
+    teacher = User.objects.create(username="exam-teacher", password="!", role='employee', sub_role='teacher')
+    marks = [rng.randrange(0, 101) for _ in students]
+
+    def course(name):
+        course = Course.objects.create(name=name, teacher=teacher, total_seats=size)
+        Enrollment.objects.bulk_create([Enrollment(student=student, course=course, status='active') for student in students])
+        return course
+
+    naive = course("Per row")
+    Result.objects.bulk_create([
+        Result(course=naive, student=student, marks_obtained=mark, total_marks=100) for student, mark in zip(students, marks)
+    ])
+
+    def per_row():
+        with transaction.atomic():
+            for result in Result.objects.filter(course=naive).select_related('student', 'course'):
+                result.grade = assign_grades([float(result.marks_obtained / result.total_marks * 100)])[0]
+                result.published, result.published_at = True, timezone.now()
+                result.save()
+                Notification.objects.create(user=result.student, message=f"Your result for {result.course.name} has been published.")
+                for parent in Parent.objects.filter(students=result.student, parent_user__isnull=False):
+                    Notification.objects.create(user_id=parent.parent_user_id, message="Your child's result has been published.")
+
+    _, seconds = timed(per_row)
+    report(out, "per-row save + notifications", seconds, size)
+
+    batch = course("Batch")
+    rows = [{'username': student.username, 'marks_obtained': Decimal(mark)} for student, mark in zip(students, marks)]
+    result, seconds = timed(ingest_marks, batch, rows, 100)
+    report(out, "ingest_marks", seconds, result.saved)
+    stats, seconds = timed(publish_results, batch)
+    report(out, "publish_results", seconds, stats.students)
+    out.write(f"    mean {stats.mean:.1f}%, median {stats.median:.1f}%, p90 {stats.p90:.1f}%, "
+              f"{Notification.objects.count():,} notifications in all")
+
+
+@register('history', size=5000)
+def bench_history(out, size):
+    """
+    What edit history costs: loading and holding `size` tracked enrollments,
+    saving each with one changed field (untracked, diffed by re-reading and
+    serialising the row, and diffed against the snapshot), and
+    history.bulk_update().
+    """
+    import sys
+    import tracemalloc
+    from datetime import timedelta
+
+    from django.db import transaction
+    from django.forms.models import model_to_dict
+    from django.utils import timezone
+
+    from . import history
+    from .models import Course, EditHistory, Enrollment
+
+    students = list(make_users(size, prefix="tracked"))
+    teacher = User.objects.create(username="history-teacher", password="!", role='employee', sub_role='teacher')
+    course = Course.objects.create(name="History", teacher=teacher, total_seats=size)
+    Enrollment.objects.bulk_create([Enrollment(student=student, course=course) for student in students])
+    exclude = history.untrack(Enrollment).exclude
+
+    def load():
+        return list(Enrollment.objects.all())
+
+    def held():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        instances = load()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return instances, used
+
+    def best_load():
+        return min(timed(load)[1] for _ in range(5))
+
+    untracked_load = best_load()
+    _, untracked_bytes = held()
+    history.track(Enrollment, exclude)
+    tracked_load = best_load()
+    instances, tracked_bytes = held()
+    report(out, "load, untracked", untracked_load, size, unit="objects")
+    report(out, "load, tracked (post_init snapshot)", tracked_load, size, unit="objects")
+    out.write(f"    {(tracked_bytes - untracked_bytes) / size:.0f} bytes more per tracked instance "
+              f"({untracked_bytes / size:.0f} untracked; snapshot tuple {sys.getsizeof(instances[0]._history_snapshot)} bytes)")
+
+    start = timezone.now()
+
+    def save_all(moment):
+        """Seconds spent before the commit; history is written after it."""
+        with transaction.atomic():
+            begin = time.perf_counter()
+            for enrollment in load():
+                enrollment.enrolled_at = moment
+                enrollment.save(update_fields=['enrolled_at'])
+            return time.perf_counter() - begin
+
+    exclude = history.untrack(Enrollment).exclude
+    untracked_save = save_all(start)
+    report(out, "save, untracked", untracked_save, size, unit="saves")
+
+    def naive(moment):
+        with transaction.atomic():
+            for enrollment in load():
+                enrollment.enrolled_at = moment
+                before = model_to_dict(Enrollment.objects.get(pk=enrollment.pk))
+                enrollment.save(update_fields=['enrolled_at'])
+                after = model_to_dict(enrollment)
+                EditHistory.objects.create(
+                    model_name='Enrollment', object_id=str(enrollment.pk), action='updated',
+                    changes={name: [str(before[name]), str(value)] for name, value in after.items() if before[name] != value},
+                )
+
+    _, naive_save = timed(naive, start + timedelta(days=1))
+    report(out, "save, re-read and diff every field", naive_save, size, unit="saves")
+    history.track(Enrollment, exclude)
+    before_commit, tracked_save = timed(save_all, start + timedelta(days=2))
+    report(out, "save, snapshot diff + queued rows", tracked_save, size, unit="saves")
+    out.write(f"    per save: {(naive_save - untracked_save) / size * 1e6:.0f} us re-reading; from the snapshot "
+              f"{(before_commit - untracked_save) / size * 1e6:.0f} us diffing and queueing, "
+              f"{(tracked_save - before_commit) / size * 1e6:.0f} us writing history after commit")
+
+    instances = load()
+    for enrollment in instances[::2]:
+        enrollment.status = 'active'
+    written, seconds = timed(history.bulk_update, instances, ['status', 'enrolled_at'])
+    report(out, f"history.bulk_update ({written:,} changed)", seconds, size, unit="objects")
+    for i, enrollment in enumerate(instances):
+        enrollment.enrolled_at = start + timedelta(seconds=i)
+    written, seconds = timed(history.bulk_update, instances, ['enrolled_at'])
+    report(out, f"history.bulk_update ({written:,} distinct)", seconds, size, unit="objects")
+    out.write(f"    {EditHistory.objects.count():,} history rows in all")
+
+
+@register('search', size=100000)
+def bench_search(out, size):
+    """
+    search() against icontains over User, Course and JobPost, with `size`
+    users and a course and a job post per hundred users.
+    """
+    import random
+
+    from django.db.models import Q
+
+    from .models import Course, JobPost
+    from .search import rebuild_index, search
+
+    rng = random.Random(0)
+    first = ["Abdul", "Ayesha", "Farhan", "Fatima", "Hasan", "Imran", "Jannat", "Karim", "Laila", "Mahmud",
+             "Nadia", "Omar", "Rafiq", "Sadia", "Tahmid", "Tania", "Yusuf", "Zara", "Arif", "Nusrat"]
+    last = ["Ahmed", "Akter", "Chowdhury", "Hossain", "Islam", "Kabir", "Khan", "Mia", "Rahman", "Sarkar",
+            "Siddique", "Talukder", "Uddin", "Begum", "Haque", "Alam", "Bhuiyan", "Molla", "Sheikh", "Das"]
+    cities = ["Dhaka", "Chittagong", "Sylhet", "Khulna", "Rajshahi", "Barisal", "Rangpur", "Mymensingh", "Comilla", "Bogra"]
+    words = ("physics chemistry mathematics biology history literature economics painting football cricket "
+             "chess music robotics programming debate volunteering photography gardening astronomy poetry").split()
+    roles = [('student', None)] * 8 + [('employee', 'teacher'), ('employee', 'hr')]
+
+    users = []
+    for i in range(size):
+        role, sub_role = rng.choice(roles)
+        given, family = rng.choice(first), rng.choice(last)
+        users.append(User(
+            username=f"{given.lower()}{i}", password="!", first_name=given, last_name=family,
+            email=f"{given.lower()}.{family.lower()}{i}@example.com", location=rng.choice(cities),
+            bio="Likes " + " and ".join(rng.sample(words, 3)), role=role, sub_role=sub_role,
+        ))
+    User.objects.bulk_create(users, batch_size=2000)
+    teacher = User.objects.filter(sub_role='teacher').first()
+    hr = User.objects.filter(sub_role='hr').first()
+    Course.objects.bulk_create([
+        Course(name=f"{rng.choice(words).title()} {i}", code=f"C{i}", teacher=teacher,
+               description=" ".join(rng.sample(words, 6)))
+        for i in range(size // 100)
+    ])
+    JobPost.objects.bulk_create([
+        JobPost(title=f"{rng.choice(words).title()} instructor", department=rng.choice(cities), hr=hr,
+                description=" ".join(rng.sample(words, 6)), status=rng.choice(['open', 'closed']))
+        for _ in range(size // 100)
+    ])
+
+    written, seconds = timed(rebuild_index)
+    report(out, "rebuild_index", seconds, sum(written.values()), unit="docs")
+
+    def icontains(query, limit=None):
+        terms = query.split()
+        users, courses, posts = User.objects.all(), Course.objects.all(), JobPost.objects.all()
+        for term in terms:
+            users = users.filter(
+                Q(first_name__icontains=term) | Q(last_name__icontains=term) | Q(username__icontains=term)
+                | Q(email__icontains=term) | Q(bio__icontains=term) | Q(location__icontains=term)
+            )
+            courses = courses.filter(Q(name__icontains=term) | Q(code__icontains=term) | Q(description__icontains=term))
+            posts = posts.filter(Q(title__icontains=term) | Q(department__icontains=term) | Q(description__icontains=term))
+        if limit:
+            users, courses, posts = users[:limit], courses[:limit], posts[:limit]
+        return [*users.values_list('pk'), *courses.values_list('pk'), *posts.values_list('pk')]
+
+    queries = ["nusrat", "nadia rahman", "khan sylhet", "chess", "astro", "zara bhuiyan chess", "robotics instructor"]
+    for query in queries:
+        matches = len(icontains(query))
+        _, unranked = timed(lambda: [icontains(query, 20) for _ in range(5)])
+        _, every = timed(lambda: [icontains(query) for _ in range(5)])
+        _, ranked = timed(lambda: [search(query) for _ in range(5)])
+        out.write(f"{query!r:<24} {matches:>7,} matches   icontains first 20 {unranked / 5 * 1000:7.1f} ms, "
+                  f"all {every / 5 * 1000:7.1f} ms   search() ranked top 20 {ranked / 5 * 1000:6.1f} ms")
+
+
+@register('leave', size=2000)
+def bench_leave(out, size):
+    """
+    The leave calendar over four years of leave for `size` staff, about ten
+    requests each a year: overlap lookups through the length-class index
+    against a start_date index, and month grids from DailyAvailability
+    against counting the leave itself.
+    """
+    import datetime
+    import random
+
+    from django.db import connection
+
+    from .leave import approve_leave, clashes, month_availability, on_leave, reconcile_availability, request_leave
+    from .models import LeaveRequest
+    from .summaries import reconcile_roles
+
+    rng = random.Random(0)
+    sub_roles = ['teacher', 'teacher', 'faculty', 'hr', 'finance', 'it']
+    for sub_role in sub_roles[1:]:
+        make_users(size // (len(sub_roles) - 1), prefix=f"{sub_role}-", role='employee', sub_role=sub_role)
+    staff = list(User.objects.filter(role='employee').values_list('pk', flat=True))
+    reconcile_roles()
+
+    first_day = datetime.date(2022, 1, 1)
+    years = 4
+    leave = []
+    for user_id in staff:
+        day = first_day + datetime.timedelta(days=rng.randrange(30))
+        while day < first_day + datetime.timedelta(days=365 * years):
+            # Mostly short leave, some weeks, the odd long absence.
+            length = rng.choice([1] * 6 + [2, 3, 5, 7, 10, 14] + [rng.randrange(30, 180)])
+            end = day + datetime.timedelta(days=length - 1)
+            leave.append(LeaveRequest(
+                user_id=user_id, start_date=day, end_date=end, span=LeaveRequest.span_of(day, end),
+                status=rng.choice(['approved'] * 8 + ['rejected', 'cancelled']),
+            ))
+            day = end + datetime.timedelta(days=rng.randrange(7, 70))
+    _, seconds = timed(LeaveRequest.objects.bulk_create, leave, batch_size=2000)
+    report(out, f"bulk_create {len(leave):,} leave", seconds, len(leave))
+    rows, seconds = timed(reconcile_availability, first_day, first_day + datetime.timedelta(days=365 * years))
+    report(out, f"reconcile_availability ({rows:,} days)", seconds, len(leave), unit="leave")
+
+    table = LeaveRequest._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX bench_leave_start_idx ON {table} (start_date, end_date) WHERE status = 'approved'"
+        )
+
+    def by_start(start, end):
+        return LeaveRequest.objects.filter(status='approved', start_date__lte=end, end_date__gte=start)
+
+    out.write("Who is on leave this week (x20):")
+    for week in [datetime.date(2022, 2, 7), datetime.date(2024, 1, 8), datetime.date(2025, 11, 3)]:
+        sunday = week + datetime.timedelta(days=6)
+        found = on_leave(week, sunday).count()
+        _, indexed = timed(lambda: [list(on_leave(week, sunday).values_list('pk')) for _ in range(20)])
+        _, ranged = timed(lambda: [list(by_start(week, sunday).values_list('pk')) for _ in range(20)])
+        out.write(f"  {week}  {found:>5,} on leave   length classes {indexed / 20 * 1000:6.2f} ms   "
+                  f"start_date index {ranged / 20 * 1000:6.2f} ms")
+
+    def python_clash(user_id, start, end):
+        return any(
+            first <= end and last >= start
+            for first, last in LeaveRequest.objects.filter(user_id=user_id, status='approved').values_list('start_date', 'end_date')
+        )
+
+    sample = rng.sample(staff, 200)
+    day = datetime.date(2025, 12, 1)
+    _, looped = timed(lambda: [
+        python_clash(user_id, day, day + datetime.timedelta(days=4)) for user_id in sample
+    ])
+    _, queried = timed(lambda: [
+        clashes(user_id, day, day + datetime.timedelta(days=4), statuses=['approved']).exists() for user_id in sample
+    ])
+    out.write(f"Overlap check per request: loop over the user's leave {looped / len(sample) * 1000:5.2f} ms   "
+              f"clashes() {queried / len(sample) * 1000:5.2f} ms")
+
+    requests = []
+    for user_id in sample:
+        try:
+            requests.append(request_leave(User(pk=user_id), datetime.date(2026, 3, 2), datetime.date(2026, 3, 6)))
+        except ValueError:
+            pass
+    _, seconds = timed(lambda: [approve_leave(request) for request in requests])
+    report(out, f"approve_leave x{len(requests)} (5 days each)", seconds, len(requests), unit="approvals")
+
+    def live_grid(month):
+        end = (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+        grid = {}
+        for first, last, sub_role in on_leave(month, end).values_list('start_date', 'end_date', 'user__sub_role'):
+            counts = grid.setdefault(sub_role, [0] * end.day)
+            for n in range((min(last, end) - max(first, month)).days + 1):
+                counts[(max(first, month) - month).days + n] += 1
+        return grid
+
+    for month in [datetime.date(2022, 3, 1), datetime.date(2025, 7, 1)]:
+        _, rollup = timed(lambda: [month_availability(month) for _ in range(20)])
+        _, live = timed(lambda: [live_grid(month) for _ in range(20)])
+        out.write(f"Month grid {month:%Y-%m}: month_availability() {rollup / 20 * 1000:6.2f} ms   "
+                  f"counted from leave {live / 20 * 1000:6.2f} ms")
+
+
+@register('approvals', size=10000)
+def bench_approvals(out, size):
+    """
+    Rendering an inbox of `size` pending approvals, spread over enrollments,
+    leave, job posts and sign-ups, with the targets loaded per row against
+    inbox(); then approving them in batches.
+    """
+    import datetime
+    import random
+
+    from django.db import connection
+
+    from .approvals import HANDLERS, approve, inbox
+    from .models import Approval, Course, Enrollment, JobPost, LeaveRequest
+
+    quarter = size // 4
+    admin = User.objects.create(username="bench-admin", password="!", role='admin')
+    hr = User.objects.create(username="bench-hr", password="!", role='employee', sub_role='hr')
+    teacher = User.objects.create(username="bench-teacher", password="!", role='employee', sub_role='teacher')
+    students = list(make_users(quarter, prefix="student-"))
+    staff = list(make_users(quarter, prefix="staff-", role='employee', sub_role='faculty'))
+    signups = list(make_users(quarter, prefix="signup-", is_active=False))
+    courses = Course.objects.bulk_create([
+        Course(name=f"Course {i}", teacher=teacher, total_seats=quarter) for i in range(50)
+    ])
+    enrollments = Enrollment.objects.bulk_create([
+        Enrollment(student=student, course=courses[i % 50]) for i, student in enumerate(students)
+    ])
+    day = datetime.date(2026, 1, 5)
+    leave = LeaveRequest.objects.bulk_create([
+        LeaveRequest(user=user, start_date=day, end_date=day + datetime.timedelta(days=2), span=2) for user in staff
+    ])
+    posts = JobPost.objects.bulk_create([JobPost(title=f"Post {i}", hr=hr) for i in range(quarter)])
+    targets = (
+        [('enroll_student', item, item.student) for item in enrollments]
+        + [('leave_request', item, item.user) for item in leave]
+        + [('add_job', item, hr) for item in posts]
+        + [('add_user', item, item) for item in signups]
+    )
+    random.Random(0).shuffle(targets)
+    Approval.objects.bulk_create(
+        [Approval(action_type=kind, target_id=str(target.pk), requested_by=by) for kind, target, by in targets],
+        batch_size=2000,
+    )
+
+    def render(approvals):
+        return [
+            (approval.action_type, approval.requested_by.username, str(approval.target), approval.timestamp)
+            for approval in approvals
+        ]
+
+    def per_row():
+        approvals = list(Approval.objects.filter(status='pending').select_related('requested_by').order_by('-timestamp', '-id'))
+        for approval in approvals:
+            approval.target = HANDLERS[approval.action_type].model.objects.get(pk=approval.target_id)
+        return render(approvals)
+
+    def counted(func, repeat=1):
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            rows, seconds = timed(lambda: [func() for _ in range(repeat)])
+        return len(rows[0]), seconds / repeat, len(queries) // repeat
+
+    for label, func, repeat in [
+        ("inbox, target per row", per_row, 1),
+        ("inbox(), all pending", lambda: render(inbox(admin, size=size)), 1),
+        ("inbox(), page of 50", lambda: render(inbox(admin)), 20),
+        ("inbox(), page of 50, one type", lambda: render(inbox(admin, action_types=['enroll_student'])), 20),
+    ]:
+        rows, seconds, queries = counted(func, repeat)
+        report(out, f"{label} ({queries:,} queries)", seconds, rows)
+
+    for action_type in ['add_job', 'leave_request', 'enroll_student']:
+        pending = list(Approval.objects.filter(action_type=action_type).values_list('pk', flat=True))
+        result, seconds = timed(approve, pending, admin)
+        report(out, f"approve {action_type} x{len(pending):,}", seconds, len(result.decided), unit="approvals")
+
+
+@register('applications', size=1000)
+def bench_applications(out, size):
+    """
+    `size` applications uploaded at once through the real ASGI application,
+    each with a 1-4 MiB resume and every resume sent to two posts: as
+    Django's defaults handle them (2.5 MiB of each body held in memory, the
+    file saved under its upload name) against the streamed, content-addressed
+    intake. Reports throughput, peak RSS and the bytes stored.
+    """
+    import asyncio
+    import random
+    import shutil
+    import tempfile
+    import threading
+
+    from django.http import HttpResponse
+    from django.urls import path
+    from django.views.decorators.csrf import csrf_exempt
+
+    from instracore.asgi import application
+
+    from . import applications
+    from .models import JobApplication, JobPost, ResumeText
+
+    hr = User.objects.create(username="bench-hr", password="!", role='employee', sub_role='hr')
+    posts = JobPost.objects.bulk_create([JobPost(title=f"Post {i}", hr=hr, status='open') for i in range(2)])
+
+    chunk_size = 64 * 1024
+    rng = random.Random(0)
+    blocks = [rng.randbytes(chunk_size) for _ in range(16)]
+    mib = 1024 * 1024
+
+    def resume(k):
+        """The chunks of resume `k`, built as they are sent."""
+        length = mib + k * 2654435761 % (3 * mib)
+        yield f"%PDF-1.4 resume {k}\n".encode() + blocks[k % 16]
+        sent = chunk_size
+        while sent < length:
+            yield blocks[(k + sent // chunk_size) % 16]
+            sent += chunk_size
+
+    @csrf_exempt
+    def plain_apply(request, job_id):
+        JobApplication.objects.create(
+            job_id=job_id, applicant_name=request.POST['applicant_name'],
+            applicant_email=request.POST['applicant_email'], resume=request.FILES['resume'],
+        )
+        return HttpResponse(status=201)
+
+    class PlainURLs:
+        urlpatterns = [path('jobs/<uuid:job_id>/apply/', plain_apply)]
+
+    boundary = b"----bench-resume-boundary-7MA4YWxkTrZu0gW"
+    csrf_token = b"benchCsrfTokenForResumeUploads32"
+
+    def request(i, label):
+        head = b"".join(
+            b"--" + boundary + b"\r\nContent-Disposition: form-data; name=\"" + name + b"\"\r\n\r\n" + value + b"\r\n"
+            for name, value in [(b'applicant_name', f"Applicant {i // 2}".encode()),
+                                (b'applicant_email', f"{label}-{i // 2}@example.com".encode())]
+        ) + (
+            b"--" + boundary + b"\r\nContent-Disposition: form-data; name=\"resume\"; filename=\"cv.pdf\"\r\n"
+            b"Content-Type: application/pdf\r\n\r\n"
+        )
+        tail = b"\r\n--" + boundary + b"--\r\n"
+        length = len(head) + sum(len(chunk) for chunk in resume(i // 2)) + len(tail)
+        return posts[i % 2].pk, length, [head], tail
+
+    async def upload(job_id, length, head, tail, i, statuses):
+        chunks = iter([*head, *resume(i // 2)])
+        finished = False
+
+        async def receive():
+            nonlocal finished
+            if finished:
+                # The disconnect listener waits here until the response is sent.
+                await asyncio.Event().wait()
+            # Clients send at network speed: let the other uploads in between chunks.
+            await asyncio.sleep(0)
+            chunk = next(chunks, None)
+            if chunk is None:
+                finished = True
+                return {'type': 'http.request', 'body': tail, 'more_body': False}
+            return {'type': 'http.request', 'body': chunk, 'more_body': True}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'POST', 'scheme': 'http', 'path': f'/jobs/{job_id}/apply/',
+            'root_path': '', 'query_string': b'', 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            'headers': [
+                (b'host', b'localhost'), (b'content-length', str(length).encode()),
+                (b'content-type', b'multipart/form-data; boundary=' + boundary),
+                (b'cookie', b'csrftoken=' + csrf_token), (b'x-csrftoken', csrf_token),
+            ],
+        }
+        await application(scope, receive, send)
+
+    def run(label, overrides):
+        media_root = tempfile.mkdtemp(prefix="bench-resumes-")
+        requests = [request(i, label) for i in range(size)]
+        statuses = []
+        peak, done = [_rss_bytes() or 0], threading.Event()
+
+        def sample():
+            while not done.wait(0.005):
+                peak[0] = max(peak[0], _rss_bytes() or 0)
+
+        async def main():
+            await asyncio.gather(*(upload(*args, i, statuses) for i, args in enumerate(requests)))
+
+        with override_settings(MEDIA_ROOT=media_root, **overrides):
+            rss_before = peak[0]
+            sampler = threading.Thread(target=sample)
+            sampler.start()
+            _, seconds = timed(asyncio.run, main())
+            start = time.perf_counter()
+            while applications._pending:
+                time.sleep(0.01)
+            extract_seconds = time.perf_counter() - start
+            done.set()
+            sampler.join()
+        sent = sum(length for _, length, _, _ in requests)
+        stored = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(media_root) for name in names
+        )
+        report(out, f"{label}: {size} uploads, {sent / mib:,.0f} MiB", seconds, sent / mib, unit="MiB")
+        out.write(f"    {statuses.count(201)} accepted; peak RSS +{(peak[0] - rss_before) / mib:,.0f} MiB;"
+                  f" {stored / mib:,.0f} MiB stored")
+        if extract_seconds > 0.05:
+            report(out, f"{label}: text extraction after upload", extract_seconds)
+        return media_root
+
+    # Streamed first, so Django's defaults cannot lower its peak by having
+    # grown the heap already.
+    for label, overrides in [
+        ("streamed, content-addressed", {}),
+        ("Django defaults", {'ROOT_URLCONF': PlainURLs, 'FILE_UPLOAD_MAX_MEMORY_SIZE': 2621440}),
+    ]:
+        shutil.rmtree(run(label, overrides), ignore_errors=True)
+    out.write(f"    {ResumeText.objects.count()} resume texts extracted")
+
+
+@register('metrics', size=3000)
+def bench_metrics(out, size):
+    """
+    `size` requests for the dashboard counts through the test client, without
+    RequestMetricsMiddleware and with it sampling every request, 10% and 1%.
+    Configurations take turns in rounds and each reports its fastest round,
+    so drift in the machine's speed falls on all of them alike. Then the
+    middleware alone, around a view that returns at once.
+    """
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.test import Client, RequestFactory
+    from django.urls import resolve
+
+    from .metrics import metrics
+    from .middleware import RequestMetricsMiddleware
+
+    admin = User.objects.create(username="bench-admin", password="!", role='admin')
+    plain = [name for name in settings.MIDDLEWARE if name != 'AuthApp.middleware.RequestMetricsMiddleware']
+    configs = [
+        ("no metrics middleware", {'MIDDLEWARE': plain}),
+        ("sampling every request", {'METRICS_SAMPLE_RATE': 1.0}),
+        ("sampling 10%", {'METRICS_SAMPLE_RATE': 0.1}),
+        ("sampling 1%", {'METRICS_SAMPLE_RATE': 0.01}),
+    ]
+    rounds = 20
+    per_round = max(size // rounds, 1)
+    best = {label: float('inf') for label, _ in configs}
+    for _ in range(rounds):
+        for label, overrides in configs:
+            with override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                client = Client()
+                client.force_login(admin)
+                client.get('/dashboard/counts/')
+                start = time.perf_counter()
+                for _ in range(per_round):
+                    client.get('/dashboard/counts/')
+                best[label] = min(best[label], (time.perf_counter() - start) / per_round)
+    baseline = best[configs[0][0]]
+    for label, seconds in best.items():
+        out.write(f"{label:<40} {seconds * 1e6:>10.1f} us/request {(seconds - baseline) / baseline:>+9.2%}")
+
+    request = RequestFactory().get('/dashboard/counts/')
+    request.resolver_match = resolve('/dashboard/counts/')
+    response = HttpResponse(b"{}")
+    for label, rate in [("middleware alone, every request", 1.0), ("middleware alone, 1%", 0.01)]:
+        with override_settings(METRICS_SAMPLE_RATE=rate):
+            middleware = RequestMetricsMiddleware(lambda request: response)
+            _, seconds = timed(lambda: [middleware(request) for _ in range(size * 10)])
+        out.write(f"{label:<40} {seconds / (size * 10) * 1e6:>10.1f} us/request")
+    out.write(f"    {len(metrics.exposition())} bytes of exposition")
+    metrics.reset()
+
+
+@register('load', size=20000)
+def bench_load(out, size):
+    """
+    seed_benchmark's data for `size` users, then every load-test scenario
+    with one client and with four.
+    """
+    from .loadtest import run_load
+    from .seeding import seed
+
+    timings = seed(size)
+    rows = sum(rows for name, (rows, _) in timings.items() if name != 'rollups and search index')
+    seconds = sum(seconds for _, seconds in timings.values())
+    report(out, f"seed {size} users ({rows / seconds * 60 / 1e6:.1f}M rows/min)", seconds, rows)
+    for clients in (1, 4):
+        for name, result in run_load(clients=clients, requests=200).as_dict()['scenarios'].items():
+            out.write(
+                f"{name + f' ({clients} client)':<40} p50 {result['p50_ms']:>7.1f} ms  p95 {result['p95_ms']:>7.1f} ms"
+                f"  p99 {result['p99_ms']:>7.1f} ms {result['throughput_rps']:>8.1f} req/s  {result['errors']} errors"
+            )
+
+
+@register('sessions', size=2000)
+def bench_sessions(out, size):
+    """
+    `size` signed-in requests for the dashboard counts with database
+    sessions and the stock AuthenticationMiddleware, then with cache-backed
+    sessions and the cached slim user. Reports queries and time per request.
+    Without INSTRACORE_SESSION_CACHE the cached run uses a FileBasedCache in
+    a temporary directory, which is shared but slower than Redis.
+    """
+    import shutil
+    import tempfile
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+
+    admin = User.objects.create(username="bench-admin", password="!", role='admin', bio="x" * 2000)
+    stock = [
+        'django.contrib.auth.middleware.AuthenticationMiddleware'
+        if name == 'AuthApp.middleware.CachedAuthenticationMiddleware' else name
+        for name in settings.MIDDLEWARE
+    ]
+    cached = {}
+    location = None
+    if not settings.USER_CACHE:
+        location = tempfile.mkdtemp(prefix="bench-sessions-")
+        cached = {
+            'CACHES': {
+                **settings.CACHES,
+                'sessions': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            },
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+            'SESSION_CACHE_ALIAS': 'sessions',
+            'USER_CACHE': 'sessions',
+        }
+    configs = [
+        ("database sessions, full user", {
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.db', 'USER_CACHE': None, 'MIDDLEWARE': stock,
+        }),
+        ("cached sessions, slim user", cached),
+    ]
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    rounds = 10
+    per_round = max(size // rounds, 1)
+    best = {label: float('inf') for label, _ in configs}
+    counted = {}
+    for _ in range(rounds):
+        for label, overrides in configs:
+            with override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                client = Client()
+                client.force_login(admin)
+                client.get('/dashboard/counts/')
+                queries = 0
+                with connection.execute_wrapper(count):
+                    start = time.perf_counter()
+                    for _ in range(per_round):
+                        client.get('/dashboard/counts/')
+                    best[label] = min(best[label], (time.perf_counter() - start) / per_round)
+                counted[label] = queries / per_round
+    if location:
+        shutil.rmtree(location, ignore_errors=True)
+    for label, seconds in best.items():
+        out.write(f"{label:<40} {counted[label]:>5.1f} queries {seconds * 1e6:>10.1f} us/request")
@@ -0,0 +1,220 @@
+"""
+Bulk user import and export.
+
+import_users() streams rows from a CSV or XLSX file and handles them in
+chunks of USER_IMPORT_CHUNK_SIZE. Each chunk is validated with one query
+for usernames that are already taken, its passwords are hashed on a thread
+pool, and its valid rows are written with a single bulk_create. A bad row
+is skipped and reported with its line number; it never stops the rest of
+the file.
+
+Rows without a password get an unusable one and a password reset token
+instead, so importing a whole intake hashes nothing. Hand the tokens to the
+welcome email. Created users are added to the search index in the same
+transaction.
+
+export_rows() reads users back with .iterator() in the same columns, so an
+export can be edited and imported again.
+"""
+import csv
+import io
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, UNUSABLE_PASSWORD_SUFFIX_LENGTH, make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import User
+from .search import index_objects
+from .summaries import users_added
+
+IMPORT_COLUMNS = ['username', 'email', 'first_name', 'last_name', 'role', 'sub_role', 'phone', 'password']
+EXPORT_COLUMNS = ['username', 'email', 'first_name', 'last_name', 'role', 'sub_role', 'phone', 'is_active', 'date_joined']
+FORMATS = ('csv', 'xlsx')
+
+
+def file_format(filename):
+    """'csv' or 'xlsx', from the file name."""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type {extension or filename!r}; use CSV or XLSX.")
+    return extension
+
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("XLSX files need the openpyxl package (pip install openpyxl).")
+    return openpyxl
+
+
+def read_rows(file, format='csv'):
+    """Yield (line number, {column: text}) for each data row of a binary file."""
+    if format == 'xlsx':
+        workbook = _openpyxl().load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+            for line, values in enumerate(rows, start=2):
+                if any(value is not None for value in values):
+                    yield line, {
+                        column: '' if value is None else str(value)
+                        for column, value in zip(header, values)
+                    }
+        finally:
+            workbook.close()
+        return
+
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {column.strip(): value or '' for column, value in row.items() if column}
+    finally:
+        # Leave the caller's file open.
+        text.detach()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        # (username, email, uidb64, token) for users created without a password.
+        self.reset_tokens = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+def _error_message(exc):
+    if hasattr(exc, 'message_dict'):
+        return "; ".join(f"{field}: {' '.join(messages)}" for field, messages in exc.message_dict.items())
+    return " ".join(exc.messages)
+
+
+def _build_user(row, default_role):
+    user = User(
+        username=row.get('username', '').strip(),
+        email=User.objects.normalize_email(row.get('email', '').strip()),
+        first_name=row.get('first_name', '').strip(),
+        last_name=row.get('last_name', '').strip(),
+        role=row.get('role', '').strip() or default_role,
+        sub_role=row.get('sub_role', '').strip() or None,
+        phone=row.get('phone', '').strip(),
+    )
+    # Only the imported fields need checking; uniqueness is checked once per chunk.
+    user.full_clean(exclude=_NOT_IMPORTED, validate_unique=False, validate_constraints=False)
+    return user
+
+
+_NOT_IMPORTED = [field.name for field in User._meta.fields if field.name not in IMPORT_COLUMNS or field.name == 'password']
+
+
+def _import_chunk(rows, result, seen, default_role, pool, dry_run):
+    candidates = []
+    for line, row in rows:
+        try:
+            user = _build_user(row, default_role)
+        except ValidationError as exc:
+            result.error(line, _error_message(exc))
+            continue
+        if user.username in seen:
+            result.error(line, f"username: {user.username} appears more than once in the file.")
+            continue
+        seen.add(user.username)
+        candidates.append((line, user, row.get('password', '')))
+
+    taken = set(
+        User.objects.filter(username__in=[user.username for _, user, _ in candidates])
+        .values_list('username', flat=True)
+    )
+    users, passwords = [], []
+    for line, user, password in candidates:
+        if user.username in taken:
+            result.error(line, f"username: {user.username} already exists.")
+            continue
+        users.append(user)
+        passwords.append(password)
+    if dry_run:
+        result.created += len(users)
+        return
+
+    encoded = iter(pool.map(make_password, [password for password in passwords if password]))
+    for user, password in zip(users, passwords):
+        if password:
+            user.password = next(encoded)
+        else:
+            # What set_unusable_password() stores, without its per-character
+            # random.choice() loop.
+            user.password = UNUSABLE_PASSWORD_PREFIX + secrets.token_hex(UNUSABLE_PASSWORD_SUFFIX_LENGTH // 2)
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        users_added(users)
+        index_objects(users)
+    result.created += len(users)
+
+    for user, password in zip(users, passwords):
+        if not password:
+            result.reset_tokens.append((
+                user.username, user.email,
+                urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user),
+            ))
+
+
+def import_users(file, format='csv', default_role='student', dry_run=False, chunk_size=None, workers=None):
+    """
+    Create users from an open binary CSV/XLSX file. Columns are
+    IMPORT_COLUMNS; only username is required, and role defaults to
+    `default_role`. Returns an ImportResult.
+    """
+    chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+    workers = workers or settings.USER_IMPORT_HASH_WORKERS or os.cpu_count()
+    result = ImportResult()
+    seen = set()
+    chunk = []
+    # PBKDF2 (like bcrypt and argon2) releases the GIL while hashing, so
+    # threads hash in parallel without setting Django up in worker processes.
+    with ThreadPoolExecutor(workers) as pool:
+        for line_and_row in read_rows(file, format):
+            chunk.append(line_and_row)
+            if len(chunk) >= chunk_size:
+                _import_chunk(chunk, result, seen, default_role, pool, dry_run)
+                chunk = []
+        if chunk:
+            _import_chunk(chunk, result, seen, default_role, pool, dry_run)
+    return result
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield the EXPORT_COLUMNS header, then one tuple per user, streamed from the database."""
+    yield EXPORT_COLUMNS
+    for row in queryset.order_by('pk').values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size):
+        yield ['' if value is None else value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Render rows as CSV text one line at a time, for StreamingHttpResponse."""
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows, file):
+    """Write rows to a binary file as a single-sheet workbook, in constant memory."""
+    workbook = _openpyxl().Workbook(write_only=True)
+    sheet = workbook.create_sheet("Users")
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
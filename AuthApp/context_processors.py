@@ -0,0 +1,12 @@
+from .notifications import unread_count
+
+
+def unread_notifications(request):
+    """
+    Expose the unread count to templates as unread_notification_count.
+    It is only looked up if a template actually renders it.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notification_count': lambda: unread_count(user)}
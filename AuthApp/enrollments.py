@@ -0,0 +1,131 @@
+"""
+Seat allocation for course enrollments.
+
+A seat is claimed with one conditional UPDATE,
+
+    UPDATE course SET seats_filled = seats_filled + 1, last_seat_number = last_seat_number + 1
+    WHERE id = :course AND seats_filled < total_seats
+
+so the database, not a Course instance loaded earlier, decides whether a
+seat is free; an UPDATE that matches no row means the course is full. The
+claiming statement also write-locks the course row until commit, so the
+last_seat_number read back in the same transaction belongs to this claim
+alone and seat numbers never collide on the unique constraint. The course
+row is held only for the few statements that follow.
+
+Status changes are written with queryset.update(), which sends no signals,
+so each function records them for the dashboard rollups itself.
+
+approve_waitlist() claims as many seats as a batch of pending applications
+needs in one statement and activates them together. Every function runs in
+its own transaction (or the caller's), and any failure rolls the claim back.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .activity import log_audit
+from .models import Course, Enrollment, SeatAssignment
+from .summaries import enrollments_changed
+
+
+class SeatUnavailable(ValueError):
+    pass
+
+
+class EnrollmentStateError(ValueError):
+    pass
+
+
+def _claim(course_id, count):
+    """Claim `count` seats; returns the first seat number, or None if fewer are free."""
+    claimed = Course.objects.filter(
+        pk=course_id, seats_filled__lte=F('total_seats') - count,
+    ).update(
+        seats_filled=F('seats_filled') + count,
+        last_seat_number=F('last_seat_number') + count,
+    )
+    if not claimed:
+        return None
+    # Locked by the UPDATE above until commit.
+    return Course.objects.values_list('last_seat_number', flat=True).get(pk=course_id) - count + 1
+
+
+def approve_enrollment(enrollment, approver=None):
+    """
+    Activate a pending enrollment and give it the next seat number.
+    Raises SeatUnavailable when the course is full and EnrollmentStateError
+    when the enrollment is no longer pending. Returns the SeatAssignment.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Course row first, then the enrollment, like approve_waitlist(), so
+        # the two cannot deadlock.
+        seat_number = _claim(enrollment.course_id, 1)
+        if seat_number is None:
+            raise SeatUnavailable("No seats available")
+        activated = Enrollment.objects.filter(pk=enrollment.pk, status='pending').update(status='active', enrolled_at=now)
+        if not activated:
+            # Rolling back also returns the claimed seat.
+            raise EnrollmentStateError(f"Enrollment {enrollment.pk} is not pending.")
+        seat = SeatAssignment.objects.create(
+            course_id=enrollment.course_id, student_id=enrollment.student_id,
+            enrollment_id=enrollment.pk, seat_number=seat_number,
+        )
+        enrollments_changed(enrollment.course_id, pending=-1, active=1)
+    enrollment.status, enrollment.enrolled_at = 'active', now
+    if approver is not None:
+        log_audit(approver, 'approve', enrollment)
+    return seat
+
+
+def approve_waitlist(course, approver=None, limit=None):
+    """
+    Approve pending enrollments of `course` in application order, as many
+    as there are free seats (and at most `limit`), in one transaction.
+    Returns the approved enrollments.
+    """
+    now = timezone.now()
+    course_id = getattr(course, 'pk', course)
+    waitlist = Enrollment.objects.filter(course_id=course_id, status='pending').order_by('applied_at', 'id')
+    with transaction.atomic():
+        # Locking the course row first keeps `free` true until commit.
+        free = (
+            Course.objects.select_for_update().filter(pk=course_id)
+            .values_list(F('total_seats') - F('seats_filled'), flat=True).get()
+        )
+        if limit is not None:
+            free = min(free, limit)
+        batch = list(waitlist.values_list('pk', 'student_id')[:free]) if free > 0 else []
+        if not batch:
+            return []
+        first = _claim(course_id, len(batch))
+        if first is None:
+            raise SeatUnavailable("No seats available")
+        activated = Enrollment.objects.filter(pk__in=[pk for pk, _ in batch], status='pending').update(status='active', enrolled_at=now)
+        if activated != len(batch):
+            raise EnrollmentStateError("Some waitlisted enrollments changed while approving; try again.")
+        SeatAssignment.objects.bulk_create([
+            SeatAssignment(course_id=course_id, student_id=student_id, enrollment_id=pk, seat_number=first + i)
+            for i, (pk, student_id) in enumerate(batch)
+        ])
+        enrollments_changed(course_id, pending=-len(batch), active=len(batch))
+    approved = list(Enrollment.objects.filter(pk__in=[pk for pk, _ in batch]).order_by('applied_at', 'id'))
+    if approver is not None:
+        for enrollment in approved:
+            log_audit(approver, 'approve', enrollment)
+    return approved
+
+
+def cancel_enrollment(enrollment, user=None):
+    """Cancel an active enrollment and free its seat. Its seat number is not reused."""
+    with transaction.atomic():
+        freed = Course.objects.filter(pk=enrollment.course_id, seats_filled__gt=0).update(seats_filled=F('seats_filled') - 1)
+        cancelled = freed and Enrollment.objects.filter(pk=enrollment.pk, status='active').update(status='cancelled')
+        if not cancelled:
+            raise EnrollmentStateError(f"Enrollment {enrollment.pk} is not active.")
+        SeatAssignment.objects.filter(enrollment_id=enrollment.pk).delete()
+        enrollments_changed(enrollment.course_id, active=-1, cancelled=1)
+    enrollment.status = 'cancelled'
+    if user is not None:
+        log_audit(user, 'cancel', enrollment)
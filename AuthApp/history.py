@@ -0,0 +1,307 @@
+"""
+Edit history.
+
+Saves and deletes of tracked models (see track() calls in AuthApp.signals)
+are recorded as EditHistory rows that hold only the fields that changed, as
+{field: [old, new]}. Nothing is read back from the database to find them.
+When an instance is initialised, post_init stores the values it was loaded
+with as one tuple in field order; the field names are kept once per model,
+on its Tracker. post_save compares the instance with that tuple, serialises
+only the values that differ, and refreshes the tuple so the next save diffs
+against this one. Snapshot values are shared with the instance, except
+mutable ones such as JSONField dicts, which are copied; a snapshot costs
+one tuple per instance. Fields deferred at load time are not diffed.
+
+History rows are queued per transaction and written with one bulk_create
+once it commits; a rolled back save records nothing. bulk_update() writes
+many objects in one pass, skipping those whose fields did not change, and
+queues the history of all of them together. Like the dashboard rollups,
+nothing is recorded for queryset.update() or raw SQL.
+
+The user responsible is the one given to acting_as() or, under
+EditHistoryMiddleware, the request's user.
+"""
+import copy
+import datetime
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from operator import itemgetter
+
+from django.db import connections, router, transaction
+from django.db.models import DEFERRED, JSONField
+from django.db.models.signals import post_delete, post_init, post_save
+from django.http import HttpRequest
+
+from .models import EditHistory
+
+# Where an instance keeps its snapshot, in its __dict__.
+SNAPSHOT = '_history_snapshot'
+
+_trackers = {}
+_actor = ContextVar('edit_history_actor', default=None)
+_queues = threading.local()
+
+
+def _json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    # Decimal, UUID, FieldFile (its name), ...
+    return str(value)
+
+
+class Tracker:
+    """The tracked fields of one model, in snapshot order."""
+    __slots__ = ('model', 'exclude', 'names', 'attnames', 'positions', 'mutable', '_read')
+
+    def __init__(self, model, exclude=()):
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in exclude
+        ]
+        self.model = model
+        self.exclude = tuple(exclude)
+        self.names = [field.name for field in fields]
+        self.attnames = [field.attname for field in fields]
+        # save(update_fields=...) accepts either spelling.
+        self.positions = {name: i for i, field in enumerate(fields) for name in (field.name, field.attname)}
+        self.mutable = [i for i, field in enumerate(fields) if isinstance(field, JSONField)]
+        getter = itemgetter(*self.attnames)
+        self._read = getter if len(fields) > 1 else lambda state: (getter(state),)
+
+    def values(self, instance):
+        """The instance's current values, DEFERRED for fields not loaded."""
+        state = instance.__dict__
+        try:
+            return self._read(state)
+        except KeyError:
+            return tuple(state.get(attname, DEFERRED) for attname in self.attnames)
+
+    def snapshot(self, instance):
+        values = self.values(instance)
+        if self.mutable:
+            values = list(values)
+            for i in self.mutable:
+                values[i] = copy.deepcopy(values[i])
+            values = tuple(values)
+        return values
+
+    def remember(self, instance, fields=None):
+        """Take the instance's values, or just `fields` of them, as its new snapshot."""
+        before = instance.__dict__.get(SNAPSHOT)
+        if fields is None or before is None:
+            instance.__dict__[SNAPSHOT] = self.snapshot(instance)
+            return
+        current = self.snapshot(instance)
+        values = list(before)
+        for name in fields:
+            i = self.positions.get(name)
+            if i is not None:
+                values[i] = current[i]
+        instance.__dict__[SNAPSHOT] = tuple(values)
+
+    def changes(self, instance, fields=None):
+        """
+        {field: [old, new]} for the tracked fields, or just `fields`, that
+        differ from the snapshot. None when a value they had at load time
+        is unknown, because the instance has no snapshot or it was deferred.
+        """
+        before = instance.__dict__.get(SNAPSHOT)
+        if before is None:
+            return None
+        after = self.values(instance)
+        if fields is None:
+            positions = range(len(after))
+        else:
+            positions = [self.positions[name] for name in fields if name in self.positions]
+        changes = {}
+        for i in positions:
+            old, new = before[i], after[i]
+            if old is DEFERRED:
+                if fields is not None:
+                    return None
+            elif new is not DEFERRED and old != new:
+                changes[self.names[i]] = [_json(old), _json(new)]
+        return changes
+
+    def initial(self, instance):
+        """{field: [None, value]} for every field a new instance sets."""
+        return {
+            name: [None, _json(value)]
+            for name, value in zip(self.names, self.values(instance))
+            if value is not None and value != '' and value is not DEFERRED
+        }
+
+    def entry(self, instance, action, changes=None):
+        return EditHistory(
+            model_name=self.model.__name__, object_id=str(instance.pk), action=action,
+            performed_by_id=_performed_by(), changes=changes,
+        )
+
+
+# Who
+
+@contextmanager
+def acting_as(user):
+    """Attribute tracked saves in this block to `user` (a User, pk or HttpRequest)."""
+    token = _actor.set(user)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def _performed_by():
+    actor = _actor.get()
+    if isinstance(actor, HttpRequest):
+        actor = getattr(actor, 'user', None)
+    if actor is None or not getattr(actor, 'is_authenticated', True):
+        return None
+    return getattr(actor, 'pk', actor)
+
+
+# Queueing
+
+class _Queue:
+    """History waiting for one transaction, or one savepoint of it, to commit."""
+    __slots__ = ('hooks', 'savepoints', 'entries', 'open')
+
+    def __init__(self, connection):
+        # Django replaces its list of commit hooks when a transaction or
+        # savepoint is rolled back and when the hooks run, so a queue whose
+        # list is no longer current has been written or thrown away.
+        self.hooks = connection.run_on_commit
+        self.savepoints = list(connection.savepoint_ids)
+        self.entries = []
+        self.open = True
+
+    def current(self, connection):
+        return self.open and self.hooks is connection.run_on_commit and self.savepoints == connection.savepoint_ids
+
+    def write(self):
+        self.open = False
+        _write(self.entries)
+
+
+def _write(entries):
+    if entries:
+        EditHistory.objects.bulk_create(entries, batch_size=500)
+
+
+def _queue(entries, using):
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        _write(entries)
+        return
+    queue = getattr(_queues, using, None)
+    if queue is None or not queue.current(connection):
+        queue = _Queue(connection)
+        setattr(_queues, using, queue)
+        transaction.on_commit(queue.write, using=using)
+    queue.entries.extend(entries)
+
+
+# Signals
+
+def _snapshot(sender, instance, **kwargs):
+    instance.__dict__[SNAPSHOT] = _trackers[sender].snapshot(instance)
+
+
+def _saved(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    tracker = _trackers[sender]
+    if created:
+        entry = tracker.entry(instance, 'created', tracker.initial(instance))
+    else:
+        changes = tracker.changes(instance, update_fields)
+        entry = tracker.entry(instance, 'updated', changes) if changes else None
+    tracker.remember(instance, update_fields)
+    if entry is not None:
+        _queue([entry], using)
+
+
+def _deleted(sender, instance, using=None, **kwargs):
+    _queue([_trackers[sender].entry(instance, 'deleted')], using)
+
+
+def _uid(model):
+    return f"edit_history:{model._meta.label}"
+
+
+def track(model, exclude=()):
+    """Record EditHistory for saves and deletes of `model`, ignoring the `exclude` fields."""
+    _trackers[model] = Tracker(model, exclude)
+    post_init.connect(_snapshot, sender=model, dispatch_uid=_uid(model))
+    post_save.connect(_saved, sender=model, dispatch_uid=_uid(model))
+    post_delete.connect(_deleted, sender=model, dispatch_uid=_uid(model))
+
+
+def untrack(model):
+    """Stop tracking `model`. Returns its Tracker, or None if it was not tracked."""
+    for signal in (post_init, post_save, post_delete):
+        signal.disconnect(sender=model, dispatch_uid=_uid(model))
+    return _trackers.pop(model, None)
+
+
+def tracked(model):
+    return model in _trackers
+
+
+# Bulk updates
+
+def _write_objects(manager, objs, fields, batch_size):
+    # Objects given the same values are written with one UPDATE ... WHERE pk
+    # IN (...). queryset.bulk_update() builds a CASE branch per object and
+    # field instead, which is far slower, so it is only used when most
+    # objects differ.
+    attnames = [manager.model._meta.get_field(name).attname for name in fields]
+    groups = {}
+    try:
+        for obj in objs:
+            groups.setdefault(tuple(getattr(obj, attname) for attname in attnames), []).append(obj.pk)
+    except TypeError:
+        groups = None
+    if groups is None or len(groups) > len(objs) // 2:
+        manager.bulk_update(objs, fields, batch_size=batch_size)
+        return
+    for values, pks in groups.items():
+        for start in range(0, len(pks), batch_size):
+            manager.filter(pk__in=pks[start:start + batch_size]).update(**dict(zip(attnames, values)))
+
+
+def bulk_update(objs, fields, batch_size=None):
+    """
+    queryset.bulk_update() for instances of a tracked model, in one pass:
+    objects whose `fields` are unchanged since they were loaded are left
+    out, objects given the same values share an UPDATE, and the history of
+    all of them is queued together. Returns the number of objects written.
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    model = type(objs[0])
+    tracker = _trackers[model]
+    # Changes to untracked fields cannot be seen, so those objects are always written.
+    all_tracked = all(name in tracker.positions for name in fields)
+    changed, entries = [], []
+    for obj in objs:
+        changes = tracker.changes(obj, fields)
+        if changes:
+            entries.append(tracker.entry(obj, 'updated', changes))
+        if changes or changes is None or not all_tracked:
+            changed.append(obj)
+    if not changed:
+        return 0
+
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using, savepoint=False):
+        _write_objects(model._base_manager.using(using), changed, fields, batch_size or 500)
+        _queue(entries, using)
+    for obj in changed:
+        tracker.remember(obj, fields)
+    return len(changed)
@@ -0,0 +1,79 @@
+"""
+Pillow operations for profile images.
+
+Nothing here touches Django, so the functions can be pickled to worker
+processes started with the spawn method; AuthApp.profile_images wires them
+to storage and the User model. Limits are passed in by the caller.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def clean_image(data, max_bytes, max_pixels, formats, max_edge=None):
+    """
+    Validate an upload and re-encode its pixels without metadata.
+
+    EXIF (including GPS), XMP, ICC profiles and comments are dropped; EXIF
+    orientation is applied first so the picture stays upright. Images larger
+    than max_edge on either side are scaled down. Returns (bytes, extension):
+    JPEG, or PNG for images with transparency.
+    """
+    if len(data) > max_bytes:
+        raise InvalidImage(f"Images must be at most {max_bytes // (1024 * 1024)} MB.")
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            image_format, (width, height) = probe.format, probe.size
+            probe.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidImage("Upload a valid image.")
+    if image_format not in formats:
+        raise InvalidImage(f"{image_format} images are not supported.")
+    # Checked before decoding so a small file cannot expand into a huge bitmap.
+    if width * height > max_pixels:
+        raise InvalidImage(f"Images must be at most {max_pixels:,} pixels.")
+
+    with Image.open(io.BytesIO(data)) as image:
+        if max_edge and max(width, height) > max_edge:
+            scale = max_edge / max(width, height)
+            # Let the JPEG decoder skip detail first (a 1/2..1/8 scale decode),
+            # then resize the rest of the way.
+            image.draft('RGB', (round(width * scale), round(height * scale)))
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS, reducing_gap=None)
+        image = ImageOps.exif_transpose(image)
+        out = io.BytesIO()
+        if _has_alpha(image):
+            image.convert('RGBA').save(out, 'PNG', optimize=True)
+            return out.getvalue(), 'png'
+        image.convert('RGB').save(out, 'JPEG', quality=90)
+        return out.getvalue(), 'jpg'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def render_variants(data, sizes, quality=80):
+    """
+    Square WebP thumbnails of a cleaned image, as {size: bytes}.
+
+    JPEGs are decoded at reduced scale (draft mode), and each size is resized
+    from the next larger one rather than from the full image.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        largest = max(sizes)
+        if image.format == 'JPEG':
+            image.draft('RGB', (largest, largest))
+        current = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        current = ImageOps.fit(current, (size, size), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        current.save(out, 'WEBP', quality=quality, method=4)
+        variants[size] = out.getvalue()
+    return variants
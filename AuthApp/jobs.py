@@ -0,0 +1,48 @@
+"""
+Periodic jobs run by `manage.py run_jobs`.
+"""
+from django.conf import settings
+
+from .applications import extract_pending
+from .archive import archive_all
+from .leave import reconcile_availability
+from .ledger import close_periods
+from .profile_images import build_missing_variants
+from .scheduler import job
+from .sessions import sweep_expired
+from .summaries import reconcile_all
+
+
+@job('archive_logs', interval=lambda: settings.ARCHIVE_INTERVAL)
+def archive_logs():
+    return archive_all()
+
+
+@job('build_image_variants', interval=lambda: settings.PROFILE_IMAGE_REBUILD_INTERVAL)
+def build_image_variants():
+    return build_missing_variants()
+
+
+@job('reconcile_summaries', interval=lambda: settings.SUMMARY_RECONCILE_INTERVAL)
+def reconcile_summaries():
+    return reconcile_all()
+
+
+@job('close_ledger_periods', interval=lambda: settings.LEDGER_CLOSE_INTERVAL)
+def close_ledger_periods():
+    return len(close_periods())
+
+
+@job('reconcile_leave_calendar', interval=lambda: settings.LEAVE_RECONCILE_INTERVAL)
+def reconcile_leave_calendar():
+    return reconcile_availability()
+
+
+@job('extract_resume_text', interval=lambda: settings.RESUME_EXTRACT_INTERVAL)
+def extract_resume_text():
+    return extract_pending()
+
+
+@job('sweep_sessions', interval=lambda: settings.SESSION_SWEEP_INTERVAL)
+def sweep_sessions():
+    return sweep_expired()
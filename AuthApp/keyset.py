@@ -0,0 +1,132 @@
+"""
+Keyset pagination and approximate counts for large tables.
+
+OFFSET pagination reads and throws away every row before the page, and the
+admin changelist adds a COUNT(*) on top; both grow with the table. A keyset
+page instead continues from the last row seen: for newest-first order on
+(created_at, id) the next page is
+
+    WHERE created_at <= :t AND (created_at < :t OR (created_at = :t AND id < :id))
+    ORDER BY created_at DESC, id DESC LIMIT :n
+
+which is a range scan on an index over the same columns, however deep the
+page. Cursors are opaque strings holding those values.
+
+approximate_count() reads table statistics instead of counting rows.
+"""
+import base64
+import json
+
+from django.db import connections, router
+from django.db.models import Q
+
+NEXT, PREVIOUS = 'n', 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, [str(value) for value in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    try:
+        direction, values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if direction not in (NEXT, PREVIOUS) or len(values) != len(fields):
+            raise ValueError
+        return direction, [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise InvalidCursor(f"Invalid page cursor {cursor!r}.")
+
+
+def _beyond(fields, values, lookup):
+    """Rows strictly past `values` in (fields) order, comparing with lookup 'lt' or 'gt'."""
+    condition = Q()
+    equal = {}
+    for field, value in zip(fields, values):
+        condition |= Q(**equal, **{f"{field}__{lookup}": value})
+        equal[field] = value
+    # The redundant bound on the leading column lets the index range scan start at the cursor.
+    inclusive = {'lt': 'lte', 'gt': 'gte'}[lookup]
+    return Q(**{f"{fields[0]}__{inclusive}": values[0]}) & condition
+
+
+def keyset_queryset(queryset, fields, direction=NEXT, values=None):
+    """
+    `queryset` ordered by `fields`, newest first for NEXT and oldest first
+    for PREVIOUS, limited to rows past `values` in that direction.
+    """
+    if direction == NEXT:
+        ordered = queryset.order_by(*[f"-{field}" for field in fields])
+        return ordered if values is None else ordered.filter(_beyond(fields, values, 'lt'))
+    return queryset.order_by(*fields).filter(_beyond(fields, values, 'gt'))
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(queryset, cursor=None, size=100, fields=('created_at', 'id')):
+    """
+    One page of `queryset`, newest first by `fields`, starting after `cursor`
+    (from a previous page's next_cursor or previous_cursor, or None for the
+    first page). The last field must be unique.
+    """
+    fields = list(fields)
+    direction, values = decode_cursor(cursor, queryset.model, fields) if cursor else (NEXT, None)
+    rows = list(keyset_queryset(queryset, fields, direction, values)[:size + 1])
+    more = len(rows) > size
+    rows = rows[:size]
+    if direction == PREVIOUS:
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    def key(row):
+        return [getattr(row, field) for field in fields]
+
+    has_next = more if direction == NEXT else True
+    has_previous = values is not None if direction == NEXT else more
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(NEXT, key(rows[-1])) if has_next else None,
+        previous_cursor=encode_cursor(PREVIOUS, key(rows[0])) if has_previous else None,
+    )
+
+
+def approximate_count(model, using=None):
+    """
+    Roughly how many rows `model`'s table holds, without scanning it:
+    planner statistics on PostgreSQL, the rowid span on SQLite (an upper
+    bound when rows were deleted from the middle). Falls back to COUNT(*).
+    """
+    using = using or router.db_for_read(model)
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    estimate = None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            # -1 until the table is first vacuumed or analyzed.
+            if row and row[0] >= 0:
+                estimate = row[0]
+        elif connection.vendor == 'sqlite':
+            # Separate subqueries: SQLite only answers a lone MIN() or MAX() from the b-tree edge.
+            cursor.execute(f"SELECT (SELECT MAX(rowid) FROM {table}) - (SELECT MIN(rowid) FROM {table}) + 1")
+            estimate = cursor.fetchone()[0] or 0
+    if estimate is None:
+        estimate = model._default_manager.using(using).count()
+    return estimate
@@ -0,0 +1,285 @@
+"""
+Leave calendar.
+
+A LeaveRequest covers start_date to end_date, both included, and the
+calendar's questions are all about overlapping date ranges: who is on leave
+this week, does a request clash with leave already granted, how many of
+each role are away on each day of a month. Each is answered in SQL.
+
+Overlap. Leave overlaps the days a..b when start_date <= b and end_date >= a.
+An index on start_date only bounds the first half, so it would read every
+leave that started before b, years of it. Instead each leave stores its
+length class, span: it lasts at most 2 ** span days, so within one class any
+leave overlapping a..b started on or after a - (2 ** span - 1). The
+leave_span_covers_dates constraint rejects a span too short for the dates,
+so leave written by bulk_create() or update() cannot drop out of the lookup.
+overlapping() asks for one bounded range per class,
+
+    (span = 0 AND start_date BETWEEN a AND b)
+    OR (span = 1 AND start_date BETWEEN a - 1 AND b)
+    OR (span = 2 AND start_date BETWEEN a - 3 AND b) ...
+
+and each is a range scan of leave_interval_idx (span, start_date) over
+approved leave, with end_date checked only on the rows it returns. A lookup
+reads at most about twice the leave it finds, however much history there
+is. SQLite and PostgreSQL both run the OR as separate index scans; SQLite
+only does so when every branch repeats the index's status = 'approved'.
+
+Availability. DailyAvailability counts users on approved leave per day,
+role and sub_role. Approving leave adds one to each of its days and
+cancelling approved leave takes it away again, in the same transaction,
+with F() updates. month_availability() reads a month of those counts
+together with the active users of each role (RoleSummary) in one query.
+Counts follow the role a user had when their leave was approved, which
+is stored on the leave, so cancelling takes the day back from that role
+even if the user's role has changed since; the reconcile_leave_calendar job recounts the days around today from the leave
+itself, like the dashboard rollups' reconciliation.
+"""
+import calendar
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateField, F, Q, Value
+from django.utils import timezone
+
+from .activity import log_audit
+from .models import DailyAvailability, LeaveRequest, RoleSummary, User
+from .permissions import role_pairs
+
+ACTIVE_STATUSES = ['pending', 'approved']
+
+
+class LeaveError(ValueError):
+    pass
+
+
+class LeaveConflict(LeaveError):
+    pass
+
+
+def _day(n):
+    return datetime.timedelta(days=n)
+
+
+# Overlap
+
+def overlapping(start, end):
+    """Q for approved leave overlapping the days `start` to `end` inclusive, as index range scans."""
+    by_span = Q()
+    for span in range(LeaveRequest.MAX_SPAN + 1):
+        by_span |= Q(status='approved', span=span, start_date__gte=start - _day(2 ** span - 1), start_date__lte=end)
+    return by_span & Q(end_date__gte=start)
+
+
+def on_leave(start, end=None, roles=None):
+    """
+    Approved leave overlapping the days `start` to `end` (default: just
+    `start`), of users with `roles` ('student', 'employee:hr') if given.
+    """
+    leave = LeaveRequest.objects.filter(overlapping(start, end or start))
+    if roles:
+        leave = leave.filter(_role_filter(roles, 'user__'))
+    return leave
+
+
+def clashes(user, start, end, statuses=ACTIVE_STATUSES, exclude=None):
+    """The user's leave with `statuses` overlapping `start` to `end`, found through leave_user_idx."""
+    leave = LeaveRequest.objects.filter(
+        user=user, status__in=statuses,
+        start_date__lte=end, start_date__gte=start - _day(2 ** LeaveRequest.MAX_SPAN - 1), end_date__gte=start,
+    )
+    if exclude is not None:
+        leave = leave.exclude(pk=exclude.pk)
+    return leave
+
+
+def _check_dates(start, end):
+    if end < start:
+        raise LeaveError("Leave cannot end before it starts.")
+    days = (end - start).days + 1
+    limit = min(settings.LEAVE_MAX_DAYS, 2 ** LeaveRequest.MAX_SPAN)
+    if days > limit:
+        raise LeaveError(f"Leave can last at most {limit} days.")
+
+
+# Requests
+
+def request_leave(user, start_date, end_date, reason='', parent=None):
+    """
+    Apply for leave. Raises LeaveConflict when it overlaps the user's
+    pending or approved leave. Returns the LeaveRequest.
+    """
+    _check_dates(start_date, end_date)
+    with transaction.atomic():
+        if clashes(user, start_date, end_date).exists():
+            raise LeaveConflict("This leave overlaps leave already requested.")
+        return LeaveRequest.objects.create(
+            user=user, start_date=start_date, end_date=end_date, reason=reason, parent=parent,
+        )
+
+
+def _role_of(user_id):
+    role, sub_role = User.objects.values_list('role', 'sub_role').get(pk=user_id)
+    return role, sub_role or ''
+
+
+def _counted_role(leave_id):
+    """The role approved leave is counted under; the user's own for leave approved around approve_leave()."""
+    role, sub_role, user_role, user_sub_role = LeaveRequest.objects.values_list(
+        'role', 'sub_role', 'user__role', 'user__sub_role',
+    ).get(pk=leave_id)
+    return (role, sub_role) if role else (user_role, user_sub_role or '')
+
+
+def _action(leave, current, status, by, **fields):
+    """Move `leave` from `current` to `status`, setting `fields`; False when it was not `current`."""
+    now = timezone.now()
+    fields.update(status=status, actioned_at=now, actioned_by=by)
+    if not LeaveRequest.objects.filter(pk=leave.pk, status=current).update(**fields):
+        return False
+    for name, value in fields.items():
+        setattr(leave, name, value)
+    return True
+
+
+def approve_leave(leave, approver=None):
+    """
+    Approve pending leave and count it in DailyAvailability. Raises
+    LeaveConflict when it overlaps approved leave of the same user and
+    LeaveError when it is no longer pending.
+    """
+    with transaction.atomic():
+        # The user's row first, so two approvals for one user queue up and
+        # the second sees the first.
+        list(User.objects.select_for_update().filter(pk=leave.user_id).values_list('pk'))
+        if clashes(leave.user_id, leave.start_date, leave.end_date, statuses=['approved'], exclude=leave).exists():
+            raise LeaveConflict("This leave overlaps approved leave.")
+        role, sub_role = _role_of(leave.user_id)
+        if not _action(leave, 'pending', 'approved', approver, role=role, sub_role=sub_role):
+            raise LeaveError(f"Leave {leave.pk} is not pending.")
+        _count(leave.start_date, leave.end_date, role, sub_role, 1)
+    if approver is not None:
+        log_audit(approver, 'approve', leave)
+    return leave
+
+
+def reject_leave(leave, approver=None):
+    """Reject pending leave."""
+    if not _action(leave, 'pending', 'rejected', approver):
+        raise LeaveError(f"Leave {leave.pk} is not pending.")
+    if approver is not None:
+        log_audit(approver, 'reject', leave)
+    return leave
+
+
+def cancel_leave(leave, user=None):
+    """Cancel pending or approved leave; approved days become available again."""
+    with transaction.atomic():
+        if _action(leave, 'approved', 'cancelled', user):
+            _count(leave.start_date, leave.end_date, *_counted_role(leave.pk), -1)
+        elif not _action(leave, 'pending', 'cancelled', user):
+            raise LeaveError(f"Leave {leave.pk} is not pending or approved.")
+    if user is not None:
+        log_audit(user, 'cancel', leave)
+    return leave
+
+
+# Availability
+
+def _count(start, end, role, sub_role, delta):
+    """Add `delta` to the on-leave count of `role` on every day from `start` to `end`."""
+    days = (end - start).days + 1
+    DailyAvailability.objects.bulk_create(
+        [DailyAvailability(day=start + _day(n), role=role, sub_role=sub_role) for n in range(days)],
+        batch_size=500, ignore_conflicts=True,
+    )
+    DailyAvailability.objects.filter(day__gte=start, day__lte=end, role=role, sub_role=sub_role).update(
+        on_leave=F('on_leave') + delta,
+    )
+
+
+def reconcile_availability(start=None, end=None):
+    """
+    Recount DailyAvailability for the days `start` to `end` from approved
+    leave; by default from the first of last month to LEAVE_CALENDAR_DAYS
+    ahead. Returns the number of rows written.
+    """
+    today = timezone.localdate()
+    start = start or (today.replace(day=1) - _day(1)).replace(day=1)
+    end = end or today + _day(settings.LEAVE_CALENDAR_DAYS)
+    # Per role, +1 on the first day of each leave within the window and -1
+    # on the day after its last; running sums give the count of each day.
+    steps = {}
+    for first, last, role, sub_role, user_role, user_sub_role in on_leave(start, end).order_by().values_list(
+        'start_date', 'end_date', 'role', 'sub_role', 'user__role', 'user__sub_role',
+    ):
+        if not role:
+            role, sub_role = user_role, user_sub_role or ''
+        role_steps = steps.setdefault((role, sub_role), {})
+        first, after = max(first, start), min(last, end) + _day(1)
+        role_steps[first] = role_steps.get(first, 0) + 1
+        role_steps[after] = role_steps.get(after, 0) - 1
+
+    rows = []
+    for (role, sub_role), role_steps in steps.items():
+        count, day = 0, start
+        for change_day in sorted(role_steps):
+            while day < change_day:
+                if count:
+                    rows.append(DailyAvailability(day=day, role=role, sub_role=sub_role, on_leave=count))
+                day += _day(1)
+            count += role_steps[change_day]
+    with transaction.atomic():
+        DailyAvailability.objects.filter(day__gte=start, day__lte=end).delete()
+        DailyAvailability.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _role_filter(roles, prefix=''):
+    by_role = Q()
+    for role, sub_role in role_pairs(roles):
+        if sub_role:
+            by_role |= Q(**{f'{prefix}role': role, f'{prefix}sub_role': sub_role})
+        else:
+            by_role |= Q(**{f'{prefix}role': role})
+    return by_role
+
+
+def month_availability(month, roles=None):
+    """
+    Staff availability for each day of the month containing `month`, from
+    the rollups in one query:
+
+        {'month', 'days': [date, ...],
+         'rows': [{'role', 'sub_role', 'staff', 'on_leave': [count per day],
+                   'available': [count per day]}, ...]}
+
+    staff is the role's active users. `roles` ('employee', 'employee:hr')
+    narrows the rows; roles nobody holds or is away from are left out.
+    """
+    first = month.replace(day=1)
+    days = [first + _day(n) for n in range(calendar.monthrange(first.year, first.month)[1])]
+    staff = RoleSummary.objects.values_list(
+        'role', 'sub_role', Value(None, output_field=DateField()), 'active_users',
+    )
+    away = DailyAvailability.objects.filter(day__gte=days[0], day__lte=days[-1]).values_list(
+        'role', 'sub_role', 'day', 'on_leave',
+    )
+    if roles:
+        staff, away = staff.filter(_role_filter(roles)), away.filter(_role_filter(roles))
+
+    grid = {}
+    for role, sub_role, day, count in staff.union(away, all=True):
+        row = grid.setdefault((role, sub_role), {'role': role, 'sub_role': sub_role, 'staff': 0, 'on_leave': [0] * len(days)})
+        if day is None:
+            row['staff'] = count
+        else:
+            row['on_leave'][day.day - 1] = count
+    rows = []
+    for key in sorted(grid):
+        row = grid[key]
+        if row['staff'] or any(row['on_leave']):
+            row['available'] = [max(row['staff'] - count, 0) for count in row['on_leave']]
+            rows.append(row)
+    return {'month': first, 'days': days, 'rows': rows}
@@ -0,0 +1,236 @@
+"""
+Finance ledger.
+
+FinanceTransaction rows are append-only. post_entry() writes an entry and,
+for fees, payments and refunds, moves the student's StudentAccount balance
+in the same transaction, with one UPDATE ... SET pending_balance =
+pending_balance + :delta. That UPDATE locks the account row until commit,
+so concurrent postings for one student queue up instead of losing each
+other's changes, and the balance read back is stored on the entry as
+balance_after. A balance at any moment is then the balance_after of the
+last entry before it, found from an index rather than by summing history.
+Mistakes are corrected with reverse_entry(), which posts the negated amount.
+
+Reports never scan full history either. Once a month has ended (plus
+LEDGER_CLOSE_DELAY, for transactions still in flight at midnight),
+close_periods() stores its per-type totals as LedgerPeriod rows. statement()
+reads those for every closed month in the range and aggregates only the
+rest, the partial months at either end and the open month, from the
+entries, all grouped by month and type in the database.
+
+Entries are dated when posted, so nothing lands in a month after it is
+closed. Importing history with bulk_create() must happen before the
+months it covers are closed.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import FinanceTransaction, LedgerPeriod, StudentAccount
+
+TYPES = [transaction_type for transaction_type, _ in FinanceTransaction.TRANSACTION_TYPES]
+
+# How each type moves the student's pending balance (what they owe).
+BALANCE_EFFECT = {'fee': 1, 'payment': -1, 'refund': 1}
+
+# How each type moves the institution's cash. Fees are billed, not received.
+CASH_EFFECT = {'income': 1, 'payment': 1, 'expense': -1, 'refund': -1, 'salary': -1}
+
+
+class LedgerError(ValueError):
+    pass
+
+
+def _move_balance(student_id, delta):
+    accounts = StudentAccount.objects.filter(student_id=student_id)
+    change = {'pending_balance': F('pending_balance') + delta, 'last_updated': timezone.now()}
+    if not accounts.update(**change):
+        StudentAccount.objects.bulk_create([StudentAccount(student_id=student_id)], ignore_conflicts=True)
+        accounts.update(**change)
+    # Locked by the UPDATE above until commit.
+    return accounts.values_list('pending_balance', flat=True).get()
+
+
+def post_entry(transaction_type, amount, student=None, description='', created_by=None, reverses=None):
+    """
+    Append an entry to the ledger and move the student's balance with it.
+    `amount` is positive except on reversals. Returns the FinanceTransaction.
+    """
+    if transaction_type not in TYPES:
+        raise LedgerError(f"Unknown transaction type {transaction_type!r}.")
+    amount = Decimal(amount)
+    if reverses is None and amount <= 0:
+        raise LedgerError("Amounts must be positive; use reverse_entry() to undo an entry.")
+    student_id = getattr(student, 'pk', student)
+    effect = BALANCE_EFFECT.get(transaction_type, 0)
+    if effect and student_id is None:
+        raise LedgerError(f"A {transaction_type} needs a student.")
+
+    with transaction.atomic():
+        balance = _move_balance(student_id, effect * amount) if effect else None
+        return FinanceTransaction.objects.create(
+            transaction_type=transaction_type, amount=amount, description=description,
+            student_id=student_id, created_by=created_by, balance_after=balance, reverses=reverses,
+        )
+
+
+def reverse_entry(entry, created_by=None, description=''):
+    """Post an entry cancelling `entry`. Each entry can be reversed once."""
+    if entry.reverses_id:
+        raise LedgerError("A reversal cannot itself be reversed; post a new entry instead.")
+    try:
+        with transaction.atomic():
+            return post_entry(
+                entry.transaction_type, -entry.amount, student=entry.student_id,
+                description=description or f"Reversal of {entry.pk}", created_by=created_by, reverses=entry,
+            )
+    except IntegrityError:
+        raise LedgerError(f"Entry {entry.pk} has already been reversed.")
+
+
+def balance_at(student, moment):
+    """The student's pending balance just after `moment`."""
+    balance = (
+        FinanceTransaction.objects
+        .filter(student_id=getattr(student, 'pk', student), created_at__lte=moment, balance_after__isnull=False)
+        .order_by('-created_at').values_list('balance_after', flat=True).first()
+    )
+    return balance if balance is not None else Decimal('0.00')
+
+
+# Periods
+
+def month_of(moment):
+    """First day of the local month containing `moment`."""
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _grouped(ranges):
+    """
+    {(month, type): (total, entries)} for entries within the (low, high)
+    day ranges, which must not span a month boundary. One query: rows are
+    bucketed by month with plain comparisons in a CASE and aggregated in
+    the database.
+    """
+    buckets = [
+        When(created_at__gte=_midnight(low), created_at__lt=_midnight(high), then=Value(low.replace(day=1)))
+        for low, high in ranges
+    ]
+    within = Q()
+    for low, high in ranges:
+        within |= Q(created_at__gte=_midnight(low), created_at__lt=_midnight(high))
+    rows = (
+        FinanceTransaction.objects.filter(within).order_by()
+        .annotate(month=Case(*buckets, output_field=DateField()))
+        .values_list('month', 'transaction_type').annotate(total=Sum('amount'), entries=Count('pk'))
+    )
+    return {(month, kind): (total, count) for month, kind, total, count in rows}
+
+
+def close_periods(now=None):
+    """
+    Snapshot every month that ended at least LEDGER_CLOSE_DELAY seconds
+    ago and is not closed yet. Returns the months closed.
+    """
+    now = now or timezone.now()
+    cutoff = month_of(now - datetime.timedelta(seconds=settings.LEDGER_CLOSE_DELAY))
+    last = LedgerPeriod.objects.order_by('-month').values_list('month', flat=True).first()
+    if last is not None:
+        month = next_month(last)
+    else:
+        first = FinanceTransaction.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if first is None:
+            return []
+        month = month_of(first)
+
+    closed = []
+    while month < cutoff:
+        totals = _grouped([(month, next_month(month))])
+        # Every type gets a row, so a month with rows is a closed month.
+        LedgerPeriod.objects.bulk_create(
+            [
+                LedgerPeriod(month=month, transaction_type=kind, total=total, entries=count)
+                for kind in TYPES
+                for total, count in [totals.get((month, kind), (Decimal('0.00'), 0))]
+            ],
+            ignore_conflicts=True,
+        )
+        closed.append(month)
+        month = next_month(month)
+    return closed
+
+
+# Reports
+
+def statement(start, end):
+    """
+    Income, expense and salary statement for the days `start` to `end`
+    inclusive, by month:
+
+        {'start', 'end',
+         'months': [{'month', 'totals': {type: amount}, 'entries', 'net'}],
+         'totals': {type: amount}, 'income', 'expenses', 'salaries', 'net'}
+
+    Income is income plus student payments; expenses include refunds.
+    """
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    whole = [month for month in months if month >= start and next_month(month) - datetime.timedelta(days=1) <= end]
+
+    grid = {}
+    for month, kind, total, count in LedgerPeriod.objects.filter(month__in=whole).values_list(
+        'month', 'transaction_type', 'total', 'entries',
+    ):
+        grid[month, kind] = (total, count)
+    closed = {month for month, _ in grid}
+
+    # Everything a snapshot does not cover: partial and open months.
+    ranges = [
+        (max(start, month), min(end + datetime.timedelta(days=1), next_month(month)))
+        for month in months if month not in closed
+    ]
+    if ranges:
+        grid.update(_grouped(ranges))
+
+    zero = Decimal('0.00')
+    report_months = []
+    totals = dict.fromkeys(TYPES, zero)
+    for month in months:
+        month_totals = {kind: grid.get((month, kind), (zero, 0))[0] for kind in TYPES}
+        for kind, amount in month_totals.items():
+            totals[kind] += amount
+        report_months.append({
+            'month': month,
+            'totals': month_totals,
+            'entries': sum(grid.get((month, kind), (zero, 0))[1] for kind in TYPES),
+            'net': _net(month_totals),
+        })
+    return {
+        'start': start,
+        'end': end,
+        'months': report_months,
+        'totals': totals,
+        'income': totals['income'] + totals['payment'],
+        'expenses': totals['expense'] + totals['refund'],
+        'salaries': totals['salary'],
+        'net': _net(totals),
+    }
+
+
+def _net(totals):
+    return sum((CASH_EFFECT.get(kind, 0) * amount for kind, amount in totals.items()), Decimal('0.00'))
@@ -0,0 +1,216 @@
+"""
+End-to-end load tests, for `manage.py loadtest`.
+
+Each scenario is a page of the real URLconf requested as a given kind of
+user. run_load() runs the scenarios one after another, each with `clients`
+threads sending `requests` requests between them through the whole
+middleware stack, every thread logged in as a different user of the
+scenario's role. Latencies are taken per request, and throughput over the
+time from the first request to the last.
+
+A run is a JSON document (LoadReport.as_dict()) with p50/p95/p99
+latencies and throughput per scenario, plus what the numbers depend on:
+the database, the number of users, the clients. Saved as the baseline
+(LOADTEST_BASELINE), it is what later runs are compared against;
+compare() reports each scenario whose p50 or p95 grew, or whose
+throughput fell, by more than LOADTEST_TOLERANCE.
+
+Meant for a database filled by seed_benchmark: scenarios fail when no
+user has their role. Requests are served with DEBUG off, as in production.
+"""
+import datetime
+import itertools
+import json
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .models import User
+from .seeding import LAST_NAMES, SUBJECTS
+
+# name: (who, URL name, query string; {word} is a different search word each request)
+SCENARIOS = {
+    'dashboard': ('admin', 'dashboard_counts', ''),
+    'search': ('student', 'search', 'q={word}'),
+    'leave_availability': ('employee:hr', 'leave_availability', ''),
+    'approval_inbox': ('employee:finance', 'approval_inbox', ''),
+    'admin_users': ('admin', 'admin:AuthApp_user_changelist', 'q={word}'),
+    'admin_notifications': ('admin', 'admin:AuthApp_notification_changelist', ''),
+}
+
+WORDS = LAST_NAMES + SUBJECTS
+
+# Compared with the baseline; p99 is reported only, being too noisy to gate on.
+LATENCIES = ['p50_ms', 'p95_ms']
+
+
+class LoadTestError(ValueError):
+    pass
+
+
+class ScenarioResult:
+    def __init__(self, name, latencies, errors, seconds):
+        self.name = name
+        self.latencies = latencies
+        self.errors = errors
+        self.seconds = seconds
+
+    def percentile(self, percent):
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method='inclusive')[percent - 1]
+
+    def as_dict(self):
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'throughput_rps': round(len(self.latencies) / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+class LoadReport:
+    def __init__(self, results, clients):
+        self.results = results
+        self.clients = clients
+
+    def as_dict(self):
+        return {
+            'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'users': User.objects.count(),
+            'clients': self.clients,
+            'scenarios': {result.name: result.as_dict() for result in self.results},
+        }
+
+
+def _users(who, count):
+    role, _, sub_role = who.partition(':')
+    users = User.objects.filter(role=role, is_active=True).order_by('pk')
+    if sub_role:
+        users = users.filter(sub_role=sub_role)
+    users = list(users[:count])
+    if not users:
+        raise LoadTestError(f"No active {who} user to log in as; run seed_benchmark first.")
+    return users
+
+
+def run_scenario(name, clients=8, requests=200, warmup=5):
+    """
+    Send `requests` requests for scenario `name` from `clients` threads (one
+    client runs in the calling thread). Returns a ScenarioResult.
+    """
+    who, url_name, query = SCENARIOS[name]
+    url = reverse(url_name)
+    users = _users(who, clients)
+    numbers = itertools.count()
+    lock = threading.Lock()
+    latencies, errors, failures = [], [], []
+    ready = threading.Barrier(clients + 1) if clients > 1 else None
+
+    def path(number):
+        return f"{url}?{query.format(word=WORDS[number % len(WORDS)])}" if query else url
+
+    def work(user):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        try:
+            for number in range(warmup):
+                client.get(path(number))
+            if ready is not None:
+                ready.wait()
+            mine, failed = [], 0
+            while True:
+                with lock:
+                    number = next(numbers)
+                if number >= requests:
+                    break
+                start = time.perf_counter()
+                response = client.get(path(number))
+                mine.append(time.perf_counter() - start)
+                failed += response.status_code >= 400
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+        finally:
+            client.logout()
+
+    def thread(user):
+        try:
+            work(user)
+        except Exception as exc:
+            failures.append(exc)
+            ready.abort()
+        finally:
+            connections.close_all()
+
+    if ready is None:
+        start = time.perf_counter()
+        work(users[0])
+        return ScenarioResult(name, latencies, sum(errors), time.perf_counter() - start)
+
+    threads = [threading.Thread(target=thread, args=(users[index % len(users)],)) for index in range(clients)]
+    for worker in threads:
+        worker.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    for worker in threads:
+        worker.join()
+    if failures:
+        raise LoadTestError(f"A client of {name} failed: {failures[0]!r}") from failures[0]
+    return ScenarioResult(name, latencies, sum(errors), time.perf_counter() - start)
+
+
+def run_load(scenarios=None, clients=8, requests=200, warmup=5):
+    """Run `scenarios` (default: all) one after another. Returns a LoadReport."""
+    unknown = set(scenarios or ()) - set(SCENARIOS)
+    if unknown:
+        raise LoadTestError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        results = [run_scenario(name, clients, requests, warmup) for name in scenarios or SCENARIOS]
+    return LoadReport(results, clients)
+
+
+# Baselines
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def compare(current, baseline, tolerance=None):
+    """
+    Regressions of run `current` against `baseline` (both as_dict()s), as
+    (scenario, metric, baseline value, current value), for scenarios in
+    both. A latency counts when it grew, and throughput when it fell, by
+    more than `tolerance` (default LOADTEST_TOLERANCE).
+    """
+    tolerance = settings.LOADTEST_TOLERANCE if tolerance is None else tolerance
+    regressions = []
+    for name, now in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric in LATENCIES:
+            if now[metric] > before[metric] * (1 + tolerance):
+                regressions.append((name, metric, before[metric], now[metric]))
+        if now['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append((name, 'throughput_rps', before['throughput_rps'], now['throughput_rps']))
+    return regressions
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.archive import ARCHIVED, archive_model
+from AuthApp.trash import sweep_blobs
+
+
+class Command(BaseCommand):
+    help = "Move old audit/activity/trash rows into monthly compressed JSONL archives."
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help="Tables to archive (default: all).")
+        parser.add_argument('--older-than', type=int, metavar='DAYS', help="Override the configured retention window.")
+        parser.add_argument('--chunk-size', type=int, help="Rows moved per delete transaction.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['labels']) - set(ARCHIVED)
+        if unknown:
+            raise CommandError(f"Unknown table(s): {', '.join(sorted(unknown))}. Choose from {', '.join(ARCHIVED)}.")
+        older_than = timedelta(days=options['older_than']) if options['older_than'] is not None else None
+        for label in options['labels'] or ARCHIVED:
+            moved = archive_model(label, older_than=older_than, chunk_size=options['chunk_size'])
+            self.stdout.write(f"{label}: archived {moved} row(s).")
+        if 'trash' in (options['labels'] or ARCHIVED):
+            self.stdout.write(f"trash: deleted {sweep_blobs()} unused blob(s).")
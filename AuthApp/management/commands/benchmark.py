@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from AuthApp.activity import close_buffer
+from AuthApp.benchmarks import BENCHMARKS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Run performance benchmarks against a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Benchmarks to run (default: all).")
+        parser.add_argument('--size', type=int, help="Override the benchmark's default row count.")
+        parser.add_argument('--list', action='store_true', help="List the available benchmarks.")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, func in sorted(BENCHMARKS.items()):
+                self.stdout.write(f"{name} (size {func.default_size})")
+            return
+
+        names = options['names'] or sorted(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+        # A file-backed SQLite database so worker threads see the same data
+        # with real locking, rather than the shared-cache in-memory default.
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            tmpdir = tempfile.mkdtemp(prefix="instracore-bench-")
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, "bench.sqlite3")
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            run_benchmarks(names, self.stdout, options['size'], self.style)
+        finally:
+            # Write out buffered log entries while the test database exists;
+            # the flush at exit would go to the real one.
+            close_buffer()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                # WAL mode can leave -wal/-shm files next to the database.
+                shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.bulk_users import FORMATS, csv_lines, export_rows, file_format, write_xlsx
+from AuthApp.models import User
+
+
+class Command(BaseCommand):
+    help = "Export users as CSV or XLSX, streamed from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', help="Output file (default: CSV on stdout).")
+        parser.add_argument('--format', choices=FORMATS, help="File format (default: from the extension).")
+        parser.add_argument('--role', help="Only users with this role.")
+        parser.add_argument('--sub-role', help="Only users with this sub-role.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['role']:
+            users = users.filter(role=options['role'])
+        if options['sub_role']:
+            users = users.filter(sub_role=options['sub_role'])
+        rows = export_rows(users)
+
+        output = options['output']
+        try:
+            format = options['format'] or (file_format(output) if output else 'csv')
+            if format == 'xlsx':
+                if not output:
+                    raise CommandError("XLSX exports need --output.")
+                write_xlsx(rows, output)
+            elif output:
+                with open(output, 'w', newline='') as f:
+                    f.writelines(csv_lines(rows))
+            else:
+                for line in csv_lines(rows):
+                    self.stdout.write(line, ending='')
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from AuthApp.activity import recover_journals
+
+
+class Command(BaseCommand):
+    help = "Replay activity/audit log journals left behind by processes that exited without flushing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Replay every journal, even ones owned by a running process. Stop the web workers first.",
+        )
+
+    def handle(self, *args, **options):
+        recovered = recover_journals(force=options['force'])
+        self.stdout.write(f"Recovered {recovered} log entries.")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.bulk_users import FORMATS, file_format
+from AuthApp.models import Course
+from AuthApp.results import import_marks, publish_results
+
+
+class Command(BaseCommand):
+    help = "Load a course's marks from a CSV or XLSX file, and optionally publish its results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help="Course code.")
+        parser.add_argument('path', help="CSV or XLSX file with username, marks_obtained and total_marks columns.")
+        parser.add_argument('--format', choices=FORMATS, help="File format (default: from the extension).")
+        parser.add_argument('--total-marks', help="Total marks for rows without a total_marks column.")
+        parser.add_argument('--publish', action='store_true', help="Grade and publish the course's results afterwards.")
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(code=options['course'])
+        except (Course.DoesNotExist, Course.MultipleObjectsReturned):
+            raise CommandError(f"No single course with code {options['course']!r}.")
+        try:
+            format = options['format'] or file_format(options['path'])
+            with open(options['path'], 'rb') as f:
+                result = import_marks(course, f, format, total_marks=options['total_marks'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(f"saved {result.saved} mark(s), {len(result.errors)} row(s) rejected.")
+        if options['publish']:
+            stats = publish_results(course)
+            if stats is None:
+                self.stdout.write("No marks to publish.")
+            else:
+                self.stdout.write(
+                    f"published {stats.students} result(s): mean {stats.mean:.1f}%, median {stats.median:.1f}%, "
+                    f"grades {', '.join(f'{grade} {count}' for grade, count in sorted(stats.grades.items()))}"
+                )
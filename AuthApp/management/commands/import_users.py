@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.bulk_users import FORMATS, file_format, import_users
+from AuthApp.models import User
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV or XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX file with a header row (username is required).")
+        parser.add_argument('--format', choices=FORMATS, help="File format (default: from the extension).")
+        parser.add_argument('--role', default='student', help="Role for rows without one (default: student).")
+        parser.add_argument('--tokens', metavar='PATH', help="Write password reset tokens for rows without a password here.")
+        parser.add_argument('--chunk-size', type=int, help="Rows validated and written per batch.")
+        parser.add_argument('--workers', type=int, help="Password hashing threads (default: one per CPU).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without creating users.")
+
+    def handle(self, *args, **options):
+        roles = [role for role, _ in User.ROLE_CHOICES]
+        if options['role'] not in roles:
+            raise CommandError(f"Unknown role {options['role']!r}. Choose from {', '.join(roles)}.")
+        try:
+            format = options['format'] or file_format(options['path'])
+            with open(options['path'], 'rb') as f:
+                result = import_users(
+                    f, format, default_role=options['role'], dry_run=options['dry_run'],
+                    chunk_size=options['chunk_size'], workers=options['workers'],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.reset_tokens and options['tokens']:
+            with open(options['tokens'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['username', 'email', 'uid', 'token'])
+                writer.writerows(result.reset_tokens)
+        elif result.reset_tokens:
+            self.stdout.write(f"{len(result.reset_tokens)} user(s) have no password; pass --tokens to save reset tokens.")
+        verb = "would create" if options['dry_run'] else "created"
+        self.stdout.write(f"{verb} {result.created} user(s), {len(result.errors)} row(s) rejected.")
@@ -0,0 +1,63 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.loadtest import SCENARIOS, LoadTestError, compare, load_baseline, run_load, save_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the real URLconf with concurrent clients, report p50/p95/p99 latency and throughput "
+        "per scenario, and compare them with the saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Scenario to run; repeatable (default: all).")
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent clients per scenario (default: 8).")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario (default: 200).")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per client first (default: 5).")
+        parser.add_argument('--baseline', help="Baseline JSON file (default: LOADTEST_BASELINE).")
+        parser.add_argument('--save', action='store_true', help="Save this run as the baseline instead of comparing.")
+        parser.add_argument('--output', help="Also write this run's results to this JSON file.")
+        parser.add_argument('--tolerance', type=float, help="Allowed slowdown before failing, 0.25 for 25%% (default: LOADTEST_TOLERANCE).")
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError("--clients and --requests must be at least 1.")
+        try:
+            report = run_load(options['scenario'], options['clients'], options['requests'], options['warmup']).as_dict()
+        except LoadTestError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{report['clients']} clients, {report['users']:,} users ({report['database']})"
+        ))
+        self.stdout.write(f"{'':<22}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for name, result in report['scenarios'].items():
+            self.stdout.write(
+                f"{name:<22}{result['requests']:>10}{result['errors']:>8}{result['p50_ms']:>10.1f}"
+                f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['throughput_rps']:>10.1f}"
+            )
+        if options['output']:
+            save_baseline(report, options['output'])
+
+        path = options['baseline'] or str(settings.LOADTEST_BASELINE)
+        if options['save']:
+            save_baseline(report, path)
+            self.stdout.write(self.style.SUCCESS(f"Saved as the baseline in {path}."))
+            return
+        if not os.path.exists(path):
+            self.stdout.write(f"No baseline at {path}; run with --save to record one.")
+            return
+        baseline = load_baseline(path)
+        if (baseline.get('users'), baseline.get('clients')) != (report['users'], report['clients']):
+            self.stdout.write(self.style.WARNING(
+                f"The baseline was recorded with {baseline.get('users')} users and {baseline.get('clients')} clients."
+            ))
+        regressions = compare(report, baseline, options['tolerance'])
+        for name, metric, before, now in regressions:
+            self.stderr.write(f"{name}: {metric} {before} -> {now}")
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline recorded {baseline.get('recorded_at')}.")
+        self.stdout.write(self.style.SUCCESS(f"Within tolerance of the baseline recorded {baseline.get('recorded_at')}."))
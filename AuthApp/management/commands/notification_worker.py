@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from AuthApp.notifications import process_pending, requeue_running
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notification batches outside the web process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls.")
+        parser.add_argument('--requeue', action='store_true', help="Requeue batches left running by a dead worker.")
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            self.stdout.write(f"Requeued {requeue_running()} running batch(es).")
+
+        while True:
+            processed = process_pending()
+            if processed:
+                self.stdout.write(f"Processed {processed} batch(es).")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.startup import PHASES, STARTUP_PHASES, StartupError, median_phases, run_probe
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile a worker's cold start in fresh interpreters: time per phase (settings, app registry, "
+        "handler, URLconf, first request) and the slowest imports from `python -X importtime`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/admin/login/', help="Path of the first request (default: /admin/login/).")
+        parser.add_argument('--asgi', action='store_true', help="Start the ASGI application instead of the WSGI one.")
+        parser.add_argument('--runs', type=int, default=3, help="Cold starts to take the median of (default: 3).")
+        parser.add_argument('--top', type=int, default=15, help="How many of the slowest imports to list.")
+        parser.add_argument('--max-ms', type=float, help="Fail when the median time until ready to serve exceeds this.")
+
+    def handle(self, *args, **options):
+        handler = 'asgi' if options['asgi'] else 'wsgi'
+        runs = max(options['runs'], 1)
+        try:
+            profiles = [run_probe(options['path'], handler) for _ in range(runs)]
+        except StartupError as error:
+            raise CommandError(str(error))
+
+        median = median_phases(profiles)
+        first = profiles[0]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Cold start, median of {runs} ({handler}, GET {options['path']} -> {first.status})"
+        ))
+        self.stdout.write(f"{'':<24}{'time':>12}{'imports':>12}")
+        ready_ms = sum(median[name] for name in STARTUP_PHASES)
+        for phase in PHASES:
+            if phase == 'first_request':
+                self.row("ready to serve", ready_ms)
+            self.row(phase, median[phase], first.import_ms(phase))
+        self.stdout.write(f"{'modules when ready':<24}{len(first.ready_modules):>12,}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest imports (self time)"))
+        for record in first.slowest_imports(options['top']):
+            self.stdout.write(f"{record.self_us / 1000:>9.1f} ms  {record.phase:<16}{record.module}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Imports by package"))
+        for package, ms in list(first.by_package().items())[:options['top']]:
+            self.stdout.write(f"{ms:>9.1f} ms  {package}")
+
+        if options['max_ms'] is not None and ready_ms > options['max_ms']:
+            raise CommandError(f"Ready to serve after {ready_ms:.1f} ms, over the {options['max_ms']:.0f} ms limit.")
+
+    def row(self, label, value, imports=None):
+        line = f"{label:<24}{value:>9.1f} ms"
+        if imports is not None:
+            line += f"{imports:>9.1f} ms"
+        self.stdout.write(line)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.search import SOURCES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Write the search documents of every user, course and job post again."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', help=f"Kinds to rebuild: {', '.join(SOURCES)} (default: all).")
+
+    def handle(self, *args, **options):
+        unknown = set(options['kinds']) - set(SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown kind(s): {', '.join(sorted(unknown))}.")
+        written = rebuild_index(options['kinds'] or None)
+        for kind, count in written.items():
+            self.stdout.write(f"{kind}: {count} document(s)")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from AuthApp import jobs  # noqa: F401 (registers the jobs)
+from AuthApp.scheduler import JOBS, run_due
+
+
+class Command(BaseCommand):
+    help = "Run the periodic maintenance jobs (archival, reconciliation, sweeps)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Jobs to run (default: all).")
+        parser.add_argument('--once', action='store_true', help="Run each job once and exit, e.g. from cron.")
+        parser.add_argument('--tick', type=float, default=30, help="Seconds between due checks.")
+
+    def handle(self, *args, **options):
+        names = options['names']
+        unknown = set(names) - set(JOBS)
+        if unknown:
+            raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}")
+
+        while True:
+            for name, result in run_due(names).items():
+                self.stdout.write(f"{name}: {result}")
+            close_old_connections()
+            if options['once']:
+                break
+            time.sleep(options['tick'])
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from AuthApp.seeding import SeedError, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic institute: users of every role and sub-role with their "
+        "notifications, activity and audit logs, trash, courses, enrollments and results."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help="Accounts to create; everything else scales with them (default: 10000).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument('--prefix', default='seed', help="Username and course code prefix (default: seed).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT batch.")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError("--users must be at least 1.")
+        self.stdout.write(f"Seeding {options['users']:,} users and their data...")
+        try:
+            timings = seed(options['users'], seed=options['seed'], prefix=options['prefix'], batch_size=options['batch_size'])
+        except SeedError as exc:
+            raise CommandError(exc)
+
+        for name, (rows, seconds) in timings.items():
+            self.stdout.write(f"{name:<28} {rows:>12,} rows {seconds:>8.1f} s")
+        rows = sum(rows for name, (rows, _) in timings.items() if name != 'rollups and search index')
+        seconds = sum(seconds for _, seconds in timings.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows:,} rows in {seconds:.1f} s ({rows / seconds * 60 / 1e6:.2f} million rows per minute)"
+        ))
@@ -0,0 +1,202 @@
+"""
+Request metrics.
+
+RequestMetricsMiddleware records each request in in-process histograms
+labelled by URL name (resolver_match.view_name, '<unresolved>' when
+nothing matched, so a scan of random paths cannot add labels), served in
+the Prometheus text format at /metrics/:
+
+    instracore_requests_total                  requests, by view and status
+    instracore_request_duration_seconds        wall time
+    instracore_response_size_bytes             body size (Content-Length for streams)
+    instracore_request_cpu_seconds             CPU time of the request's thread
+    instracore_request_queries                 SQL queries run
+    instracore_request_sql_seconds             time spent in those queries
+    instracore_request_duplicate_queries       queries whose SQL had already run
+
+The first three cover every request and cost a few clock reads. The rest
+come from wrapping every query the request runs (connection.execute_wrapper)
+and are taken for a METRICS_SAMPLE_RATE fraction of requests only; their
+_count is the number of requests sampled. Duplicates count statements that
+repeat an earlier statement's SQL with any parameters, the signature of an
+N+1 loop; a request with METRICS_DUPLICATE_QUERY_WARNING or more of them is
+logged with the statement repeated most.
+
+Each process keeps its own numbers from when it started. Scrape every
+worker, or run one, to see them all; Prometheus' rate() copes with the
+resets of restarts.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'instracore_'
+
+UNRESOLVED = '<unresolved>'
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name: (help, bucket bounds)
+HISTOGRAMS = {
+    'request_duration_seconds': ("Wall time of requests.", SECONDS),
+    'response_size_bytes': ("Size of response bodies.", BYTES),
+    'request_cpu_seconds': ("CPU time of sampled requests.", SECONDS),
+    'request_queries': ("SQL queries run by sampled requests.", QUERIES),
+    'request_sql_seconds': ("Time sampled requests spent in SQL.", SECONDS),
+    'request_duplicate_queries': ("Queries repeating the SQL of an earlier query, in sampled requests.", QUERIES),
+}
+
+
+class Histogram:
+    """Counts per bucket (not cumulative; the last is +Inf) and the sum of what was observed."""
+    __slots__ = ('bounds', 'counts', 'total')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+class QueryRecorder:
+    """An execute_wrapper counting a request's queries, their time, and how often each SQL ran."""
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    @property
+    def duplicates(self):
+        return self.count - len(self.statements)
+
+    def most_repeated(self):
+        """(sql, times run) of the statement run most often."""
+        return max(self.statements.items(), key=lambda item: item[1], default=(None, 0))
+
+
+@contextmanager
+def recording_queries():
+    """Record the queries run in this block, on every database, into the QueryRecorder yielded."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # name: {view: Histogram}
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            # (view, status): count
+            self._requests = {}
+
+    def _observe(self, name, view, value):
+        by_view = self._histograms[name]
+        histogram = by_view.get(view)
+        if histogram is None:
+            histogram = by_view[view] = Histogram(HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+    def record(self, view, status, seconds, size=None, cpu_seconds=None, queries=None):
+        """Record one request; `cpu_seconds` and `queries` (a QueryRecorder) when it was sampled."""
+        with self._lock:
+            key = view, status
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._observe('request_duration_seconds', view, seconds)
+            if size is not None:
+                self._observe('response_size_bytes', view, size)
+            if cpu_seconds is not None:
+                self._observe('request_cpu_seconds', view, cpu_seconds)
+            if queries is not None:
+                self._observe('request_queries', view, queries.count)
+                self._observe('request_sql_seconds', view, queries.seconds)
+                self._observe('request_duplicate_queries', view, queries.duplicates)
+
+    def exposition(self):
+        """Everything recorded, in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            histograms = {
+                name: sorted((view, list(histogram.counts), histogram.total) for view, histogram in by_view.items())
+                for name, by_view in self._histograms.items()
+            }
+        lines = [
+            f"# HELP {PREFIX}requests_total Requests handled, by URL name and status.",
+            f"# TYPE {PREFIX}requests_total counter",
+        ]
+        for (view, status), count in requests:
+            lines.append(f'{PREFIX}requests_total{{view="{_escape(view)}",status="{status}"}} {count}')
+        for name, (description, bounds) in HISTOGRAMS.items():
+            lines += [f"# HELP {PREFIX}{name} {description}", f"# TYPE {PREFIX}{name} histogram"]
+            for view, counts, total in histograms[name]:
+                label = f'view="{_escape(view)}"'
+                cumulative = 0
+                for bound, count in zip([*bounds, '+Inf'], counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}{name}_sum{{{label}}} {total}')
+                lines.append(f'{PREFIX}{name}_count{{{label}}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+def response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+def sampled():
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+
+def warn_duplicates(view, queries):
+    if queries.duplicates >= settings.METRICS_DUPLICATE_QUERY_WARNING:
+        sql, times = queries.most_repeated()
+        logger.warning(
+            "%s ran %d queries, %d repeating earlier SQL; this ran %d times: %.300s",
+            view, queries.count, queries.duplicates, times, sql,
+        )
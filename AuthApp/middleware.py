@@ -0,0 +1,79 @@
+import time
+from functools import partial
+
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from .activity import get_buffer
+from .history import acting_as
+from .metrics import metrics, recording_queries, response_size, sampled, view_name, warn_duplicates
+from .sessions import arequest_user, request_user
+
+
+class ActivityLogMiddleware:
+    """
+    Checks the activity log buffer at the end of each request and writes it
+    out once it is over its size or age threshold, so buffered entries reach
+    the database even when the flusher thread is idle.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        get_buffer().flush_if_due()
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware with request.user built from the cached projection (see AuthApp.sessions)."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: request_user(request))
+        request.auser = partial(arequest_user, request)
+
+
+class EditHistoryMiddleware:
+    """Attributes tracked saves made while handling a request to the request's user."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with acting_as(request):
+            return self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records each request's wall time, status and response size under its URL
+    name, and for a sampled fraction also its CPU time and SQL queries. Goes
+    first in MIDDLEWARE so the rest of the stack is timed too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if not sampled():
+            response = self.get_response(request)
+            self.record(request, response, started)
+            return response
+        cpu_started = time.thread_time()
+        with recording_queries() as queries:
+            response = self.get_response(request)
+        cpu_seconds = time.thread_time() - cpu_started
+        view = self.record(request, response, started, cpu_seconds, queries)
+        warn_duplicates(view, queries)
+        return response
+
+    def record(self, request, response, started, cpu_seconds=None, queries=None):
+        view = view_name(request)
+        metrics.record(
+            view, response.status_code, time.perf_counter() - started, response_size(response),
+            cpu_seconds, queries,
+        )
+        return view
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:48
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('message', models.TextField()),
+                ('action_link', models.URLField(blank=True, null=True)),
+                ('role', models.CharField(blank=True, choices=[('admin', 'Admin'), ('employee', 'Employee'), ('student', 'Student'), ('candidate', 'Candidate')], max_length=20)),
+                ('sub_role', models.CharField(blank=True, choices=[('faculty', 'Faculty'), ('hr', 'HR'), ('finance', 'Finance'), ('marketing', 'Marketing'), ('it', 'IT'), ('teacher', 'Teacher'), ('other', 'Other')], max_length=30)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('last_user_id', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notification_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0004_log_event_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='activitylog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at'], name='auditlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trash',
+            index=models.Index(fields=['deleted_at'], name='trash_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0005_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrashBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trash',
+            name='batch',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trash',
+            name='object_id',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='trash',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trash',
+            name='object_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trash',
+            name='columns',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='AuthApp.trashblob'),
+        ),
+    ]
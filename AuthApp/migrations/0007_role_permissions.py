@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0006_trash_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'permissions': [('enroll_courses', 'Can enroll in courses'), ('make_payments', 'Can make fee payments'), ('manage_courses', 'Can manage courses'), ('review_requests', 'Can review course and teacher requests'), ('manage_job_posts', 'Can manage job posts'), ('offer_salaries', 'Can offer salaries'), ('approve_salaries', 'Can approve salaries'), ('approve_transactions', 'Can approve transactions'), ('view_finance_reports', 'Can view finance reports'), ('post_announcements', 'Can post announcements'), ('mark_attendance', 'Can mark attendance'), ('notify_guardians', 'Can notify guardians')]},
+        ),
+    ]
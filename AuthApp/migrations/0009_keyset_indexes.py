@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0008_user_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='activitylog_timestamp_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='auditlog',
+            name='auditlog_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trash',
+            name='trash_deleted_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp', 'id'], name='activitylog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at', 'id'], name='auditlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at', 'id'], name='notification_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trash',
+            index=models.Index(fields=['deleted_at', 'id'], name='trash_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0009_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('code', models.CharField(blank=True, max_length=32, null=True)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('total_seats', models.PositiveIntegerField(default=0)),
+                ('seats_filled', models.PositiveIntegerField(default=0)),
+                ('last_seat_number', models.PositiveIntegerField(default=0, editable=False)),
+                ('teacher', models.ForeignKey(limit_choices_to={'role': 'employee', 'sub_role': 'teacher'}, on_delete=django.db.models.deletion.CASCADE, related_name='courses_taught', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('active', 'Active'), ('completed', 'Completed'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+                ('enrolled_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='AuthApp.course')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeatAssignment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('seat_number', models.PositiveIntegerField()),
+                ('assigned_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_assignments', to='AuthApp.course')),
+                ('enrollment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat', to='AuthApp.enrollment')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='seat_assignments', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='course',
+            constraint=models.CheckConstraint(condition=models.Q(('seats_filled__lte', models.F('total_seats'))), name='course_seats_within_capacity'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['course', 'applied_at', 'id'], name='enrollment_waitlist_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='seatassignment',
+            constraint=models.UniqueConstraint(fields=('course', 'seat_number'), name='seat_number_unique_per_course'),
+        ),
+    ]
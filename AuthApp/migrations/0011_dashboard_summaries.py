@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_summaries(apps, schema_editor):
+    """Count existing rows, with a row for every role pair so deltas always find one."""
+    User = apps.get_model('AuthApp', 'User')
+    Course = apps.get_model('AuthApp', 'Course')
+    RoleSummary = apps.get_model('AuthApp', 'RoleSummary')
+    CourseSummary = apps.get_model('AuthApp', 'CourseSummary')
+
+    sub_roles = ['', *(sub_role for sub_role, _ in User._meta.get_field('sub_role').choices)]
+    counts = {(role, sub_role): [0, 0] for role, _ in User._meta.get_field('role').choices for sub_role in sub_roles}
+    for row in User.objects.order_by().values('role', 'sub_role').annotate(
+        users=Count('pk'), active_users=Count('pk', filter=Q(is_active=True)),
+    ):
+        count = counts.setdefault((row['role'], row['sub_role'] or ''), [0, 0])
+        count[0] += row['users']
+        count[1] += row['active_users']
+    RoleSummary.objects.bulk_create(
+        RoleSummary(role=role, sub_role=sub_role, users=users, active_users=active_users)
+        for (role, sub_role), (users, active_users) in counts.items()
+    )
+
+    statuses = ['pending', 'active', 'completed', 'rejected', 'cancelled']
+    CourseSummary.objects.bulk_create(
+        CourseSummary(course_id=row['pk'], seats=row['total_seats'], **{status: row[status] for status in statuses})
+        for row in Course.objects.annotate(**{
+            status: Count('enrollments', filter=Q(enrollments__status=status)) for status in statuses
+        }).values('pk', 'total_seats', *statuses)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0010_courses_and_enrollments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSummary',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='AuthApp.course')),
+                ('seats', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('active', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RoleSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('admin', 'Admin'), ('employee', 'Employee'), ('student', 'Student'), ('candidate', 'Candidate')], max_length=20)),
+                ('sub_role', models.CharField(blank=True, choices=[('faculty', 'Faculty'), ('hr', 'HR'), ('finance', 'Finance'), ('marketing', 'Marketing'), ('it', 'IT'), ('teacher', 'Teacher'), ('other', 'Other')], max_length=30)),
+                ('users', models.IntegerField(default=0)),
+                ('active_users', models.IntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('role', 'sub_role'), name='rolesummary_unique_role')],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0011_dashboard_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense'), ('fee', 'Fee'), ('payment', 'Payment'), ('refund', 'Refund'), ('salary', 'Salary')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('entries', models.PositiveIntegerField()),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'transaction_type'), name='ledgerperiod_unique_month')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentAccount',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('pending_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='account', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FinanceTransaction',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense'), ('fee', 'Fee'), ('payment', 'Payment'), ('refund', 'Refund'), ('salary', 'Salary')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('balance_after', models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions_created', to=settings.AUTH_USER_MODEL)),
+                ('reverses', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reversal', to='AuthApp.financetransaction')),
+                ('student', models.ForeignKey(blank=True, help_text='If this transaction relates to a student', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'transaction_type'], name='ledger_created_idx'), models.Index(fields=['student', 'created_at'], name='ledger_student_idx')],
+            },
+        ),
+    ]
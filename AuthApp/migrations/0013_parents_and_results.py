@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0012_finance_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseResultStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='result_stats', serialize=False, to='AuthApp.course')),
+                ('students', models.PositiveIntegerField()),
+                ('mean', models.FloatField()),
+                ('median', models.FloatField()),
+                ('stdev', models.FloatField()),
+                ('lowest', models.FloatField()),
+                ('highest', models.FloatField()),
+                ('p25', models.FloatField()),
+                ('p75', models.FloatField()),
+                ('p90', models.FloatField()),
+                ('grades', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Parent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('full_name', models.CharField(max_length=200)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('phone', models.CharField(blank=True, max_length=32, null=True)),
+                ('relation', models.CharField(blank=True, max_length=64, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('parent_user', models.OneToOneField(blank=True, help_text='If parent has an account, link here.', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('students', models.ManyToManyField(limit_choices_to={'role': 'student'}, related_name='parents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Result',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('marks_obtained', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('total_marks', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('grade', models.CharField(blank=True, max_length=8, null=True)),
+                ('percentile', models.FloatField(blank=True, null=True)),
+                ('published', models.BooleanField(default=False)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='AuthApp.course')),
+                ('published_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='published_results', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='results', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('course', 'student'), name='result_unique_per_course')],
+            },
+        ),
+    ]
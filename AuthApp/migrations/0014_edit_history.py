@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:06
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0013_parents_and_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EditHistory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('model_name', models.CharField(max_length=50)),
+                ('object_id', models.CharField(max_length=50)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=20)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('changes', models.JSONField(blank=True, null=True)),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_name', 'object_id', 'timestamp'], name='edithistory_object_idx')],
+            },
+        ),
+    ]
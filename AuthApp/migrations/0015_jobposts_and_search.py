@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:12
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+TABLE = '"AuthApp_searchdocument"'
+
+SQLITE_INDEX = [
+    # External content: the index stores no copy of the text, and the
+    # triggers keep it in step with every insert, update and delete. SQLite
+    # drops them when a migration rebuilds the table to alter it; such a
+    # migration must create them again.
+    f"""CREATE VIRTUAL TABLE search_fts USING fts5(
+        title, body, content={TABLE}, content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER search_fts_insert AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER search_fts_delete AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER search_fts_update AFTER UPDATE OF title, body ON {TABLE} BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+POSTGRES_INDEX = [
+    f"""ALTER TABLE {TABLE} ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ) STORED""",
+    f"CREATE INDEX searchdocument_vector_idx ON {TABLE} USING gin (vector)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            for statement in SQLITE_INDEX:
+                schema_editor.execute(statement)
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains.
+            schema_editor.execute("DROP TABLE IF EXISTS search_fts")
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_INDEX:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS search_fts_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS search_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"ALTER TABLE {TABLE} DROP COLUMN vector")
+
+
+def fill_search_documents(apps, schema_editor):
+    """Index the existing users and courses; there are no job posts yet."""
+    User = apps.get_model('AuthApp', 'User')
+    Course = apps.get_model('AuthApp', 'Course')
+    SearchDocument = apps.get_model('AuthApp', 'SearchDocument')
+
+    def join(*parts):
+        return " ".join(str(part) for part in parts if part)
+
+    SearchDocument.objects.bulk_create((
+        SearchDocument(
+            kind='user', object_id=str(user.pk),
+            title=join(user.first_name, user.last_name, user.username),
+            body=join(user.email, user.location, user.country, user.bio),
+            role=user.role, sub_role=user.sub_role or '', restricted=not user.is_active,
+        )
+        for user in User.objects.iterator()
+    ), batch_size=500)
+    SearchDocument.objects.bulk_create((
+        SearchDocument(kind='course', object_id=str(course.pk), title=join(course.name, course.code), body=course.description)
+        for course in Course.objects.iterator()
+    ), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0014_edit_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobPost',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=100)),
+                ('department', models.CharField(blank=True, max_length=100, null=True)),
+                ('description', models.TextField(blank=True)),
+                ('salary', models.DecimalField(blank=True, decimal_places=2, help_text='Monthly salary or proposed compensation', max_digits=12, null=True)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('closed', 'Closed'), ('pending', 'Pending')], default='pending', max_length=20)),
+                ('posted_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('hr', models.ForeignKey(limit_choices_to={'role': 'employee', 'sub_role': 'hr'}, on_delete=django.db.models.deletion.CASCADE, related_name='job_posts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'User'), ('course', 'Course'), ('jobpost', 'Job post')], max_length=10)),
+                ('object_id', models.CharField(max_length=50)),
+                ('title', models.CharField(max_length=500)),
+                ('body', models.TextField(blank=True)),
+                ('role', models.CharField(blank=True, max_length=20)),
+                ('sub_role', models.CharField(blank=True, max_length=30)),
+                ('restricted', models.BooleanField(default=False)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_object_unique')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:21
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0015_jobposts_and_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('role', models.CharField(choices=[('admin', 'Admin'), ('employee', 'Employee'), ('student', 'Student'), ('candidate', 'Candidate')], max_length=20)),
+                ('sub_role', models.CharField(blank=True, choices=[('faculty', 'Faculty'), ('hr', 'HR'), ('finance', 'Finance'), ('marketing', 'Marketing'), ('it', 'IT'), ('teacher', 'Teacher'), ('other', 'Other')], max_length=30)),
+                ('on_leave', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'role', 'sub_role'), name='dailyavailability_unique_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveRequest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('reason', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+                ('actioned_at', models.DateTimeField(blank=True, null=True)),
+                ('span', models.PositiveSmallIntegerField(default=0, editable=False)),
+                ('actioned_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leave_actions', to=settings.AUTH_USER_MODEL)),
+                ('parent', models.ForeignKey(blank=True, help_text='Parent who approved/requested (if applicable)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='AuthApp.parent')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'approved')), fields=['span', 'start_date'], name='leave_interval_idx'), models.Index(fields=['user', 'start_date'], name='leave_user_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='leave_dates_ordered'), models.CheckConstraint(condition=models.Q(('span__lte', 10)), name='leave_span_indexed')],
+            },
+        ),
+    ]
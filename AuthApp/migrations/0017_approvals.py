@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:28
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0016_leave_calendar'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'permissions': [('enroll_courses', 'Can enroll in courses'), ('make_payments', 'Can make fee payments'), ('manage_courses', 'Can manage courses'), ('review_requests', 'Can review course and teacher requests'), ('manage_job_posts', 'Can manage job posts'), ('approve_leave', 'Can approve leave requests'), ('offer_salaries', 'Can offer salaries'), ('approve_salaries', 'Can approve salaries'), ('approve_transactions', 'Can approve transactions'), ('view_finance_reports', 'Can view finance reports'), ('post_announcements', 'Can post announcements'), ('mark_attendance', 'Can mark attendance'), ('notify_guardians', 'Can notify guardians')]},
+        ),
+        migrations.CreateModel(
+            name='Approval',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('action_type', models.CharField(choices=[('add_course', 'Add Course'), ('delete_course', 'Delete Course'), ('add_user', 'Add User'), ('delete_user', 'Delete User'), ('enroll_student', 'Enroll Student'), ('add_job', 'Add Job'), ('delete_job', 'Delete Job'), ('leave_request', 'Leave Request'), ('salary_approval', 'Salary Approval')], max_length=50)),
+                ('target_id', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', max_length=20)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approvals', to=settings.AUTH_USER_MODEL)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'action_type', 'timestamp', 'id'], name='approval_inbox_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:32
+
+import django.db.models.deletion
+import django.db.models.functions.text
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0017_approvals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeText',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('text', models.TextField(blank=True)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('extracted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobApplication',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('applicant_name', models.CharField(max_length=200)),
+                ('applicant_email', models.EmailField(max_length=254)),
+                ('resume', models.FileField(blank=True, null=True, upload_to='resumes/')),
+                ('resume_digest', models.CharField(blank=True, editable=False, max_length=64)),
+                ('status', models.CharField(choices=[('applied', 'Applied'), ('shortlisted', 'Shortlisted'), ('rejected', 'Rejected'), ('hired', 'Hired')], default='applied', max_length=20)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+                ('applicant', models.ForeignKey(blank=True, help_text='If applicant has an account', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='AuthApp.jobpost')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('resume_digest', ''), _negated=True), fields=['resume_digest'], name='jobapplication_resume_idx')],
+                'constraints': [models.UniqueConstraint(django.db.models.functions.text.Lower('applicant_email'), models.F('job'), name='jobapplication_unique_applicant')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0018_job_applications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trashblob',
+            name='last_used',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+import datetime
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+def repair_spans(apps, schema_editor):
+    """Recompute span for leave written around save(), which the constraint would reject."""
+    LeaveRequest = apps.get_model('AuthApp', 'LeaveRequest')
+    stale = []
+    for leave in LeaveRequest.objects.only('start_date', 'end_date', 'span').iterator():
+        span = (leave.end_date - leave.start_date).days.bit_length()
+        if leave.span != span:
+            leave.span = span
+            stale.append(leave)
+    LeaveRequest.objects.bulk_update(stale, ['span'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AuthApp', '0019_trashblob_last_used'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='leaverequest',
+            name='leave_span_indexed',
+        ),
+        migrations.RunPython(repair_spans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='leaverequest',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(0)))), ('span', 0)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=1)))), ('span', 1)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=3)))), ('span', 2)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=7)))), ('span', 3)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=15)))), ('span', 4)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=31)))), ('span', 5)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=63)))), ('span', 6)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=127)))), ('span', 7)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=255)))), ('span', 8)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=511)))), ('span', 9)), models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=1023)))), ('span', 10)), _connector='OR'), name='leave_span_covers_dates'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
+import datetime
 import uuid
 
 
@@ -25,6 +28,8 @@ class User(AbstractUser):
     
     # Profile fields
     image = models.ImageField(upload_to="profiles/", blank=True, null=True)
+    # {"<size>": storage path} of the WebP thumbnails; see AuthApp.profile_images.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(blank=True)
     date_of_birth = models.DateField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True)
@@ -41,6 +46,28 @@ class User(AbstractUser):
     # Account status
     is_active = models.BooleanField(default=True)
     is_temporary = models.BooleanField(default=False)  # For temporary accounts
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['role', 'sub_role', 'is_active'], name='user_role_idx'),
+        ]
+        # Capabilities granted by role in AuthApp.permissions; listed here so
+        # they can also be granted to individual users or groups.
+        permissions = [
+            ('enroll_courses', 'Can enroll in courses'),
+            ('make_payments', 'Can make fee payments'),
+            ('manage_courses', 'Can manage courses'),
+            ('review_requests', 'Can review course and teacher requests'),
+            ('manage_job_posts', 'Can manage job posts'),
+            ('approve_leave', 'Can approve leave requests'),
+            ('offer_salaries', 'Can offer salaries'),
+            ('approve_salaries', 'Can approve salaries'),
+            ('approve_transactions', 'Can approve transactions'),
+            ('view_finance_reports', 'Can view finance reports'),
+            ('post_announcements', 'Can post announcements'),
+            ('mark_attendance', 'Can mark attendance'),
+            ('notify_guardians', 'Can notify guardians'),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -48,12 +75,60 @@ class User(AbstractUser):
 
 class Notification(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    # Indexed through notification_inbox_idx, which leads with user.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications", db_index=False)
     message = models.TextField()
     action_link = models.URLField(blank=True, null=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_inbox_idx'),
+            # is_read=False compiles to NOT is_read, which SQLite cannot seek on
+            # as an index column, so unread lookups get their own partial index.
+            models.Index(fields=['user', '-created_at'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+            # Keyset pages in the admin (AuthApp.keyset) walk (created_at, id).
+            models.Index(fields=['created_at', 'id'], name='notification_created_idx'),
+        ]
+
+
+class NotificationBatch(models.Model):
+    """
+    One queued announcement to a role/sub_role audience.
+    Rows are picked up by the notification worker and fanned out into
+    Notification rows; last_user_id lets an interrupted batch resume.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    message = models.TextField()
+    action_link = models.URLField(blank=True, null=True)
+    role = models.CharField(max_length=20, choices=User.ROLE_CHOICES, blank=True)
+    sub_role = models.CharField(max_length=30, choices=User.SUBROLE_CHOICES, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="notification_batches")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    delivered = models.PositiveIntegerField(default=0)
+    last_user_id = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Only the small pending tail is ever polled by the worker.
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='notificationbatch_pending_idx'),
+        ]
+
+    def __str__(self):
+        audience = "/".join(filter(None, [self.role, self.sub_role])) or "everyone"
+        return f"Batch to {audience} ({self.status})"
+
 
 class AuditLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -61,20 +136,568 @@ class AuditLog(models.Model):
     action = models.CharField(max_length=255)
     model_name = models.CharField(max_length=100)
     object_id = models.CharField(max_length=50)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered writes keep the time the action happened.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'object_id'], name='auditlog_object_idx'),
+            models.Index(fields=['created_at', 'id'], name='auditlog_created_idx'),
+        ]
+
+
+class TrashBlob(models.Model):
+    """
+    A zlib-compressed JSON value shared between Trash rows, keyed by the
+    SHA-256 of its JSON so each distinct value is stored once.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    # Bumped whenever a trash write refers to the blob; see sweep_blobs().
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
 
 
 class Trash(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     model_name = models.CharField(max_length=100)
-    object_data = models.JSONField()
+    # Full JSON copy; only set on rows written before compressed snapshots.
+    object_data = models.JSONField(blank=True, null=True)
+    object_id = models.CharField(max_length=50, blank=True)
+    # One trash_queryset() call; restored together.
+    batch = models.UUIDField(blank=True, null=True, db_index=True)
+    columns = models.ForeignKey(TrashBlob, on_delete=models.PROTECT, blank=True, null=True, related_name="+")
+    payload = models.BinaryField(blank=True, null=True)
     deleted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     deleted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='trash_deleted_idx'),
+        ]
+
 
 class ActivityLog(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
+    # Indexed through activitylog_user_idx, which leads with user.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities', db_index=False)
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     related_object_type = models.CharField(max_length=100, blank=True)
-    related_object_id = models.CharField(max_length=50, blank=True)
\ No newline at end of file
+    related_object_id = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp'], name='activitylog_user_idx'),
+            models.Index(fields=['timestamp', 'id'], name='activitylog_timestamp_idx'),
+        ]
+
+
+class Course(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100)
+    code = models.CharField(max_length=32, blank=True, null=True)
+    description = models.TextField(blank=True)
+    teacher = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='courses_taught',
+        limit_choices_to={'role': 'employee', 'sub_role': 'teacher'},
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Seats are claimed and released only through AuthApp.enrollments.
+    total_seats = models.PositiveIntegerField(default=0)
+    seats_filled = models.PositiveIntegerField(default=0)
+    # Last seat number handed out. It only grows, so numbers are never reused.
+    last_seat_number = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(seats_filled__lte=models.F('total_seats')),
+                name='course_seats_within_capacity',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def has_available_seat(self):
+        return self.seats_filled < self.total_seats
+
+
+class Enrollment(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+        ('rejected', 'Rejected'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments', limit_choices_to={'role': 'student'})
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    applied_at = models.DateTimeField(auto_now_add=True)
+    enrolled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The waitlist: pending applications of a course, first come first served.
+            models.Index(fields=['course', 'applied_at', 'id'], condition=models.Q(status='pending'), name='enrollment_waitlist_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} -> {self.course.name} ({self.status})"
+
+    def approve(self, approver=None):
+        """Claim a seat and activate this enrollment (see AuthApp.enrollments)."""
+        from .enrollments import approve_enrollment
+        return approve_enrollment(self, approver)
+
+
+class SeatAssignment(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='seat_assignments')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_assignments', limit_choices_to={'role': 'student'})
+    enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='seat')
+    seat_number = models.PositiveIntegerField()
+    assigned_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'seat_number'], name='seat_number_unique_per_course'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} -> {self.course.name} (Seat {self.seat_number})"
+
+
+class RoleSummary(models.Model):
+    """Users per role and sub_role, kept current by AuthApp.summaries."""
+    role = models.CharField(max_length=20, choices=User.ROLE_CHOICES)
+    # Blank for users without a sub_role.
+    sub_role = models.CharField(max_length=30, choices=User.SUBROLE_CHOICES, blank=True)
+    users = models.IntegerField(default=0)
+    active_users = models.IntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['role', 'sub_role'], name='rolesummary_unique_role'),
+        ]
+
+    def __str__(self):
+        return f"{'/'.join(filter(None, [self.role, self.sub_role]))}: {self.users}"
+
+
+class CourseSummary(models.Model):
+    """Enrollments per status for one course, kept current by AuthApp.summaries."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    seats = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    active = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.course.name}: {self.active} active, {self.pending} pending"
+
+
+class StudentAccount(models.Model):
+    """A student's running balance, moved only by AuthApp.ledger in the same transaction as each entry."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.OneToOneField(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'}, related_name='account')
+    # What the student owes; negative when they are in credit.
+    pending_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student.username} Account - Pending: {self.pending_balance}"
+
+
+class FinanceTransaction(models.Model):
+    """
+    One ledger entry. Entries are append-only: post them with
+    AuthApp.ledger.post_entry() and correct them with reverse_entry().
+    """
+    TRANSACTION_TYPES = [
+        ('income', 'Income'),
+        ('expense', 'Expense'),
+        ('fee', 'Fee'),
+        ('payment', 'Payment'),
+        ('refund', 'Refund'),
+        ('salary', 'Salary'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.TextField(blank=True)
+    student = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                help_text="If this transaction relates to a student")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='transactions_created')
+    # Not auto_now_add, so books carried over from elsewhere keep their dates.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # The student's pending balance after this entry, for entries that move it.
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+    reverses = models.OneToOneField('self', on_delete=models.PROTECT, null=True, blank=True, related_name='reversal')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'transaction_type'], name='ledger_created_idx'),
+            models.Index(fields=['student', 'created_at'], name='ledger_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} - {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries cannot be changed; post a reversal instead.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries cannot be deleted; post a reversal instead.")
+
+
+class LedgerPeriod(models.Model):
+    """Totals of one transaction type for a closed month, written once by AuthApp.ledger.close_periods()."""
+    month = models.DateField(help_text="First day of the month")
+    transaction_type = models.CharField(max_length=10, choices=FinanceTransaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=16, decimal_places=2)
+    entries = models.PositiveIntegerField()
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'transaction_type'], name='ledgerperiod_unique_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.transaction_type}: {self.total}"
+
+
+class Parent(models.Model):
+    """
+    A parent or guardian, linked to their students. Parents with an account
+    (parent_user) get in-app notifications about their students.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    parent_user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                       help_text="If parent has an account, link here.")
+    full_name = models.CharField(max_length=200)
+    email = models.EmailField(blank=True, null=True)
+    phone = models.CharField(max_length=32, blank=True, null=True)
+    relation = models.CharField(max_length=64, blank=True, null=True)  # e.g., Father, Mother, Guardian
+    created_at = models.DateTimeField(auto_now_add=True)
+    students = models.ManyToManyField(User, related_name='parents', limit_choices_to={'role': 'student'})
+
+    def __str__(self):
+        return f"{self.full_name} ({self.phone or 'no-phone'})"
+
+
+class Approval(models.Model):
+    """
+    A request for someone to approve an action on a target object. Decided
+    in batches through AuthApp.approvals, which knows each action's target
+    model.
+    """
+    ACTION_CHOICES = [
+        ('add_course', 'Add Course'),
+        ('delete_course', 'Delete Course'),
+        ('add_user', 'Add User'),
+        ('delete_user', 'Delete User'),
+        ('enroll_student', 'Enroll Student'),
+        ('add_job', 'Add Job'),
+        ('delete_job', 'Delete Job'),
+        ('leave_request', 'Leave Request'),
+        ('salary_approval', 'Salary Approval'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    action_type = models.CharField(max_length=50, choices=ACTION_CHOICES)
+    # A string, like AuditLog.object_id, so integer and UUID keys both fit.
+    target_id = models.CharField(max_length=50, blank=True)
+    requested_by = models.ForeignKey(User, related_name='requests', on_delete=models.CASCADE)
+    approved_by = models.ForeignKey(User, related_name='approvals', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    timestamp = models.DateTimeField(auto_now_add=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    note = models.TextField(blank=True, null=True)
+    # Of salary approvals: the amount to pay the target user.
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Inbox pages of one action type, newest first; id breaks timestamp ties.
+            models.Index(fields=['status', 'action_type', 'timestamp', 'id'], name='approval_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action_type} ({self.status})"
+
+
+# Leave lasts at most 2 ** LEAVE_MAX_SPAN days.
+LEAVE_MAX_SPAN = 10
+
+
+def _span_covers_dates(max_span):
+    """Q: span is at most max_span and the leave lasts at most 2 ** span days."""
+    covers = models.Q()
+    for span in range(max_span + 1):
+        covers |= models.Q(span=span, end_date__lte=models.F('start_date') + datetime.timedelta(days=2 ** span - 1))
+    return covers
+
+
+class LeaveRequest(models.Model):
+    """
+    Leave from start_date to end_date, both included. Approved leave is
+    found by date through leave_interval_idx; see AuthApp.leave.
+    """
+    LEAVE_STATUS = [
+        ('pending', 'Pending'),
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+        ('cancelled', 'Cancelled'),
+    ]
+    MAX_SPAN = LEAVE_MAX_SPAN
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leave_requests')
+    # if a student, optionally record parent approval/notification
+    parent = models.ForeignKey(Parent, on_delete=models.SET_NULL, null=True, blank=True,
+                               help_text="Parent who approved/requested (if applicable)")
+    start_date = models.DateField()
+    end_date = models.DateField()
+    reason = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=LEAVE_STATUS, default='pending')
+    applied_at = models.DateTimeField(auto_now_add=True)
+    actioned_at = models.DateTimeField(null=True, blank=True)
+    actioned_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='leave_actions')
+    # The user's role when the leave was approved, which DailyAvailability
+    # counts it under; blank until then.
+    role = models.CharField(max_length=20, choices=User.ROLE_CHOICES, blank=True)
+    sub_role = models.CharField(max_length=30, choices=User.SUBROLE_CHOICES, blank=True)
+    # Length class: the leave lasts at most 2 ** span days. Set on save;
+    # leave_span_covers_dates rejects rows written around save() whose span
+    # is too short, as overlapping() would miss them.
+    span = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_date__gte=models.F('start_date')), name='leave_dates_ordered'),
+            models.CheckConstraint(condition=_span_covers_dates(LEAVE_MAX_SPAN), name='leave_span_covers_dates'),
+        ]
+        indexes = [
+            # Approved leave by length class and start; see AuthApp.leave.overlapping().
+            models.Index(fields=['span', 'start_date'], condition=models.Q(status='approved'), name='leave_interval_idx'),
+            models.Index(fields=['user', 'start_date'], name='leave_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Leave[{self.user.username}] {self.start_date} -> {self.end_date} ({self.status})"
+
+    @staticmethod
+    def span_of(start_date, end_date):
+        return (end_date - start_date).days.bit_length()
+
+    def save(self, *args, **kwargs):
+        self.span = self.span_of(self.start_date, self.end_date)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'start_date', 'end_date'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'span'}
+        super().save(*args, **kwargs)
+
+
+class DailyAvailability(models.Model):
+    """Users of one role and sub_role on approved leave on one day, kept by AuthApp.leave."""
+    day = models.DateField()
+    role = models.CharField(max_length=20, choices=User.ROLE_CHOICES)
+    # Blank for users without a sub_role.
+    sub_role = models.CharField(max_length=30, choices=User.SUBROLE_CHOICES, blank=True)
+    on_leave = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'role', 'sub_role'], name='dailyavailability_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {'/'.join(filter(None, [self.role, self.sub_role]))}: {self.on_leave} on leave"
+
+
+class Result(models.Model):
+    """A student's marks in a course. Graded and published for the whole course by AuthApp.results."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='results', limit_choices_to={'role': 'student'})
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='results')
+    marks_obtained = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    total_marks = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    grade = models.CharField(max_length=8, blank=True, null=True)
+    # Share of the course scoring below this student, 0-100 (ties count half).
+    percentile = models.FloatField(null=True, blank=True)
+    published = models.BooleanField(default=False)
+    published_at = models.DateTimeField(null=True, blank=True)
+    published_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='published_results')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'student'], name='result_unique_per_course'),
+        ]
+
+    def __str__(self):
+        return f"Result: {self.student.username} - {self.course.name}"
+
+
+class CourseResultStats(models.Model):
+    """Statistics of a course's marks (as percentages), written when its results are published."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='result_stats')
+    students = models.PositiveIntegerField()
+    mean = models.FloatField()
+    median = models.FloatField()
+    stdev = models.FloatField()
+    lowest = models.FloatField()
+    highest = models.FloatField()
+    p25 = models.FloatField()
+    p75 = models.FloatField()
+    p90 = models.FloatField()
+    # {grade: number of students}
+    grades = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course.name}: mean {self.mean:.1f}% over {self.students}"
+
+
+class EditHistory(models.Model):
+    """A field-level diff of one save of a tracked model; see AuthApp.history."""
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    model_name = models.CharField(max_length=50)
+    # A string, like AuditLog.object_id, so integer and UUID keys both fit.
+    object_id = models.CharField(max_length=50)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    performed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # Not auto_now_add: rows are written after commit but keep the time of the save.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # {field: [old, new]} of the fields that changed; every set field on creation.
+    changes = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'object_id', 'timestamp'], name='edithistory_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} on {self.model_name} by {self.performed_by}"
+
+
+class JobPost(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+        ('pending', 'Pending'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    title = models.CharField(max_length=100)
+    department = models.CharField(max_length=100, blank=True, null=True)
+    description = models.TextField(blank=True)
+    hr = models.ForeignKey(User, on_delete=models.CASCADE, related_name='job_posts',
+                           limit_choices_to={'role': 'employee', 'sub_role': 'hr'})
+    salary = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True,
+                                 help_text="Monthly salary or proposed compensation")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    posted_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+
+class JobApplication(models.Model):
+    """
+    An application to a job post. Resumes are stored once per content under
+    their SHA-256 (resume_digest) and their text is extracted in the
+    background into ResumeText; see AuthApp.applications.
+    """
+    STATUS = [
+        ('applied', 'Applied'),
+        ('shortlisted', 'Shortlisted'),
+        ('rejected', 'Rejected'),
+        ('hired', 'Hired')
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='applications')
+    applicant = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                  help_text="If applicant has an account")
+    applicant_name = models.CharField(max_length=200)
+    applicant_email = models.EmailField()
+    resume = models.FileField(upload_to='resumes/', null=True, blank=True)
+    # SHA-256 of the resume, which is also its file name; blank without one.
+    resume_digest = models.CharField(max_length=64, blank=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS, default='applied')
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # One application per address and post, whatever the address's case.
+            models.UniqueConstraint(Lower('applicant_email'), 'job', name='jobapplication_unique_applicant'),
+        ]
+        indexes = [
+            models.Index(fields=['resume_digest'], condition=~models.Q(resume_digest=''), name='jobapplication_resume_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.applicant_name} -> {self.job.title}"
+
+
+class ResumeText(models.Model):
+    """Text extracted from one resume file, shared by every application that uploaded it."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    text = models.TextField(blank=True)
+    # Why nothing could be extracted, if so.
+    error = models.CharField(max_length=200, blank=True)
+    extracted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]}: {len(self.text)} characters"
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of one user, course or job post. The full-text
+    index over title and body is kept by the database; see AuthApp.search.
+    """
+    KIND_CHOICES = [
+        ('user', 'User'),
+        ('course', 'Course'),
+        ('jobpost', 'Job post'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=50)
+    title = models.CharField(max_length=500)
+    body = models.TextField(blank=True)
+    # Of users; blank for other kinds.
+    role = models.CharField(max_length=20, blank=True)
+    sub_role = models.CharField(max_length=30, blank=True)
+    # Inactive users and job posts that are not open: only shown to those who manage them.
+    restricted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='searchdocument_object_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
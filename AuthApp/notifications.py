@@ -0,0 +1,267 @@
+"""
+Notification fan-out.
+
+Announcing something to a whole role means one Notification row per
+recipient. Instead of creating those inside the request, notify_audience()
+stores a NotificationBatch and the worker writes the rows with bulk_create
+in chunks, walking the recipients by primary key so an interrupted batch
+picks up where it stopped.
+
+Unread counts are cached per user and kept current incrementally, so
+dashboards never need a COUNT(*) over the notification table. New rows are
+also published to open notification streams (see AuthApp.pubsub).
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Notification, NotificationBatch, User
+from .pubsub import broker
+
+logger = logging.getLogger(__name__)
+
+
+def audience(role='', sub_role=''):
+    """Active users matching a role/sub_role audience (blank means any)."""
+    users = User.objects.filter(is_active=True)
+    if role:
+        users = users.filter(role=role)
+    if sub_role:
+        users = users.filter(sub_role=sub_role)
+    return users
+
+
+def notify_audience(message, role='', sub_role='', action_link=None, created_by=None):
+    """
+    Queue a notification for every active user in the audience.
+
+    Returns the NotificationBatch straight away; delivery starts once the
+    surrounding transaction commits.
+    """
+    batch = NotificationBatch.objects.create(
+        message=message,
+        action_link=action_link,
+        role=role,
+        sub_role=sub_role,
+        created_by=created_by,
+    )
+    transaction.on_commit(dispatch)
+    return batch
+
+
+def notify_users(messages, action_link=None, batch_size=None):
+    """
+    Notify a known list of users, as [(user_id, message), ...], with one
+    bulk_create per NOTIFICATION_BATCH_SIZE rows in the current
+    transaction. Returns the number of notifications created.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    created = Notification.objects.bulk_create(
+        [Notification(user_id=user_id, message=message, action_link=action_link) for user_id, message in messages],
+        batch_size=batch_size,
+    )
+    transaction.on_commit(lambda: delivered(created))
+    return len(created)
+
+
+def dispatch():
+    if settings.NOTIFICATION_FANOUT_ASYNC:
+        get_worker().wake()
+    else:
+        process_pending()
+
+
+def claim(batch_id):
+    """Move a pending batch to running. Only one worker can win."""
+    return NotificationBatch.objects.filter(pk=batch_id, status='pending').update(status='running') == 1
+
+
+def deliver(batch, batch_size=None):
+    """Write the Notification rows for a claimed batch, chunk by chunk."""
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    recipients = audience(batch.role, batch.sub_role).order_by('pk').values_list('pk', flat=True)
+
+    while True:
+        user_ids = list(recipients.filter(pk__gt=batch.last_user_id)[:batch_size])
+        if not user_ids:
+            break
+        with transaction.atomic():
+            created = Notification.objects.bulk_create(
+                [
+                    Notification(user_id=user_id, message=batch.message, action_link=batch.action_link)
+                    for user_id in user_ids
+                ],
+                batch_size=batch_size,
+            )
+            transaction.on_commit(lambda created=created: delivered(created))
+            batch.delivered += len(user_ids)
+            batch.last_user_id = user_ids[-1]
+            NotificationBatch.objects.filter(pk=batch.pk).update(
+                delivered=batch.delivered, last_user_id=batch.last_user_id
+            )
+
+    batch.status = 'done'
+    batch.finished_at = timezone.now()
+    NotificationBatch.objects.filter(pk=batch.pk).update(status=batch.status, finished_at=batch.finished_at)
+    return batch.delivered
+
+
+def notification_event(notification):
+    return {
+        'id': str(notification.pk),
+        'message': notification.message,
+        'action_link': notification.action_link,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def delivered(notifications):
+    """
+    Bookkeeping once new unread notifications are committed: bump the cached
+    counters and push them to recipients with an open stream.
+    """
+    adjust_unread([notification.user_id for notification in notifications], 1)
+    listening = set(broker.listening({notification.user_id for notification in notifications}))
+    for notification in notifications:
+        if notification.user_id in listening:
+            broker.publish(notification.user_id, notification_event(notification))
+
+
+def process_pending(limit=None):
+    """Deliver pending batches oldest first. Returns how many were processed."""
+    processed = 0
+    while limit is None or processed < limit:
+        batch = NotificationBatch.objects.filter(status='pending').order_by('created_at').first()
+        if batch is None:
+            break
+        if not claim(batch.pk):
+            continue
+        try:
+            deliver(batch)
+        except Exception as exc:
+            logger.exception("Notification batch %s failed", batch.pk)
+            NotificationBatch.objects.filter(pk=batch.pk).update(status='failed', error=str(exc))
+        processed += 1
+    return processed
+
+
+def requeue_running():
+    """Hand batches left running by a dead worker back to the queue."""
+    return NotificationBatch.objects.filter(status='running').update(status='pending')
+
+
+class NotificationWorker(threading.Thread):
+    """Daemon thread that drains the batch queue when woken or on a timer."""
+
+    def __init__(self, poll_interval=None):
+        super().__init__(name="notification-worker", daemon=True)
+        self.poll_interval = poll_interval or settings.NOTIFICATION_WORKER_POLL_INTERVAL
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                process_pending()
+            except Exception:
+                logger.exception("Notification worker loop failed")
+            finally:
+                close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """The in-process worker, started on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = NotificationWorker()
+            _worker.start()
+        return _worker
+
+
+# Unread counters
+#
+# Each user's unread count lives in the cache under unread:<user_id> and is
+# adjusted with incr/decr as notifications are created or read. Missing keys
+# are never adjusted, only rebuilt from the database on the next read, so a
+# cold or evicted cache always converges on the real count.
+
+def _cache():
+    return caches[settings.UNREAD_COUNT_CACHE]
+
+
+def _unread_key(user_id):
+    return f"unread:{user_id}"
+
+
+def adjust_unread(user_ids, delta):
+    cache = _cache()
+    for user_id in user_ids:
+        try:
+            cache.incr(_unread_key(user_id), delta)
+        except ValueError:
+            pass
+
+
+def unread_count(user):
+    """Unread notifications for a user (or user id), served from the cache."""
+    user_id = getattr(user, 'pk', user)
+    count = _cache().get(_unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        _cache().add(_unread_key(user_id), count, settings.UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def rebuild_unread_counts(user_ids=None):
+    """
+    Recompute cached counts from the database in one GROUP BY.
+    Users with nothing unread are stored as 0.
+    """
+    users = User.objects.all()
+    unread = Notification.objects.filter(is_read=False)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        unread = unread.filter(user_id__in=user_ids)
+    counts = dict.fromkeys(users.values_list('pk', flat=True), 0)
+    counts.update(unread.values_list('user_id').annotate(n=Count('pk')).order_by())
+    _cache().set_many(
+        {_unread_key(user_id): count for user_id, count in counts.items()},
+        settings.UNREAD_COUNT_TIMEOUT,
+    )
+    return counts
+
+
+def mark_read(notification):
+    """Mark one notification read. Returns False if it already was."""
+    updated = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True)
+    notification.is_read = True
+    if updated:
+        adjust_unread([notification.user_id], -1)
+    return bool(updated)
+
+
+def mark_all_read(user):
+    """Mark every unread notification of a user read with a single UPDATE."""
+    user_id = getattr(user, 'pk', user)
+    updated = Notification.objects.filter(user_id=user_id, is_read=False).update(is_read=True)
+    _cache().set(_unread_key(user_id), 0, settings.UNREAD_COUNT_TIMEOUT)
+    return updated
@@ -0,0 +1,201 @@
+"""
+Role-based permissions.
+
+Every (role, sub_role) pair from User.ROLE_CHOICES and SUBROLE_CHOICES is
+resolved once, at import, to a frozenset of permission strings, so checking
+a role permission is a set lookup with no queries. Permissions granted to a
+single user through user_permissions or groups are overrides. They are
+loaded on the first check that the role does not already answer, cached per
+user, and invalidated when the user, their permissions or their groups
+change.
+
+RolePermissionBackend plugs this into user.has_perm(), so Django's
+permission_required and PermissionRequiredMixin work unchanged. Use
+role_required and RoleRequiredMixin to gate views by role instead.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.mixins import AccessMixin
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+
+from .models import User
+
+# Stands in for "every permission"; admin has it.
+ALL = '*'
+
+ROLE_PERMISSIONS = {
+    'admin': {ALL},
+    'employee': {
+        'AuthApp.view_notification',
+        'AuthApp.view_user',
+    },
+    'student': {
+        'AuthApp.view_notification',
+        'AuthApp.enroll_courses',
+        'AuthApp.make_payments',
+    },
+    'candidate': {
+        'AuthApp.view_notification',
+    },
+}
+
+# Added to the role's permissions for employees with this sub_role.
+SUBROLE_PERMISSIONS = {
+    'faculty': {
+        'AuthApp.add_user', 'AuthApp.change_user', 'AuthApp.delete_user',
+        'AuthApp.manage_courses', 'AuthApp.review_requests',
+    },
+    'hr': {
+        'AuthApp.add_user', 'AuthApp.change_user',
+        'AuthApp.manage_job_posts', 'AuthApp.offer_salaries', 'AuthApp.approve_leave',
+    },
+    'finance': {
+        'AuthApp.approve_salaries', 'AuthApp.approve_transactions', 'AuthApp.view_finance_reports',
+    },
+    'marketing': {
+        'AuthApp.post_announcements',
+    },
+    'it': {
+        'AuthApp.view_activitylog', 'AuthApp.view_auditlog',
+    },
+    'teacher': {
+        'AuthApp.manage_courses', 'AuthApp.mark_attendance', 'AuthApp.notify_guardians',
+    },
+    'other': set(),
+}
+
+
+def build_matrix():
+    """Resolve every (role, sub_role) pair, including no sub_role, to a frozenset."""
+    roles = [role for role, _ in User.ROLE_CHOICES]
+    sub_roles = [sub_role for sub_role, _ in User.SUBROLE_CHOICES]
+    missing = (set(roles) - set(ROLE_PERMISSIONS)) | (set(sub_roles) - set(SUBROLE_PERMISSIONS))
+    if missing:
+        raise ImproperlyConfigured(f"No permissions defined for role(s): {', '.join(sorted(missing))}")
+
+    matrix = {}
+    for role in roles:
+        matrix[role, None] = frozenset(ROLE_PERMISSIONS[role])
+        for sub_role in sub_roles:
+            # Sub-roles only grant anything to employees; the admin forms and the
+            # bulk importer accept any sub_role for any role.
+            extra = SUBROLE_PERMISSIONS[sub_role] if role == 'employee' else set()
+            matrix[role, sub_role] = frozenset(ROLE_PERMISSIONS[role] | extra)
+    return matrix
+
+
+MATRIX = build_matrix()
+
+
+def role_permissions(role, sub_role=None):
+    return MATRIX.get((role, sub_role or None), frozenset())
+
+
+def _cache():
+    return caches[settings.PERMISSION_CACHE]
+
+
+def _override_key(user_id):
+    return f"perms:{user_id}"
+
+
+def override_permissions(user):
+    """Permissions granted to this user individually or through groups."""
+    key = _override_key(user.pk)
+    perms = _cache().get(key)
+    if perms is None:
+        granted = Permission.objects.filter(user=user) | Permission.objects.filter(group__user=user)
+        perms = frozenset(
+            f"{app_label}.{codename}"
+            for app_label, codename in granted.values_list('content_type__app_label', 'codename').distinct()
+        )
+        _cache().set(key, perms, settings.PERMISSION_CACHE_TIMEOUT)
+    return perms
+
+
+def invalidate_permissions(*user_ids):
+    _cache().delete_many([_override_key(user_id) for user_id in user_ids])
+
+
+class RolePermissionBackend(ModelBackend):
+    """ModelBackend authentication with permissions answered from MATRIX first."""
+
+    def _role_perms(self, user_obj):
+        return role_permissions(getattr(user_obj, 'role', None), getattr(user_obj, 'sub_role', None))
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return set(override_permissions(user_obj))
+
+    def get_group_permissions(self, user_obj, obj=None):
+        # Folded into override_permissions().
+        return set()
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_role_perm_cache'):
+            user_obj._role_perm_cache = (self._role_perms(user_obj) | override_permissions(user_obj)) - {ALL}
+        return user_obj._role_perm_cache
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return False
+        if user_obj.is_superuser:
+            return True
+        role_perms = self._role_perms(user_obj)
+        if ALL in role_perms or perm in role_perms:
+            return True
+        return perm in override_permissions(user_obj)
+
+    def has_module_perms(self, user_obj, app_label):
+        if not user_obj.is_active or user_obj.is_anonymous:
+            return False
+        if user_obj.is_superuser or ALL in self._role_perms(user_obj):
+            return True
+        prefix = f"{app_label}."
+        return any(perm.startswith(prefix) for perm in self.get_all_permissions(user_obj))
+
+
+def has_role(user, *roles):
+    """True if the user matches any of `roles`, written 'student' or 'employee:hr'."""
+    if not user.is_authenticated:
+        return False
+    return any(
+        role == user.role or role == f"{user.role}:{user.sub_role}"
+        for role in roles
+    )
+
+
+def role_pairs(roles):
+    """(role, sub_role) for each of `roles`, written as for has_role(); sub_role is '' if not given."""
+    return [role.partition(':')[::2] for role in roles or ()]
+
+
+def role_required(*roles, login_url=None, raise_exception=False):
+    """View decorator allowing only users with one of `roles`."""
+    def check(user):
+        if has_role(user, *roles):
+            return True
+        if raise_exception and user.is_authenticated:
+            raise PermissionDenied
+        return False
+
+    return user_passes_test(check, login_url=login_url)
+
+
+class RoleRequiredMixin(AccessMixin):
+    """Class-based view counterpart of role_required; set allowed_roles."""
+
+    allowed_roles = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.allowed_roles:
+            raise ImproperlyConfigured(f"{type(self).__name__} is missing allowed_roles.")
+        if not has_role(request.user, *self.allowed_roles):
+            return self.handle_no_permission()
+        return super().dispatch(request, *args, **kwargs)
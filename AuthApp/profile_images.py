@@ -0,0 +1,207 @@
+"""
+Profile image uploads.
+
+set_profile_image() validates the upload and saves a copy re-encoded
+without metadata to User.image inside the request. Uploads through the
+admin's user form go through it as well. Thumbnails are rendered
+after commit by a process pool (see AuthApp.imaging) as square WebP files,
+one per PROFILE_IMAGE_SIZES entry, and their storage paths are saved in
+User.image_variants as {"<size>": path}, so pages serve them without
+decoding anything. Until they exist, pages fall back to the cleaned image.
+
+Variants rendered for an image that has since been replaced are thrown
+away. Images left without variants, e.g. by a killed process, are picked up
+again by the build_image_variants job.
+"""
+import logging
+import multiprocessing
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from . import imaging
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+def _storage():
+    return User._meta.get_field('image').storage
+
+
+def clean_upload(upload):
+    """(bytes, extension) of a validated upload with metadata removed."""
+    upload.seek(0)
+    try:
+        return imaging.clean_image(
+            upload.read(),
+            max_bytes=settings.PROFILE_IMAGE_MAX_BYTES,
+            max_pixels=settings.PROFILE_IMAGE_MAX_PIXELS,
+            formats=settings.PROFILE_IMAGE_FORMATS,
+            max_edge=settings.PROFILE_IMAGE_MAX_EDGE,
+        )
+    except imaging.InvalidImage as exc:
+        raise ValidationError(str(exc), code='invalid_image')
+
+
+def set_profile_image(user, upload, cleaned=None):
+    """
+    Replace the user's profile image and schedule its variants. `cleaned` is
+    what clean_upload() returned for `upload`, if a form has called it already.
+    """
+    data, extension = cleaned or clean_upload(upload)
+    old_files = _files(user)
+    user.image.save(f"{uuid.uuid4().hex}.{extension}", ContentFile(data), save=False)
+    user.image_variants = {}
+    user.save(update_fields=['image', 'image_variants'])
+
+    name = user.image.name
+    transaction.on_commit(lambda: _delete(old_files))
+    transaction.on_commit(lambda: schedule_variants(user.pk, name, data))
+
+
+def remove_profile_image(user):
+    """Clear the user's profile image and delete its files after commit."""
+    old_files = _files(user)
+    user.image = None
+    user.image_variants = {}
+    user.save(update_fields=['image', 'image_variants'])
+    transaction.on_commit(lambda: _delete(old_files))
+
+
+def _files(user):
+    if not user.image:
+        return []
+    return [user.image.name, *user.image_variants.values()]
+
+
+def _delete(paths):
+    storage = _storage()
+    for path in paths:
+        storage.delete(path)
+
+
+def variant_path(name, size):
+    path = PurePosixPath(name)
+    return str(path.parent / 'variants' / f"{path.stem}-{size}.webp")
+
+
+def store_variants(user_id, name, rendered):
+    """Save rendered variants and record them, unless the image was replaced meanwhile."""
+    storage = _storage()
+    paths = {
+        str(size): storage.save(variant_path(name, size), ContentFile(data))
+        for size, data in rendered.items()
+    }
+    if not User.objects.filter(pk=user_id, image=name).update(image_variants=paths):
+        _delete(paths.values())
+        return None
+    return paths
+
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def schedule_variants(user_id, name, data=None):
+    """
+    Render and store the variants of `name` for user_id in the worker pool,
+    or inline when PROFILE_IMAGE_WORKERS is 0. Returns False if that image
+    is already being processed.
+    """
+    key = (user_id, name)
+    with _pending_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+
+    sizes = settings.PROFILE_IMAGE_SIZES
+    quality = settings.PROFILE_IMAGE_QUALITY
+    try:
+        if data is None:
+            with _storage().open(name, 'rb') as f:
+                data = f.read()
+        if settings.PROFILE_IMAGE_WORKERS == 0:
+            try:
+                store_variants(user_id, name, imaging.render_variants(data, sizes, quality))
+            finally:
+                _finish(key)
+            return True
+        try:
+            future = get_pool().submit(imaging.render_variants, data, sizes, quality)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool.
+            reset_pool()
+            future = get_pool().submit(imaging.render_variants, data, sizes, quality)
+    except Exception:
+        _finish(key)
+        raise
+    future.add_done_callback(lambda future: _stored(key, future))
+    return True
+
+
+def _finish(key):
+    with _pending_lock:
+        _pending.discard(key)
+
+
+def _stored(key, future):
+    # Runs on the pool's management thread.
+    try:
+        store_variants(*key, future.result())
+    except Exception:
+        logger.exception("Rendering variants of %s failed", key[1])
+    finally:
+        _finish(key)
+        close_old_connections()
+
+
+def missing_variants():
+    """Users with an image but no variants."""
+    return User.objects.exclude(image='').exclude(image__isnull=True).filter(image_variants={})
+
+
+def build_missing_variants(limit=500):
+    """Schedule variants for images that have none. Returns how many were scheduled."""
+    scheduled = 0
+    for user_id, name in missing_variants().order_by('pk').values_list('pk', 'image')[:limit]:
+        try:
+            scheduled += schedule_variants(user_id, name)
+        except OSError:
+            logger.exception("Cannot read profile image %s", name)
+    return scheduled
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    The process pool, started on first use. Workers are spawned rather than
+    forked, since forking a process that runs request threads can copy held
+    locks into the child.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PROFILE_IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
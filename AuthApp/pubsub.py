@@ -0,0 +1,69 @@
+"""
+In-process publish/subscribe for real-time notifications.
+
+Each open notification stream subscribes an asyncio.Queue for its user.
+publish() can be called from any thread (request threads, the fan-out
+worker, on_commit hooks) and hands the event to the subscriber's event loop
+with call_soon_threadsafe, so nothing polls the database.
+
+Only streams served by the same process receive events. Run the ASGI server
+with a single worker process, or add a cross-process transport in front of
+publish(), when notifications are written elsewhere.
+"""
+import asyncio
+import threading
+from contextlib import contextmanager
+
+
+def _offer(queue, event):
+    # Slow clients lose their oldest events rather than growing memory.
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class Broker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def subscribe(self, user_id):
+        """Register a queue for user_id on the running event loop."""
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                entries = self._subscribers.get(user_id)
+                if entries is not None:
+                    entries.discard(entry)
+                    if not entries:
+                        del self._subscribers[user_id]
+
+    def listening(self, user_ids):
+        """The subset of user_ids with at least one open stream."""
+        with self._lock:
+            return [user_id for user_id in user_ids if user_id in self._subscribers]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            entries = list(self._subscribers.get(user_id, ()))
+        for loop, queue in entries:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has closed; its finally block cleans up.
+                pass
+        return len(entries)
+
+    @property
+    def connections(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._subscribers.values())
+
+
+broker = Broker()
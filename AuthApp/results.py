@@ -0,0 +1,221 @@
+"""
+Course results.
+
+Marks come in from a CSV/XLSX file (import_marks) or any list of rows
+(ingest_marks). Either way the enrolled students are looked up with one
+query and the marks are written with one upsert; bad rows are skipped and
+reported, as in the bulk user import.
+
+publish_results() publishes a whole course in one pass. The marks are read
+once as columns; percentages, grades (RESULT_GRADE_BANDS, found by
+bisection), percentile ranks and the course statistics are all computed
+over those columns; the results are written back with a single UPDATE;
+and every newly published student, plus each of their
+parents with an account, gets a notification from one bulk_create().
+"""
+import statistics
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .bulk_users import read_rows
+from .models import CourseResultStats, Enrollment, Parent, Result
+from .notifications import notify_users
+
+MARK_COLUMNS = ['username', 'marks_obtained', 'total_marks']
+
+
+# Ingestion
+
+class MarksImport:
+    def __init__(self):
+        self.saved = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+
+
+def _ingest(course, numbered_rows, total_marks):
+    result = MarksImport()
+    parsed, seen = [], set()
+    for line, row in numbered_rows:
+        username = str(row.get('username', '')).strip()
+        marks = _decimal(row.get('marks_obtained', ''))
+        total = _decimal(row.get('total_marks') or total_marks or '')
+        if not username:
+            result.error(line, "username: This field is required.")
+        elif username in seen:
+            result.error(line, f"username: {username} appears more than once.")
+        elif marks is None or total is None or total <= 0:
+            result.error(line, "marks_obtained and total_marks must be numbers, with total_marks above zero.")
+        elif not 0 <= marks <= total:
+            result.error(line, f"marks_obtained must be between 0 and {total}.")
+        else:
+            seen.add(username)
+            parsed.append((line, username, marks, total))
+
+    enrolled = dict(
+        Enrollment.objects.filter(course=course, status__in=['active', 'completed'], student__username__in=seen)
+        .values_list('student__username', 'student_id')
+    )
+    published = set(
+        Result.objects.filter(course=course, published=True, student_id__in=enrolled.values())
+        .values_list('student_id', flat=True)
+    )
+    results = []
+    for line, username, marks, total in parsed:
+        student_id = enrolled.get(username)
+        if student_id is None:
+            result.error(line, f"username: {username} is not enrolled in {course.name}.")
+        elif student_id in published:
+            result.error(line, f"username: {username}'s result is already published.")
+        else:
+            results.append(Result(course=course, student_id=student_id, marks_obtained=marks, total_marks=total))
+
+    Result.objects.bulk_create(
+        results, batch_size=1000, update_conflicts=True,
+        unique_fields=['course', 'student'], update_fields=['marks_obtained', 'total_marks'],
+    )
+    result.saved = len(results)
+    result.errors.sort()
+    return result
+
+
+def ingest_marks(course, rows, total_marks=None):
+    """
+    Save marks for `course` from an iterable of {column: value} rows with
+    MARK_COLUMNS; `total_marks` fills in rows without one. Errors are
+    reported by row number. Returns a MarksImport.
+    """
+    return _ingest(course, enumerate(rows, start=1), total_marks)
+
+
+def import_marks(course, file, format='csv', total_marks=None):
+    """ingest_marks() from an open binary CSV/XLSX file; errors are reported by line."""
+    return _ingest(course, read_rows(file, format), total_marks)
+
+
+# Grading
+
+def grade_bands(bands=None):
+    """(thresholds ascending, grades) for `bands` or RESULT_GRADE_BANDS."""
+    bands = sorted(bands or settings.RESULT_GRADE_BANDS)
+    if not bands or bands[0][0] > 0:
+        raise ImproperlyConfigured("RESULT_GRADE_BANDS needs a band starting at 0.")
+    return [threshold for threshold, _ in bands], [grade for _, grade in bands]
+
+
+def assign_grades(percentages, bands=None):
+    """The grade of each percentage, in order."""
+    thresholds, grades = grade_bands(bands)
+    return [grades[bisect_right(thresholds, percentage) - 1] for percentage in percentages]
+
+
+def percentile_ranks(percentages):
+    """Share of `percentages` below each one, 0-100, with ties counting half."""
+    ordered = sorted(percentages)
+    count = len(ordered)
+    return [
+        (bisect_left(ordered, value) + bisect_right(ordered, value)) / 2 / count * 100
+        for value in percentages
+    ]
+
+
+def course_statistics(percentages, grades):
+    """Summary statistics of a course's percentages, as CourseResultStats fields."""
+    if len(percentages) > 1:
+        cuts = statistics.quantiles(percentages, n=100, method='inclusive')
+        p25, p75, p90 = cuts[24], cuts[74], cuts[89]
+    else:
+        p25 = p75 = p90 = percentages[0]
+    counts = {}
+    for grade in grades:
+        counts[grade] = counts.get(grade, 0) + 1
+    return {
+        'students': len(percentages),
+        'mean': statistics.fmean(percentages),
+        'median': statistics.median(percentages),
+        'stdev': statistics.pstdev(percentages),
+        'lowest': min(percentages),
+        'highest': max(percentages),
+        'p25': p25,
+        'p75': p75,
+        'p90': p90,
+        'grades': counts,
+    }
+
+
+# Publishing
+
+def publish_results(course, published_by=None, bands=None):
+    """
+    Grade and publish every result of `course` that has marks, and notify
+    the students published for the first time and their parents. Returns
+    the CourseResultStats, or None when there are no marks yet.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        marked = Result.objects.filter(course=course, marks_obtained__isnull=False, total_marks__gt=0)
+        rows = list(marked.select_for_update(of=('self',)).values_list(
+            'student_id', 'student__first_name', 'student__username', 'marks_obtained', 'total_marks', 'published_at',
+        ))
+        if not rows:
+            return None
+        student_ids, first_names, usernames, marks, totals, published_at = zip(*rows)
+        percentages = [float(obtained) / float(total) * 100 for obtained, total in zip(marks, totals)]
+        grades = assign_grades(percentages, bands)
+        ranks = percentile_ranks(percentages)
+
+        new = {
+            student_id: first_name or username
+            for student_id, first_name, username, published in zip(student_ids, first_names, usernames, published_at)
+            if published is None
+        }
+        parents = list(Parent.students.through.objects.filter(
+            user_id__in=marked.filter(published_at__isnull=True).values('student_id'),
+            parent__parent_user__isnull=False,
+        ).values_list('user_id', 'parent__parent_user_id'))
+
+        # Rows with the same marks get the same grade and percentile, so one
+        # UPDATE keyed by the distinct marks publishes them all. (bulk_update()
+        # would build a CASE branch per row and field, which is far slower.)
+        graded = dict(zip(zip(marks, totals), zip(grades, ranks)))
+        by_marks = [
+            (Q(marks_obtained=obtained, total_marks=total), grade, rank)
+            for (obtained, total), (grade, rank) in graded.items()
+        ]
+        marked.update(
+            grade=Case(*[When(condition, then=Value(grade)) for condition, grade, _ in by_marks]),
+            percentile=Case(*[When(condition, then=Value(rank)) for condition, _, rank in by_marks]),
+            published=True,
+            published_at=Coalesce('published_at', Value(now)),
+            published_by=published_by,
+        )
+        summary = course_statistics(percentages, grades)
+        stats, = CourseResultStats.objects.bulk_create(
+            [CourseResultStats(course=course, **summary)],
+            update_conflicts=True, unique_fields=['course'], update_fields=[*summary, 'computed_at'],
+        )
+
+        notify_users(
+            [(student_id, f"Your result for {course.name} has been published.") for student_id in new]
+            + [
+                (parent_user_id, f"{new[student_id]}'s result for {course.name} has been published.")
+                for student_id, parent_user_id in parents
+            ]
+        )
+    return stats
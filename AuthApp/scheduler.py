@@ -0,0 +1,56 @@
+"""
+A minimal periodic job runner.
+
+Jobs register themselves with @job(name, interval) and are run by
+`manage.py run_jobs`, either in a loop or once per invocation from cron.
+Intervals are read when the job runs, so they can come from settings.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+
+
+class Job:
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self._interval = interval
+        self.last_run = None
+
+    @property
+    def interval(self):
+        return self._interval() if callable(self._interval) else self._interval
+
+    def due(self, now):
+        return self.last_run is None or now - self.last_run >= self.interval
+
+    def run(self):
+        self.last_run = time.monotonic()
+        return self.func()
+
+
+def job(name, interval):
+    """Register the decorated function as a periodic job. `interval` is seconds or a callable returning them."""
+    def decorator(func):
+        JOBS[name] = Job(name, func, interval)
+        return func
+    return decorator
+
+
+def run_due(names=None):
+    """Run every due job (or just `names`). Returns {name: result}."""
+    now = time.monotonic()
+    results = {}
+    for name, scheduled in JOBS.items():
+        if names and name not in names:
+            continue
+        if not scheduled.due(now):
+            continue
+        try:
+            results[name] = scheduled.run()
+        except Exception:
+            logger.exception("Scheduled job %s failed", name)
+    return results
@@ -0,0 +1,275 @@
+"""
+Full-text search over users, courses and job posts.
+
+Each searchable object has one SearchDocument row with its text in two
+columns: title (names) and body (email, bio, location, descriptions). The
+database indexes those columns itself, so a search is one ranked index
+lookup instead of an icontains scan of three tables:
+
+- SQLite: the FTS5 table search_fts, an external-content index over
+  SearchDocument kept current by triggers, ranked by bm25() with title
+  matches weighted above body matches.
+- PostgreSQL: a generated tsvector column with a GIN index, ranked by
+  ts_rank() with the same weighting.
+- Anything else falls back to icontains over SearchDocument.
+
+Both are created by migration 0015. Signals write a model's document in the
+same transaction as the model (AuthApp.signals), and the bulk user import
+indexes what it creates; rebuild_index() (`manage.py rebuild_search_index`)
+writes them all again after bulk changes that bypass both.
+
+Every word of a query must match, as a prefix, so "ali dha" finds
+"Alice Dhaka". Results are limited to what the searching user may see; see
+KIND_PERMISSIONS.
+"""
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import Course, JobPost, SearchDocument, User
+from .permissions import role_pairs
+
+FTS_TABLE = 'search_fts'
+
+# kind: (permission needed to search it, permission to also see its restricted
+# documents). None: any signed-in user.
+KIND_PERMISSIONS = {
+    'user': ('AuthApp.view_user', 'AuthApp.change_user'),
+    'course': (None, 'AuthApp.manage_courses'),
+    'jobpost': (None, 'AuthApp.manage_job_posts'),
+}
+
+MAX_TERMS = 8
+
+
+def _join(*parts):
+    return " ".join(str(part) for part in parts if part)
+
+
+# Builders turn a source row into document values, in COLUMNS order.
+COLUMNS = ['kind', 'object_id', 'title', 'body', 'role', 'sub_role', 'restricted']
+
+
+def _user_document(row):
+    return (
+        'user', str(row['id']),
+        _join(row['first_name'], row['last_name'], row['username']),
+        _join(row['email'], row['location'], row['country'], row['bio']),
+        row['role'], row['sub_role'] or '', not row['is_active'],
+    )
+
+
+def _course_document(row):
+    return ('course', str(row['id']), _join(row['name'], row['code']), row['description'], '', '', False)
+
+
+def _jobpost_document(row):
+    return (
+        'jobpost', str(row['id']), _join(row['title'], row['department']), row['description'],
+        '', '', row['status'] != 'open',
+    )
+
+
+# kind: (model, fields the document is built from, builder)
+SOURCES = {
+    'user': (User, ['id', 'username', 'first_name', 'last_name', 'email', 'location', 'country', 'bio',
+                    'role', 'sub_role', 'is_active'], _user_document),
+    'course': (Course, ['id', 'name', 'code', 'description'], _course_document),
+    'jobpost': (JobPost, ['id', 'title', 'department', 'description', 'status'], _jobpost_document),
+}
+
+KINDS = {model: kind for kind, (model, _, _) in SOURCES.items()}
+
+
+# Indexing
+
+def indexes(instance, update_fields=None):
+    """Whether a save of `instance` with `update_fields` can change its document."""
+    _, fields, _ = SOURCES[KINDS[type(instance)]]
+    return update_fields is None or not set(fields).isdisjoint(update_fields)
+
+
+def _write(documents):
+    SearchDocument.objects.bulk_create(
+        [SearchDocument(**dict(zip(COLUMNS, document))) for document in documents],
+        batch_size=500, update_conflicts=True, unique_fields=['kind', 'object_id'], update_fields=COLUMNS[2:],
+    )
+
+
+def index_objects(objs):
+    """Write the documents of saved users, courses or job posts."""
+    documents = []
+    for obj in objs:
+        _, fields, build = SOURCES[KINDS[type(obj)]]
+        documents.append(build({field: getattr(obj, field) for field in fields}))
+    _write(documents)
+
+
+def unindex_object(obj):
+    SearchDocument.objects.filter(kind=KINDS[type(obj)], object_id=str(obj.pk)).delete()
+
+
+# The triggers migration 0015 keeps search_fts current with. rebuild_index()
+# drops them while it reloads: FTS5 indexes a whole table in one pass several
+# times faster than it indexes the same rows one trigger at a time.
+SQLITE_TRIGGERS = {
+    'search_fts_insert': """CREATE TRIGGER search_fts_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    'search_fts_delete': """CREATE TRIGGER search_fts_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    'search_fts_update': """CREATE TRIGGER search_fts_update AFTER UPDATE OF title, body ON {table} BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+}
+
+
+def rebuild_index(kinds=None, batch_size=2000):
+    """
+    Replace the documents of every object of `kinds` (default: all), in
+    one transaction. Returns {kind: documents written}.
+    """
+    connection = connections[router.db_for_write(SearchDocument)]
+    fts = connection.vendor == 'sqlite' and _has_fts(connection)
+    table = connection.ops.quote_name(SearchDocument._meta.db_table)
+    # Plain executemany(): bulk_create() costs several times more per row,
+    # and the old documents are gone, so there is nothing to upsert.
+    insert = (
+        f"INSERT INTO {table} ({', '.join(connection.ops.quote_name(column) for column in COLUMNS)})"
+        f" VALUES ({', '.join(['%s'] * len(COLUMNS))})"
+    )
+    written = {}
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if fts:
+            for trigger in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        for kind in kinds or SOURCES:
+            model, fields, build = SOURCES[kind]
+            SearchDocument.objects.filter(kind=kind).delete()
+            count, batch = 0, []
+            for row in model.objects.order_by('pk').values(*fields).iterator(chunk_size=batch_size):
+                batch.append(build(row))
+                if len(batch) >= batch_size:
+                    cursor.executemany(insert, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(insert, batch)
+            written[kind] = count + len(batch)
+        if fts:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql.format(table=table))
+    return written
+
+
+# Searching
+
+def visible_kinds(user):
+    """{kind: whether restricted documents are shown} for what `user` may search."""
+    if user is None:
+        return dict.fromkeys(SOURCES, True)
+    if not user.is_authenticated:
+        return {}
+    kinds = {}
+    for kind, (search_perm, restricted_perm) in KIND_PERMISSIONS.items():
+        if search_perm is None or user.has_perm(search_perm):
+            kinds[kind] = user.has_perm(restricted_perm)
+    return kinds
+
+
+def terms(query):
+    """The words of `query`, lowercased, as the index tokenises them."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+_fts_tables = {}
+
+
+def _has_fts(connection):
+    if connection.alias not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[connection.alias] = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_tables[connection.alias]
+
+
+def _filters(kinds, roles):
+    """SQL conditions on the document table `d`, and their parameters."""
+    by_kind, params = [], []
+    for kind, restricted in kinds.items():
+        by_kind.append("d.kind = %s" if restricted else "(d.kind = %s AND NOT d.restricted)")
+        params.append(kind)
+    where = f"({' OR '.join(by_kind)})"
+    if roles:
+        by_role = []
+        for role, sub_role in role_pairs(roles):
+            by_role.append("(d.role = %s AND d.sub_role = %s)" if sub_role else "d.role = %s")
+            params += [role, sub_role] if sub_role else [role]
+        where += f" AND (d.kind <> 'user' OR {' OR '.join(by_role)})"
+    return where, params
+
+
+def _fallback(words, kinds, roles, limit):
+    visible = Q()
+    for kind, restricted in kinds.items():
+        visible |= Q(kind=kind) if restricted else Q(kind=kind, restricted=False)
+    documents = SearchDocument.objects.filter(visible)
+    if roles:
+        by_role = Q()
+        for role, sub_role in role_pairs(roles):
+            by_role |= Q(role=role, sub_role=sub_role) if sub_role else Q(role=role)
+        documents = documents.filter(~Q(kind='user') | by_role)
+    for word in words:
+        documents = documents.filter(Q(title__icontains=word) | Q(body__icontains=word))
+    return [
+        {'kind': kind, 'id': object_id, 'title': title, 'rank': 0.0}
+        for kind, object_id, title in documents.order_by('title').values_list('kind', 'object_id', 'title')[:limit]
+    ]
+
+
+def search(query, user=None, kinds=None, roles=None, limit=20):
+    """
+    The best `limit` matches for `query` among the documents `user` may see
+    (everything when user is None), best first:
+
+        [{'kind', 'id', 'title', 'rank'}, ...]
+
+    `kinds` narrows the kinds searched. `roles` ('student', 'employee:hr')
+    narrows the users matched and, unless `kinds` is given, searches users
+    only.
+    """
+    words = terms(query)
+    wanted = kinds or (['user'] if roles else list(SOURCES))
+    visible = {kind: restricted for kind, restricted in visible_kinds(user).items() if kind in wanted}
+    if not words or not visible:
+        return []
+
+    connection = connections[router.db_for_read(SearchDocument)]
+    table = connection.ops.quote_name(SearchDocument._meta.db_table)
+    where, params = _filters(visible, roles)
+    if connection.vendor == 'sqlite' and _has_fts(connection):
+        sql = (
+            f"SELECT d.kind, d.object_id, d.title, -bm25({FTS_TABLE}, 10.0, 1.0) AS rank"
+            f" FROM {FTS_TABLE} JOIN {table} d ON d.id = {FTS_TABLE}.rowid"
+            f" WHERE {FTS_TABLE} MATCH %s AND {where} ORDER BY rank DESC LIMIT %s"
+        )
+        match = " ".join(f'"{word}"*' for word in words)
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT d.kind, d.object_id, d.title, ts_rank(d.vector, q) AS rank"
+            f" FROM {table} d, to_tsquery('simple', %s) q"
+            f" WHERE d.vector @@ q AND {where} ORDER BY rank DESC LIMIT %s"
+        )
+        match = " & ".join(f"{word}:*" for word in words)
+    else:
+        return _fallback(words, visible, roles, limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *params, limit])
+        return [
+            {'kind': kind, 'id': object_id, 'title': title, 'rank': rank}
+            for kind, object_id, title, rank in cursor.fetchall()
+        ]
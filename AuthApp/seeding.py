@@ -0,0 +1,296 @@
+"""
+Synthetic data at institute scale, for `manage.py seed_benchmark`.
+
+seed() writes `users` accounts across every role and sub-role and, in
+proportion to them (VOLUMES, rows per user), their notifications,
+activity and audit logs, trash entries, courses, enrollments with seats,
+and results. Volumes are skewed the way real ones are: a few users own
+most of the log rows, most notifications are read, and most enrollments
+are active or completed. The same `seed` gives the same data.
+
+Rows go in with plain executemany() on prepared column tuples, like
+search.rebuild_index(), in one transaction, so a failed run leaves
+nothing behind. Values are prepared for the database by their model
+fields, and fields a table does not vary are prepared once. No model
+signals run, so the dashboard rollups and the search index are rebuilt
+at the end.
+
+Seeded accounts have unusable passwords; load tests log in with
+sessions. Admins are staff superusers, so the admin site can be loaded too.
+"""
+import datetime
+import random
+import time
+import uuid
+import zlib
+
+from django.db import connections, router, transaction
+from django.db.models import AutoField
+from django.utils import timezone
+
+from .models import ActivityLog, AuditLog, Course, Enrollment, Notification, Result, SeatAssignment, Trash, User
+from .search import rebuild_index
+from .summaries import reconcile_all
+from .trash import BlobStore, _dumps
+
+# (role, sub_role, share of users)
+ROLE_MIX = [
+    ('student', None, 0.80),
+    ('candidate', None, 0.07),
+    ('employee', 'teacher', 0.05),
+    ('employee', 'faculty', 0.02),
+    ('employee', 'hr', 0.01),
+    ('employee', 'finance', 0.01),
+    ('employee', 'marketing', 0.01),
+    ('employee', 'it', 0.01),
+    ('employee', 'other', 0.015),
+    ('admin', None, 0.005),
+]
+
+# Rows per user (courses and enrollments: per teacher and per student).
+VOLUMES = {
+    'notifications': 50,
+    'activity_logs': 30,
+    'audit_logs': 5,
+    'trash': 2,
+    'courses_per_teacher': 3,
+    'enrollments_per_student': 4,
+}
+
+ENROLLMENT_MIX = [('active', 0.50), ('completed', 0.30), ('pending', 0.12), ('rejected', 0.04), ('cancelled', 0.04)]
+
+FIRST_NAMES = ['Amina', 'Rafi', 'Nusrat', 'Tanvir', 'Farhana', 'Arif', 'Sadia', 'Imran', 'Maya', 'Jamal', 'Priya', 'Omar']
+LAST_NAMES = ['Rahman', 'Hossain', 'Akter', 'Islam', 'Chowdhury', 'Ahmed', 'Begum', 'Khan', 'Das', 'Sarker']
+LOCATIONS = [('Dhaka', 'Bangladesh'), ('Chittagong', 'Bangladesh'), ('Sylhet', 'Bangladesh'), ('Kolkata', 'India'), ('London', 'UK')]
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'English', 'History', 'Economics', 'Accounting', 'Programming', 'Statistics']
+ACTIONS = ['Logged in', 'Viewed course', 'Updated profile', 'Downloaded result', 'Paid fees', 'Applied for leave', 'Searched']
+AUDIT_ACTIONS = [('Updated', 'User'), ('Approved', 'Enrollment'), ('Published', 'Result'), ('Created', 'Course'), ('Deleted', 'Notification')]
+MESSAGES = ['Your enrollment was approved.', 'Results have been published.', 'Fees are due this week.', 'New announcement posted.']
+
+# Field types whose values the database adapter cannot take as they are.
+ADAPTED_TYPES = ('UUIDField', 'DateTimeField', 'DateField', 'DecimalField', 'JSONField', 'BinaryField')
+
+
+class SeedError(ValueError):
+    pass
+
+
+class _Table:
+    """Collects rows of one model and writes them with executemany() every `batch_size` rows."""
+
+    def __init__(self, cursor, connection, model, columns, batch_size, **fixed):
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not (isinstance(field, AutoField) and field.attname not in columns)
+        ]
+        by_name = {field.attname: field for field in fields}
+        varying = [by_name[name] for name in columns]
+        constant = [field for field in fields if field.attname not in columns]
+        # Only types that need adapting go through their field.
+        self.prepare = [
+            (index, field.get_db_prep_save) for index, field in enumerate(varying)
+            if (field.target_field if field.is_relation else field).get_internal_type() in ADAPTED_TYPES
+        ]
+        self.fixed = tuple(
+            field.get_db_prep_save(fixed[field.attname] if field.attname in fixed else field.get_default(), connection)
+            for field in constant
+        )
+        quote = connection.ops.quote_name
+        names = [field.column for field in varying + constant]
+        self.sql = (
+            f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(name) for name in names)})"
+            f" VALUES ({', '.join(['%s'] * len(names))})"
+        )
+        self.cursor, self.connection, self.batch_size = cursor, connection, batch_size
+        self.rows = []
+        self.written = 0
+
+    def add(self, *values):
+        if self.prepare:
+            values = list(values)
+            for index, prepare in self.prepare:
+                values[index] = prepare(values[index], self.connection)
+        self.rows.append((*values, *self.fixed))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.cursor.executemany(self.sql, self.rows)
+            self.written += len(self.rows)
+            self.rows = []
+        return self.written
+
+
+class Seeder:
+    def __init__(self, users, seed=0, prefix='seed', batch_size=5000, days=365):
+        self.users = users
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.span = days * 86400
+        self.connection = connections[router.db_for_write(User)]
+        # table: (rows, seconds)
+        self.timings = {}
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def moment(self):
+        return self.now - datetime.timedelta(seconds=self.rng.random() * self.span)
+
+    def skewed(self, items):
+        # Cubing a uniform value puts most picks at the front of the list.
+        return items[int(len(items) * self.rng.random() ** 3)]
+
+    def table(self, cursor, model, columns, **fixed):
+        return _Table(cursor, self.connection, model, columns, self.batch_size, **fixed)
+
+    def timed(self, name, write, *args):
+        start = time.perf_counter()
+        rows = write(*args)
+        self.timings[name] = (rows, time.perf_counter() - start)
+        return rows
+
+    def run(self):
+        """Write everything in one transaction. Returns {table: (rows, seconds)}."""
+        if User.objects.filter(username__startswith=f"{self.prefix}-").exists():
+            raise SeedError(f"Users named {self.prefix}-* exist already; seed with another prefix.")
+        with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+            self.timed('users', self.write_users, cursor)
+            users = list(
+                User.objects.filter(username__startswith=f"{self.prefix}-").order_by('pk').values_list('pk', 'role', 'sub_role')
+            )
+            # Shuffled so that the busiest users are not all of one role.
+            everyone = [pk for pk, _, _ in users]
+            self.rng.shuffle(everyone)
+            students = [pk for pk, role, _ in users if role == 'student']
+            teachers = [pk for pk, role, sub_role in users if sub_role == 'teacher']
+            staff = [pk for pk, role, _ in users if role in ('admin', 'employee')]
+
+            self.timed('notifications', self.write_notifications, cursor, everyone)
+            self.timed('activity logs', self.write_activity, cursor, everyone)
+            self.timed('audit logs', self.write_audit, cursor, staff or everyone)
+            self.timed('trash', self.write_trash, cursor, everyone, staff)
+            courses = self.timed('courses', self.write_courses, cursor, teachers)
+            if courses:
+                course_ids = list(Course.objects.filter(code__startswith=f"{self.prefix}-").values_list('pk', flat=True))
+                self.timed('enrollments, seats, results', self.write_enrollments, cursor, students, course_ids)
+            self.timed('rollups and search index', self.rebuild)
+        return self.timings
+
+    def write_users(self, cursor):
+        table = self.table(
+            cursor, User,
+            ['username', 'first_name', 'last_name', 'email', 'role', 'sub_role', 'is_staff', 'is_superuser',
+             'is_active', 'date_joined', 'location', 'country'],
+            password='!',
+        )
+        rng, number = self.rng, 0
+        for role, sub_role, share in ROLE_MIX:
+            for _ in range(max(round(self.users * share), 1)):
+                username = f"{self.prefix}-{sub_role or role}-{number}"
+                location, country = rng.choice(LOCATIONS)
+                admin = role == 'admin'
+                table.add(
+                    username, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"{username}@example.edu", role, sub_role,
+                    admin, admin, rng.random() > 0.03, self.moment(), location, country,
+                )
+                number += 1
+        return table.flush()
+
+    def write_notifications(self, cursor, users):
+        table = self.table(cursor, Notification, ['id', 'user_id', 'message', 'is_read', 'created_at'])
+        for _ in range(len(users) * VOLUMES['notifications']):
+            table.add(self.uuid(), self.skewed(users), self.rng.choice(MESSAGES), self.rng.random() < 0.8, self.moment())
+        return table.flush()
+
+    def write_activity(self, cursor, users):
+        table = self.table(cursor, ActivityLog, ['user_id', 'action', 'timestamp', 'related_object_type', 'related_object_id'])
+        rng = self.rng
+        for _ in range(len(users) * VOLUMES['activity_logs']):
+            table.add(self.skewed(users), rng.choice(ACTIONS), self.moment(), 'Course', str(rng.randrange(10_000)))
+        return table.flush()
+
+    def write_audit(self, cursor, staff):
+        table = self.table(cursor, AuditLog, ['id', 'user_id', 'action', 'model_name', 'object_id', 'created_at'])
+        rng = self.rng
+        for _ in range(self.users * VOLUMES['audit_logs']):
+            action, model_name = rng.choice(AUDIT_ACTIONS)
+            table.add(self.uuid(), self.skewed(staff), action, model_name, str(rng.randrange(100_000)), self.moment())
+        return table.flush()
+
+    def write_trash(self, cursor, users, staff):
+        # Deleted notifications, in batches of a few dozen, as trash_queryset() stores them.
+        blobs = BlobStore()
+        columns = [field.attname for field in Notification._meta.concrete_fields]
+        columns_digest = blobs.put(columns)
+        blobs.save()
+        table = self.table(
+            cursor, Trash, ['id', 'model_name', 'object_id', 'batch', 'columns_id', 'payload', 'deleted_by_id', 'deleted_at'],
+        )
+        rng, batch, deleted_by, deleted_at = self.rng, None, None, None
+        for number in range(self.users * VOLUMES['trash']):
+            if number % 40 == 0:
+                batch, deleted_by, deleted_at = self.uuid(), rng.choice(staff) if staff else None, self.moment()
+            pk = self.uuid()
+            values = {
+                'id': str(pk), 'user_id': self.skewed(users), 'message': rng.choice(MESSAGES),
+                'action_link': None, 'is_read': True, 'created_at': deleted_at.isoformat(),
+            }
+            payload = zlib.compress(_dumps([values.get(column) for column in columns]))
+            table.add(self.uuid(), Notification._meta.label, str(pk), batch, columns_digest, payload, deleted_by, deleted_at)
+        return table.flush()
+
+    def write_courses(self, cursor, teachers):
+        table = self.table(cursor, Course, ['id', 'name', 'code', 'teacher_id', 'created_at', 'total_seats'])
+        rng, number = self.rng, 0
+        for teacher in teachers:
+            for _ in range(VOLUMES['courses_per_teacher']):
+                # Seats are set when the enrollments are known.
+                table.add(self.uuid(), f"{rng.choice(SUBJECTS)} {100 + number % 400}", f"{self.prefix}-{number}", teacher, self.moment(), 0)
+                number += 1
+        return table.flush()
+
+    def write_enrollments(self, cursor, students, course_ids):
+        enrollments = self.table(cursor, Enrollment, ['id', 'student_id', 'course_id', 'status', 'applied_at', 'enrolled_at'])
+        seats = self.table(cursor, SeatAssignment, ['id', 'course_id', 'student_id', 'enrollment_id', 'seat_number', 'assigned_at'])
+        results = self.table(cursor, Result, ['id', 'student_id', 'course_id', 'marks_obtained', 'total_marks'])
+        rng = self.rng
+        statuses = [status for status, _ in ENROLLMENT_MIX]
+        weights = [share for _, share in ENROLLMENT_MIX]
+        per_student = min(VOLUMES['enrollments_per_student'], len(course_ids))
+        filled = dict.fromkeys(course_ids, 0)
+        waiting = dict.fromkeys(course_ids, 0)
+        for student in students:
+            for course, status in zip(rng.sample(course_ids, per_student), rng.choices(statuses, weights, k=per_student)):
+                pk, applied_at = self.uuid(), self.moment()
+                enrolled_at = applied_at + datetime.timedelta(days=rng.randint(1, 14)) if status in ('active', 'completed') else None
+                enrollments.add(pk, student, course, status, applied_at, enrolled_at)
+                if status == 'active':
+                    filled[course] += 1
+                    seats.add(self.uuid(), course, student, pk, filled[course], enrolled_at)
+                elif status == 'pending':
+                    waiting[course] += 1
+                elif status == 'completed':
+                    results.add(self.uuid(), student, course, rng.randint(20, 100), 100)
+        written = enrollments.flush() + seats.flush() + results.flush()
+        # Full courses keep their waitlist; the rest have a few seats to spare.
+        Course.objects.bulk_update(
+            [
+                Course(pk=course, seats_filled=count, last_seat_number=count, total_seats=count + (0 if waiting[course] else rng.randint(1, 10)))
+                for course, count in filled.items()
+            ],
+            ['seats_filled', 'last_seat_number', 'total_seats'], batch_size=500,
+        )
+        return written
+
+    def rebuild(self):
+        reconcile_all()
+        return sum(rebuild_index().values())
+
+
+def seed(users, seed=0, prefix='seed', batch_size=5000):
+    """Write a synthetic institute of `users` accounts and their data. Returns {table: (rows, seconds)}."""
+    return Seeder(users, seed=seed, prefix=prefix, batch_size=batch_size).run()
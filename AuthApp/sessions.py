@@ -0,0 +1,175 @@
+"""
+The session and authentication fast path.
+
+With a shared cache configured (see SESSION_CACHE_URL), sessions use
+Django's cached_db engine: every write goes to the database and the
+cache, and reads come from the cache, falling back to the database, so a
+signed-in request no longer starts with a session query.
+
+CachedAuthenticationMiddleware then finds request.user without loading
+the wide users row. A slim projection of the user (SLIM_FIELDS plus the
+session auth hash, instead of the password) is cached per user in
+USER_CACHE for USER_CACHE_TIMEOUT seconds. request.user is a User built
+from it, with every other field deferred: reading one, such as bio,
+loads it with a query, and save() writes only the fields that were set.
+The projection is dropped whenever a user is saved or deleted (see
+signals), and again once the transaction commits, so a request reading
+the old row meanwhile cannot leave it cached. Without USER_CACHE the
+middleware finds the user exactly as Django's does.
+
+The fast path is taken only when the session names one of
+AUTHENTICATION_BACKENDS (all ModelBackends here), the user is active, and
+the session's hash matches the cached one. Anything else (an old secret
+key, a changed password, a deactivated or deleted user) goes through
+django.contrib.auth.get_user(), which rotates or flushes the session as
+usual.
+
+Both caches must be shared by every process: on a per-process cache a
+logout, password change or deactivation in one process would go unseen
+by the others until their copies expired. check_session_cache() rejects
+LocMemCache for either. Users changed with queryset.update() send no
+signals and keep their projection until it expires.
+
+sweep_expired() deletes expired sessions in batches of
+SESSION_SWEEP_BATCH_SIZE, each in its own short transaction; run_jobs
+runs it every SESSION_SWEEP_INTERVAL seconds.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.sessions.models import Session
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+from .models import User
+
+# Every request's user checks: authentication, roles, the admin's is_staff
+# and is_superuser, and the name in page headers.
+SLIM_FIELDS = ['id', 'username', 'first_name', 'role', 'sub_role', 'is_active', 'is_temporary', 'is_staff', 'is_superuser']
+
+# Session engines that read sessions from SESSION_CACHE_ALIAS.
+SHARED_CACHE_ENGINES = {'django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db'}
+
+# In model order, as Model.from_db() takes them.
+_COLUMNS = [field.attname for field in User._meta.concrete_fields if field.attname in SLIM_FIELDS]
+
+
+def _cache():
+    alias = settings.USER_CACHE
+    return caches[alias] if alias else None
+
+
+def _user_key(user_id):
+    return f"user:{user_id}"
+
+
+# The cached user
+
+def user_projection(user_id):
+    """(the user's SLIM_FIELDS values, session auth hash), cached; None if there is no such user."""
+    cache = _cache()
+    key = _user_key(user_id)
+    projection = cache.get(key) if cache else None
+    if projection is None:
+        row = User.objects.filter(pk=user_id).values_list(*_COLUMNS, 'password').first()
+        if row is None:
+            return None
+        *values, password = row
+        projection = (tuple(values), User(password=password).get_session_auth_hash())
+        if cache:
+            cache.set(key, projection, settings.USER_CACHE_TIMEOUT)
+    return projection
+
+
+def invalidate_users(*user_ids):
+    cache = _cache()
+    if cache:
+        cache.delete_many([_user_key(user_id) for user_id in user_ids])
+
+
+def forget_user(user_id):
+    """Drop a user's projection now and again when the current transaction commits."""
+    invalidate_users(user_id)
+    transaction.on_commit(lambda: invalidate_users(user_id))
+
+
+def slim_user(values):
+    """A User with SLIM_FIELDS set and every other field deferred."""
+    return User.from_db(router.db_for_read(User), _COLUMNS, values)
+
+
+def get_user(request):
+    """request.user from the cached projection when the session allows it, else as Django finds it."""
+    if _cache() is None:
+        return auth.get_user(request)
+    session = request.session
+    try:
+        user_id = User._meta.pk.to_python(session[auth.SESSION_KEY])
+        backend_path = session[auth.BACKEND_SESSION_KEY]
+        session_hash = session[auth.HASH_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+    if backend_path in settings.AUTHENTICATION_BACKENDS:
+        projection = user_projection(user_id)
+        if projection is not None:
+            values, auth_hash = projection
+            user = slim_user(values)
+            if user.is_active and constant_time_compare(session_hash, auth_hash):
+                return user
+    return auth.get_user(request)
+
+
+def request_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+async def arequest_user(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_user)(request)
+    return request._acached_user
+
+
+# Configuration
+
+@checks.register(checks.Tags.caches, checks.Tags.security)
+def check_session_cache(app_configs, **kwargs):
+    """Reject a per-process cache behind cached sessions or the cached user."""
+    aliases = {}
+    if settings.SESSION_ENGINE in SHARED_CACHE_ENGINES:
+        aliases['SESSION_CACHE_ALIAS'] = settings.SESSION_CACHE_ALIAS
+    if settings.USER_CACHE:
+        aliases['USER_CACHE'] = settings.USER_CACHE
+    errors = []
+    for name, alias in aliases.items():
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend and issubclass(import_string(backend), LocMemCache):
+            errors.append(checks.Error(
+                f"{name} uses the per-process cache {alias!r}.",
+                hint="Point it at a cache every process shares (Redis, Memcached or the database cache), "
+                     "or use database sessions and unset USER_CACHE.",
+                id='AuthApp.E001',
+            ))
+    return errors
+
+
+# Expired sessions
+
+def sweep_expired(batch_size=None):
+    """Delete expired sessions, `batch_size` (SESSION_SWEEP_BATCH_SIZE) at a time. Returns how many."""
+    batch_size = batch_size or settings.SESSION_SWEEP_BATCH_SIZE
+    now = timezone.now()
+    deleted = 0
+    while True:
+        # expire_date is indexed, so each batch is a range scan.
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        with transaction.atomic(using=router.db_for_write(Session)):
+            deleted += Session.objects.filter(pk__in=keys).delete()[0]
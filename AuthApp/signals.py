@@ -0,0 +1,186 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .history import track
+from .models import Course, Enrollment, JobPost, Notification, Result, User
+from .notifications import adjust_unread, delivered
+from .permissions import invalidate_permissions
+from .search import index_objects, indexes, unindex_object
+from .sessions import forget_user
+from .summaries import course_created, course_saved, enrollments_changed, users_changed
+
+
+# Unread counters; see AuthApp.notifications. post_init remembers whom a
+# notification was unread for, so a save that flips is_read or moves it to
+# another user, as the admin can, moves the counts with it.
+
+def _unread_for(instance):
+    """The user the notification is unread for, None once read, DEFERRED if either field was not loaded."""
+    state = instance.__dict__
+    if 'is_read' not in state or 'user_id' not in state:
+        return DEFERRED
+    return None if state['is_read'] else state['user_id']
+
+
+@receiver(post_init, sender=Notification)
+def remember_unread(sender, instance, **kwargs):
+    instance.__dict__['_unread_for'] = _unread_for(instance)
+
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created, **kwargs):
+    before, after = instance.__dict__.get('_unread_for', DEFERRED), _unread_for(instance)
+    instance.__dict__['_unread_for'] = after
+    if created:
+        if after is not None:
+            transaction.on_commit(lambda: delivered([instance]))
+    elif DEFERRED not in (before, after) and before != after:
+        def move():
+            if before is not None:
+                adjust_unread([before], -1)
+            if after is not None:
+                adjust_unread([after], 1)
+        transaction.on_commit(move)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        transaction.on_commit(lambda: adjust_unread([instance.user_id], -1))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_permissions(sender, instance, **kwargs):
+    # Covers role and sub_role changes as well as is_superuser/is_active.
+    invalidate_permissions(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Any save may change the password hash or a projected field.
+    forget_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_changed_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_permissions(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear() / permission.user_set.clear(): pk_set is None.
+        related = instance.user_set.values_list('pk', flat=True)
+        invalidate_permissions(*related)
+    else:
+        invalidate_permissions(*pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_group_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        groups = [instance.pk]
+    elif action == 'pre_clear':
+        groups = list(instance.group_set.values_list('pk', flat=True))
+    else:
+        groups = pk_set
+    invalidate_permissions(*User.objects.filter(groups__in=groups).values_list('pk', flat=True).distinct())
+
+
+# Dashboard rollups; see AuthApp.summaries.
+
+def _saving(instance, update_fields, fields):
+    """Whether a save of an existing row may change any of `fields`."""
+    return not instance._state.adding and (update_fields is None or not fields.isdisjoint(update_fields))
+
+
+@receiver(pre_save, sender=User)
+def remember_user_role(sender, instance, update_fields=None, **kwargs):
+    # Logins save only last_login and skip this query.
+    if _saving(instance, update_fields, {'role', 'sub_role', 'is_active'}):
+        instance._summary_before = User.objects.filter(pk=instance.pk).values_list('role', 'sub_role', 'is_active').first()
+
+
+@receiver(post_save, sender=User)
+def count_saved_user(sender, instance, created, **kwargs):
+    before = None if created else instance.__dict__.pop('_summary_before', None)
+    if not created and before is None:
+        return
+    changes = {}
+    if before:
+        role, sub_role, is_active = before
+        changes[role, sub_role or ''] = (-1, -is_active)
+    key = instance.role, instance.sub_role or ''
+    users, active = changes.get(key, (0, 0))
+    changes[key] = (users + 1, active + instance.is_active)
+    users_changed(changes)
+
+
+@receiver(post_delete, sender=User)
+def uncount_deleted_user(sender, instance, **kwargs):
+    users_changed({(instance.role, instance.sub_role or ''): (-1, -instance.is_active)})
+
+
+@receiver(post_save, sender=Course)
+def count_saved_course(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        course_created(instance)
+    elif update_fields is None or 'total_seats' in update_fields:
+        course_saved(instance)
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_enrollment_status(sender, instance, update_fields=None, **kwargs):
+    if _saving(instance, update_fields, {'status', 'course'}):
+        instance._summary_before = Enrollment.objects.filter(pk=instance.pk).values_list('course_id', 'status').first()
+
+
+@receiver(post_save, sender=Enrollment)
+def count_saved_enrollment(sender, instance, created, **kwargs):
+    before = None if created else instance.__dict__.pop('_summary_before', None)
+    if not created and before is None:
+        return
+    if before:
+        course_id, status = before
+        if (course_id, status) == (instance.course_id, instance.status):
+            return
+        enrollments_changed(course_id, **{status: -1})
+    enrollments_changed(instance.course_id, **{instance.status: 1})
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_deleted_enrollment(sender, instance, **kwargs):
+    enrollments_changed(instance.course_id, **{instance.status: -1})
+
+
+# Edit history; see AuthApp.history. Logins, password changes and the
+# seat counters, which only move through AuthApp.enrollments, are left out.
+
+track(User, exclude=['password', 'last_login', 'image_variants'])
+track(Course, exclude=['seats_filled', 'last_seat_number'])
+track(Enrollment)
+track(Result)
+
+
+# Search documents; see AuthApp.search. Written in the saving transaction.
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=JobPost)
+def index_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw and indexes(instance, update_fields):
+        index_objects([instance])
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=JobPost)
+def unindex_deleted(sender, instance, **kwargs):
+    unindex_object(instance)
@@ -0,0 +1,287 @@
+"""
+Startup profiling for `manage.py profile_startup`.
+
+A worker's cold start is measured in a fresh interpreter, since the process
+running the command has imported everything already. run_probe() starts
+`python -X importtime` running probe(), which goes through what a WSGI or
+ASGI worker does before and while serving its first request, timing each
+phase:
+
+    interpreter     from spawning the process to probe() running
+    settings        importing Django and the settings module
+    apps            django.setup(): logging, INSTALLED_APPS, models, ready()
+    handler         importing the WSGI (or ASGI) application, middleware
+    urls            resolving the request path: the URLconf and views
+    first_request   the first request through the application
+    second_request  the same request again, for comparison
+
+The probe prints a marker on stderr as each phase starts, so each line of
+Python's import log is attributed to the phase that imported the module.
+Django loads apps and models with importlib.import_module(), which the
+import log does not see, so the probe sends those imports through
+__import__; otherwise their cost is charged to whichever module is logged
+next. Timings include the import log's own overhead, a few percent.
+
+gc_paused() is used by the WSGI and ASGI entry points while they load the
+apps.
+
+This module imports only what the interpreter has loaded already at
+module level, so importing it in the probe, or in an entry point before
+Django, does not change what is measured.
+"""
+import gc
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PHASES = ['interpreter', 'settings', 'apps', 'handler', 'urls', 'first_request', 'second_request']
+
+# Phases a worker goes through before it can serve.
+STARTUP_PHASES = PHASES[:5]
+
+MARKER = "@@startup-phase "
+RESULT = "@@startup-result "
+
+
+class StartupError(RuntimeError):
+    pass
+
+
+@contextmanager
+def gc_paused():
+    """
+    With STARTUP_FREEZE_GC, pause the cyclic garbage collector while a worker
+    loads its apps, since it would rescan the many long-lived objects as they
+    are made, then freeze them out of later collections. The collector is
+    re-enabled however loading ends.
+    """
+    from django.conf import settings
+
+    if not settings.STARTUP_FREEZE_GC or not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+        gc.freeze()
+    finally:
+        gc.enable()
+
+
+# The child process
+
+def _trace_import_module():
+    import importlib
+    import importlib.util
+
+    def import_module(name, package=None):
+        absolute = importlib.util.resolve_name(name, package) if name.startswith('.') else name
+        __import__(absolute)
+        return sys.modules[absolute]
+
+    importlib.import_module = import_module
+
+
+def _wsgi_request(application, path):
+    from wsgiref.util import setup_testing_defaults
+
+    environ = {'PATH_INFO': path, 'SERVER_NAME': 'localhost', 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    status = []
+    response = application(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return status[0]
+
+
+def _asgi_request(application, path):
+    import asyncio
+
+    async def request():
+        status = []
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.Event().wait()
+            sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await application({
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }, receive, send)
+        return status[0]
+
+    return asyncio.run(request())
+
+
+def probe(path, handler='wsgi', spawned_at=None):
+    """Start up as a worker and serve `path` twice, reporting each phase on stdout. Run in a fresh interpreter."""
+    started = time.time()
+    _trace_import_module()
+    timings = {'interpreter': started - spawned_at if spawned_at else 0.0}
+    phase, clock = None, None
+
+    def begin(name):
+        nonlocal phase, clock
+        if phase is not None:
+            timings[phase] = time.perf_counter() - clock
+        sys.stderr.write(f"{MARKER}{name}\n")
+        sys.stderr.flush()
+        phase, clock = name, time.perf_counter()
+
+    begin('settings')
+    import django
+    from django.conf import settings
+    settings.INSTALLED_APPS
+
+    begin('apps')
+    # As the entry points load them.
+    with gc_paused():
+        django.setup(set_prefix=False)
+
+    begin('handler')
+    from django.utils.module_loading import import_string
+    if handler == 'asgi':
+        application, serve = import_string(settings.ASGI_APPLICATION), _asgi_request
+    else:
+        application, serve = import_string(settings.WSGI_APPLICATION), _wsgi_request
+
+    begin('urls')
+    from django.urls import Resolver404, get_resolver
+    try:
+        get_resolver().resolve(path)
+    except Resolver404:
+        pass
+    ready = sorted(sys.modules)
+
+    begin('first_request')
+    status = serve(application, path)
+
+    begin('second_request')
+    serve(application, path)
+    begin(None)
+
+    import json
+    sys.stdout.write(RESULT + json.dumps({
+        'phases': {name: seconds * 1000 for name, seconds in timings.items()},
+        'status': status,
+        'ready_modules': ready,
+        'modules': sorted(sys.modules),
+    }) + "\n")
+    sys.stdout.flush()
+
+
+# The parent process
+
+class Import:
+    __slots__ = ('phase', 'module', 'self_us', 'cumulative_us', 'depth')
+
+    def __init__(self, phase, module, self_us, cumulative_us, depth):
+        self.phase, self.module, self.self_us, self.cumulative_us, self.depth = (
+            phase, module, self_us, cumulative_us, depth
+        )
+
+
+def parse_importtime(lines):
+    """The Imports in `-X importtime` output, each with the phase whose marker preceded it."""
+    imports, phase = [], 'interpreter'
+    for line in lines:
+        if line.startswith(MARKER):
+            phase = line[len(MARKER):].strip()
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        imports.append(Import(phase, module, int(self_us), int(cumulative_us), (len(name) - len(name.lstrip()) - 1) // 2))
+    return imports
+
+
+def package_of(module):
+    """What an import is charged to: 'stdlib', a project app, or a third-party package (django.contrib.* apps apart)."""
+    top = module.split('.')[0]
+    if top in sys.stdlib_module_names or top.startswith('_'):
+        return 'stdlib'
+    if module.startswith('django.contrib.'):
+        return '.'.join(module.split('.')[:3])
+    return top
+
+
+class StartupProfile:
+    """One probe: phase timings in ms, the imports made, and the modules loaded."""
+
+    def __init__(self, phases, imports, status, ready_modules, modules):
+        self.phases = phases
+        self.imports = imports
+        self.status = status
+        self.ready_modules = set(ready_modules)
+        self.modules = set(modules)
+
+    @property
+    def startup_ms(self):
+        """Time until the worker could serve: every phase before the first request."""
+        return sum(self.phases.get(phase, 0.0) for phase in STARTUP_PHASES)
+
+    def import_ms(self, phase):
+        return sum(record.self_us for record in self.imports if record.phase == phase) / 1000
+
+    def slowest_imports(self, count):
+        return sorted(self.imports, key=lambda record: record.self_us, reverse=True)[:count]
+
+    def by_package(self):
+        """{package: import ms}, slowest first."""
+        totals = {}
+        for record in self.imports:
+            package = package_of(record.module)
+            totals[package] = totals.get(package, 0) + record.self_us / 1000
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def run_probe(path='/admin/login/', handler='wsgi', settings_module=None, cwd=None):
+    """Profile one cold start in a fresh interpreter. Returns a StartupProfile."""
+    import json
+    import subprocess
+
+    from django.conf import settings
+
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = settings_module or os.environ.get('DJANGO_SETTINGS_MODULE', 'instracore.settings')
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    spawned_at = time.time()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         f"from AuthApp.startup import probe; probe({path!r}, {handler!r}, {spawned_at!r})"],
+        cwd=cwd or settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    results = [line for line in completed.stdout.splitlines() if line.startswith(RESULT)]
+    if completed.returncode or not results:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith(("import time:", MARKER))]
+        raise StartupError("The startup probe failed:\n" + "\n".join(errors[-20:]))
+    result = json.loads(results[-1][len(RESULT):])
+    return StartupProfile(
+        result['phases'], parse_importtime(completed.stderr.splitlines()), result['status'],
+        result['ready_modules'], result['modules'],
+    )
+
+
+def median_phases(profiles):
+    """{phase: median ms} over several probes."""
+    import statistics
+
+    return {
+        phase: statistics.median(profile.phases.get(phase, 0.0) for profile in profiles)
+        for phase in PHASES
+    }
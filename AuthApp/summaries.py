@@ -0,0 +1,249 @@
+"""
+Dashboard rollups.
+
+The admin dashboard shows how many students, teachers, staff, courses and
+enrollments there are. Counting those live means a dozen aggregates over
+the largest tables on every page load; instead they are kept in two small
+tables, RoleSummary (users per role and sub_role) and CourseSummary
+(enrollments per status for each course), and dashboard_summary() reads
+both in one query.
+
+The rollups are kept current incrementally. Model signals, and the
+services that write with queryset.update() or bulk_create() (enrollments,
+bulk user import), record +/- deltas that are applied with F() updates once
+the change commits, as the unread counters are. A full recount by the
+reconcile_summaries job corrects anything that bypassed them: other bulk
+writes, raw SQL, or a process that died between commit and bookkeeping.
+
+Staleness bound: changes made through the ORM or those services show up as
+soon as they commit; anything else shows up within
+SUMMARY_RECONCILE_INTERVAL seconds (plus the run_jobs tick). A change that
+commits while a reconciliation is running can be missed until the next one.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Min, Q, Sum, Value
+from django.utils import timezone
+
+from .models import Course, CourseSummary, Enrollment, RoleSummary, User
+
+ENROLLMENT_STATUSES = [status for status, _ in Enrollment.STATUS_CHOICES]
+
+
+def _users_with_role(role, sub_role):
+    users = User.objects.filter(role=role)
+    if sub_role:
+        return users.filter(sub_role=sub_role)
+    return users.filter(Q(sub_role__isnull=True) | Q(sub_role=''))
+
+
+# Users
+
+def users_changed(changes):
+    """
+    Apply {(role, sub_role): (users, active_users)} deltas to RoleSummary
+    once the current transaction commits.
+    """
+    changes = {key: delta for key, delta in changes.items() if any(delta)}
+    if changes:
+        transaction.on_commit(lambda: _adjust_roles(changes))
+
+
+def users_added(users):
+    """Count users created without signals, e.g. by bulk_create()."""
+    changes = {}
+    for user in users:
+        key = user.role, user.sub_role or ''
+        total, active = changes.get(key, (0, 0))
+        changes[key] = total + 1, active + user.is_active
+    users_changed(changes)
+
+
+def _adjust_roles(changes):
+    for (role, sub_role), (users, active_users) in changes.items():
+        updated = RoleSummary.objects.filter(role=role, sub_role=sub_role).update(
+            users=F('users') + users, active_users=F('active_users') + active_users,
+        )
+        if not updated:
+            # Rows exist for every role in User.ROLE_CHOICES (see role_keys()),
+            # so this is a role outside them. The recount runs after commit
+            # and already includes the change.
+            _recount_role(role, sub_role)
+
+
+def _recount_role(role, sub_role):
+    counts = _users_with_role(role, sub_role).aggregate(
+        users=Count('pk'), active_users=Count('pk', filter=Q(is_active=True)),
+    )
+    RoleSummary.objects.bulk_create(
+        [RoleSummary(role=role, sub_role=sub_role, **counts)],
+        update_conflicts=True, unique_fields=['role', 'sub_role'], update_fields=['users', 'active_users'],
+    )
+
+
+def role_keys():
+    """Every (role, sub_role) pair a RoleSummary row exists for."""
+    sub_roles = ['', *(sub_role for sub_role, _ in User.SUBROLE_CHOICES)]
+    return [(role, sub_role) for role, _ in User.ROLE_CHOICES for sub_role in sub_roles]
+
+
+def reconcile_roles():
+    """Recount every RoleSummary row from the user table. Returns the number of rows."""
+    now = timezone.now()
+    counts = {key: [0, 0] for key in role_keys()}
+    # Answered from user_role_idx alone.
+    for role, sub_role, users, active_users in User.objects.order_by().values_list('role', 'sub_role').annotate(
+        users=Count('pk'), active_users=Count('pk', filter=Q(is_active=True)),
+    ).values_list('role', 'sub_role', 'users', 'active_users'):
+        # NULL and blank sub_roles share a row.
+        count = counts.setdefault((role, sub_role or ''), [0, 0])
+        count[0] += users
+        count[1] += active_users
+    RoleSummary.objects.bulk_create(
+        [
+            RoleSummary(role=role, sub_role=sub_role, users=users, active_users=active_users, reconciled_at=now)
+            for (role, sub_role), (users, active_users) in counts.items()
+        ],
+        update_conflicts=True, unique_fields=['role', 'sub_role'],
+        update_fields=['users', 'active_users', 'reconciled_at'],
+    )
+    return len(counts)
+
+
+# Courses
+
+def enrollments_changed(course_id, **deltas):
+    """Apply {status: delta} to the course's CourseSummary once the current transaction commits."""
+    deltas = {status: delta for status, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _adjust_course(course_id, deltas))
+
+
+def _adjust_course(course_id, deltas):
+    updated = CourseSummary.objects.filter(course_id=course_id).update(
+        **{status: F(status) + delta for status, delta in deltas.items()}
+    )
+    if not updated:
+        # A course created without signals, e.g. by bulk_create().
+        reconcile_courses([course_id])
+
+
+def reconcile_courses(course_ids=None, batch_size=500):
+    """
+    Recount CourseSummary rows from the enrollment table, for every course
+    or just `course_ids`. Returns the number of rows written.
+    """
+    now = timezone.now()
+    courses = Course.objects.order_by('pk')
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    counts = courses.annotate(**{
+        status: Count('enrollments', filter=Q(enrollments__status=status)) for status in ENROLLMENT_STATUSES
+    }).values_list('pk', 'total_seats', *ENROLLMENT_STATUSES)
+
+    written = 0
+    batch = []
+    for pk, seats, *statuses in counts.iterator(chunk_size=batch_size):
+        batch.append(CourseSummary(course_id=pk, seats=seats, reconciled_at=now, **dict(zip(ENROLLMENT_STATUSES, statuses))))
+        if len(batch) >= batch_size:
+            written += _write_courses(batch)
+            batch = []
+    if batch:
+        written += _write_courses(batch)
+    return written
+
+
+def _write_courses(summaries):
+    CourseSummary.objects.bulk_create(
+        summaries, update_conflicts=True, unique_fields=['course'],
+        update_fields=['seats', *ENROLLMENT_STATUSES, 'reconciled_at'],
+    )
+    return len(summaries)
+
+
+def course_created(course):
+    # In the creating transaction, so deltas for its enrollments always find the row.
+    CourseSummary.objects.create(course=course, seats=course.total_seats)
+
+
+def course_saved(course):
+    course_id, seats = course.pk, course.total_seats
+
+    def record():
+        if not CourseSummary.objects.filter(course_id=course_id).update(seats=seats):
+            reconcile_courses([course_id])
+
+    transaction.on_commit(record)
+
+
+def reconcile_all():
+    """Recount both rollups. Returns {'roles': rows, 'courses': rows}."""
+    return {'roles': reconcile_roles(), 'courses': reconcile_courses()}
+
+
+# Reading
+
+COURSE_TOTALS = ['courses', 'seats', *ENROLLMENT_STATUSES]
+
+
+def _summary_rows():
+    """
+    Role rows and one course-totals row as a single UNION ALL. Each row
+    fills its own columns and zeroes the others; the totals row has a
+    blank role.
+    """
+    zero = Value(0, output_field=IntegerField())
+    roles = RoleSummary.objects.values_list(
+        'role', 'sub_role', 'users', 'active_users', *[zero] * len(COURSE_TOTALS), 'reconciled_at',
+    )
+    courses = CourseSummary.objects.values(role=Value(''), sub_role=Value('')).annotate(
+        users=zero, active_users=zero,
+        courses=Count('pk'), total_seats=Sum('seats'),
+        **{f"total_{status}": Sum(status) for status in ENROLLMENT_STATUSES},
+        oldest=Min('reconciled_at'),
+    ).values_list(
+        'role', 'sub_role', 'users', 'active_users', 'courses', 'total_seats',
+        *[f"total_{status}" for status in ENROLLMENT_STATUSES], 'oldest',
+    )
+    return roles.union(courses, all=True)
+
+
+def dashboard_summary():
+    """
+    Counts for the admin dashboard, read from the rollups in one query:
+
+        {'roles': [{'role', 'sub_role', 'users', 'active_users'}, ...],
+         'totals': {'students', 'teachers', 'staff', 'courses', 'seats',
+                    'enrollments': {status: count}},
+         'reconciled_at': oldest reconciliation or None,
+         'max_staleness': SUMMARY_RECONCILE_INTERVAL}
+
+    Roles nobody holds are left out. Totals count active users; staff are
+    employees other than teachers.
+    """
+    roles, totals, reconciled = [], dict.fromkeys(COURSE_TOTALS, 0), []
+    for role, sub_role, users, active_users, *course_totals, reconciled_at in _summary_rows():
+        if role and users:
+            roles.append({'role': role, 'sub_role': sub_role, 'users': users, 'active_users': active_users})
+        elif not role:
+            totals = {name: value or 0 for name, value in zip(COURSE_TOTALS, course_totals)}
+        if reconciled_at:
+            reconciled.append(reconciled_at)
+
+    def active(**where):
+        return sum(row['active_users'] for row in roles if all(row[field] == value for field, value in where.items()))
+
+    teachers = active(role='employee', sub_role='teacher')
+    return {
+        'roles': sorted(roles, key=lambda row: (row['role'], row['sub_role'])),
+        'totals': {
+            'students': active(role='student'),
+            'teachers': teachers,
+            'staff': active(role='employee') - teachers,
+            'courses': totals['courses'],
+            'seats': totals['seats'],
+            'enrollments': {status: totals[status] for status in ENROLLMENT_STATUSES},
+        },
+        'reconciled_at': min(reconciled) if reconciled else None,
+        'max_staleness': settings.SUMMARY_RECONCILE_INTERVAL,
+    }
@@ -0,0 +1,22 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_image_url(user, size):
+    """
+    URL of the smallest thumbnail of `user` at least `size` pixels square,
+    falling back to the largest one and then to the uploaded image.
+
+        {% load profile_images %}
+        <img src="{% profile_image_url request.user 48 %}" width="48" height="48">
+    """
+    image = getattr(user, 'image', None)
+    if not image:
+        return ''
+    variants = sorted((int(key), path) for key, path in (user.image_variants or {}).items())
+    if not variants:
+        return image.url
+    path = next((path for key, path in variants if key >= int(size)), variants[-1][1])
+    return image.storage.url(path)
@@ -1,3 +1,1990 @@
-from django.test import TestCase
+import asyncio
+import gc
+import importlib.util
+import io
+import json
+import os
+import shutil
+import threading
+import tempfile
+import unittest
+import zipfile
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.views import View
+from PIL import Image
+
+from instracore.db import database_from_env
+
+from .keyset import NEXT, PREVIOUS, InvalidCursor, approximate_count, keyset_page, keyset_queryset
+from .bulk_users import csv_lines, export_rows, import_users, read_rows, write_xlsx
+from .activity import LogBuffer, close_buffer, log_activity, log_audit, recover_journals
+from .applications import ApplicationError, DuplicateApplication, already_applied, extract_pending
+from .applications import apply as apply_for_job
+from .approvals import approve, inbox, reject, request_approval
+from .benchmarks import run_benchmarks
+from .archive import archive_all, archive_model, read_archive
+from .trash import restore_batch, snapshot_data, sweep_blobs, trash_object, trash_queryset
+from .admin import NotificationAdmin
+from . import history
+from .history import acting_as
+from .middleware import EditHistoryMiddleware
+from .results import assign_grades, import_marks, ingest_marks, percentile_ranks, publish_results
+from .leave import (
+    LeaveConflict, LeaveError, approve_leave, cancel_leave, month_availability, on_leave, reconcile_availability,
+    reject_leave, request_leave,
+)
+from .loadtest import SCENARIOS, LoadTestError, compare, run_load
+from .seeding import ROLE_MIX, SeedError, seed
+from .sessions import check_session_cache, slim_user, sweep_expired, user_projection
+from .metrics import metrics, recording_queries, warn_duplicates
+from .ledger import LedgerError, balance_at, close_periods, post_entry, reverse_entry, statement
+from .enrollments import EnrollmentStateError, SeatUnavailable, approve_enrollment, approve_waitlist, cancel_enrollment
+from .models import (
+    ActivityLog, Approval, AuditLog, Course, CourseSummary, DailyAvailability, EditHistory, Enrollment, FinanceTransaction, LedgerPeriod, SeatAssignment,
+    JobApplication, JobPost, LeaveRequest, Notification, NotificationBatch, Parent, Result, RoleSummary, ResumeText, SearchDocument, StudentAccount,
+    Trash, TrashBlob, User,
+)
+from .pubsub import Broker, broker
+from .permissions import MATRIX, RoleRequiredMixin, role_permissions, role_required
+from .profile_images import build_missing_variants, set_profile_image, store_variants
+from .search import search
+from .startup import gc_paused, run_probe
+from .summaries import COURSE_TOTALS, dashboard_summary, reconcile_all
+from .notifications import (
+    audience, claim, deliver, delivered, mark_all_read, mark_read, notify_audience, process_pending,
+    rebuild_unread_counts, unread_count,
+)
+
+
+def make_user(username, role='student', **fields):
+    return User.objects.create(username=username, role=role, **fields)
+
+
+@override_settings(NOTIFICATION_FANOUT_ASYNC=False, NOTIFICATION_BATCH_SIZE=3)
+class NotificationFanOutTests(TestCase):
+    def setUp(self):
+        self.students = [make_user(f"student{i}") for i in range(7)]
+        self.inactive = make_user("gone", is_active=False)
+        self.hr = make_user("hr", role='employee', sub_role='hr')
+        self.finance = make_user("finance", role='employee', sub_role='finance')
+
+    def test_role_audience(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = notify_audience("Exams next week", role='student')
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'done')
+        self.assertEqual(batch.delivered, 7)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {user.pk for user in self.students},
+        )
+
+    def test_sub_role_audience(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_audience("Payroll closes Friday", role='employee', sub_role='finance')
+
+        self.assertEqual(list(Notification.objects.values_list('user_id', flat=True)), [self.finance.pk])
+
+    def test_nothing_written_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            batch = notify_audience("Holiday")
+
+        self.assertEqual(batch.status, 'pending')
+        self.assertFalse(Notification.objects.exists())
+
+    def test_resumes_after_last_user(self):
+        batch = NotificationBatch.objects.create(message="Resumed", role='student')
+        batch.last_user_id = self.students[3].pk
+        batch.delivered = 4
+        batch.save()
+
+        self.assertTrue(claim(batch.pk))
+        self.assertEqual(deliver(batch), 7)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_batch_claimed_once(self):
+        batch = NotificationBatch.objects.create(message="Once")
+        self.assertTrue(claim(batch.pk))
+        self.assertFalse(claim(batch.pk))
+        self.assertEqual(process_pending(), 0)
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmarks_run_back_to_back(self):
+        self.addCleanup(cache.clear)
+        out = io.StringIO()
+        run_benchmarks(['unread', 'admin_pages'], out, size=200)
+
+        self.assertIn("admin_pages (size 200)", out.getvalue())
+        # admin_pages seeded its own 1000 users over an empty database.
+        self.assertEqual(User.objects.count(), 1000)
+        self.assertEqual(Notification.objects.count(), 200)
+
+
+@override_settings(NOTIFICATION_FANOUT_ASYNC=False)
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user("reader")
+        self.other = make_user("other")
+
+    def notify(self, user, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [Notification.objects.create(user=user, message="Hi") for _ in range(count)]
+
+    def test_cold_read_counts_from_database(self):
+        self.notify(self.user, 2)
+        cache.clear()
+        self.assertEqual(unread_count(self.user), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 2)
+
+    def test_create_and_mark_read_adjust_counter(self):
+        self.assertEqual(unread_count(self.user), 0)
+        first, second = self.notify(self.user, 2)
+        self.assertEqual(unread_count(self.user), 2)
+
+        self.assertTrue(mark_read(first))
+        self.assertFalse(mark_read(first))
+        self.assertEqual(unread_count(self.user), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(unread_count(self.user), 0)
+
+    def test_saves_that_flip_is_read_or_move_user_adjust_counter(self):
+        self.notify(self.user, 2)
+        self.assertEqual((unread_count(self.user), unread_count(self.other)), (2, 0))
+
+        # As the admin's change form does: load, edit, save().
+        notification = Notification.objects.filter(user=self.user).first()
+        notification.is_read = True
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.save()
+        self.assertEqual(unread_count(self.user), 1)
+
+        notification = Notification.objects.get(user=self.user, is_read=False)
+        notification.user = self.other
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.save()
+        self.assertEqual((unread_count(self.user), unread_count(self.other)), (0, 1))
+
+        notification.is_read = True
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.save(update_fields=['is_read'])
+            notification.save(update_fields=['is_read'])
+        self.assertEqual(unread_count(self.other), 0)
+
+    def test_fan_out_adjusts_counter(self):
+        self.assertEqual(unread_count(self.user), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_audience("Announcement", role='student')
+        self.assertEqual(unread_count(self.user), 1)
+
+    def test_mark_all_read_is_one_update(self):
+        self.notify(self.user, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(mark_all_read(self.user), 3)
+        self.assertEqual(unread_count(self.user), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False, user=self.user).exists())
+
+    def test_rebuild_matches_database(self):
+        self.notify(self.user, 3)
+        self.notify(self.other, 1)
+        mark_read(Notification.objects.filter(user=self.user).first())
+        cache.clear()
+
+        counts = rebuild_unread_counts()
+        self.assertEqual(counts, {self.user.pk: 2, self.other.pk: 1})
+        for user in (self.user, self.other):
+            self.assertEqual(
+                unread_count(user), Notification.objects.filter(user=user, is_read=False).count()
+            )
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return "\n".join(row[-1] for row in cursor.fetchall())
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Asserts on SQLite query plans")
+class QueryPlanTests(TestCase):
+    """
+    The hot lookups must keep using their indexes. A failure here means an
+    index was dropped or a query changed shape so it no longer matches one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        roles = [('student', None), ('candidate', None), ('employee', 'hr'), ('employee', 'faculty')]
+        User.objects.bulk_create(
+            [
+                User(username=f"user{i}", password="!", role=roles[i % 4][0], sub_role=roles[i % 4][1], is_active=i % 10 != 0)
+                for i in range(400)
+            ]
+        )
+        users = list(User.objects.all())
+        now = timezone.now()
+        Notification.objects.bulk_create(
+            [Notification(user=users[i % 400], message="n", is_read=i % 3 == 0) for i in range(4000)]
+        )
+        ActivityLog.objects.bulk_create(
+            [ActivityLog(user=users[i % 400], action="view") for i in range(4000)]
+        )
+        AuditLog.objects.bulk_create(
+            [AuditLog(user=users[i % 400], action="update", model_name=f"Model{i % 20}", object_id=str(i)) for i in range(4000)]
+        )
+        NotificationBatch.objects.bulk_create(
+            [NotificationBatch(message="b", status='done', finished_at=now - timedelta(minutes=i)) for i in range(200)]
+        )
+        cls.user = users[1]
+        cls.course = Course.objects.create(name="Course", teacher=users[2], total_seats=100)
+        Enrollment.objects.bulk_create(
+            [Enrollment(student=users[i], course=cls.course, status='pending' if i % 4 else 'active') for i in range(400)]
+        )
+        FinanceTransaction.objects.bulk_create(
+            [
+                FinanceTransaction(transaction_type='fee', amount=1, student=users[i % 20], balance_after=i // 20,
+                                   created_at=now - timedelta(hours=i))
+                for i in range(4000)
+            ]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = query_plan(queryset)
+        self.assertIn(index, plan)
+        self.assertNotIn("USE TEMP B-TREE", plan)
+
+    def test_unread_inbox(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(user=self.user, is_read=False).order_by('-created_at'),
+            'notification_unread_idx',
+        )
+
+    def test_inbox(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(user=self.user).order_by('-created_at'),
+            'notification_inbox_idx',
+        )
+
+    def test_activity_timeline(self):
+        self.assertUsesIndex(
+            ActivityLog.objects.filter(user=self.user).order_by('-timestamp'),
+            'activitylog_user_idx',
+        )
+
+    def test_audit_trail_for_object(self):
+        self.assertUsesIndex(
+            AuditLog.objects.filter(model_name='Model3', object_id='3'),
+            'auditlog_object_idx',
+        )
+
+    def test_role_audience(self):
+        self.assertUsesIndex(audience('employee', 'hr'), 'user_role_idx')
+
+    def test_keyset_pages(self):
+        for model, fields, index in [
+            (Notification, ['created_at', 'id'], 'notification_created_idx'),
+            (AuditLog, ['created_at', 'id'], 'auditlog_created_idx'),
+            (ActivityLog, ['timestamp', 'id'], 'activitylog_timestamp_idx'),
+        ]:
+            middle = model.objects.order_by(*fields)[2000]
+            values = [getattr(middle, field) for field in fields]
+            for direction in (NEXT, PREVIOUS):
+                with self.subTest(model=model.__name__, direction=direction):
+                    self.assertUsesIndex(keyset_queryset(model.objects.all(), fields, direction, values), index)
+
+    def test_course_waitlist(self):
+        self.assertUsesIndex(
+            Enrollment.objects.filter(course=self.course, status='pending').order_by('applied_at', 'id'),
+            'enrollment_waitlist_idx',
+        )
+
+    def test_student_balance(self):
+        self.assertUsesIndex(
+            FinanceTransaction.objects.filter(student=self.user, created_at__lte=timezone.now(), balance_after__isnull=False)
+            .order_by('-created_at'),
+            'ledger_student_idx',
+        )
+
+    def test_pending_batch_queue(self):
+        self.assertUsesIndex(
+            NotificationBatch.objects.filter(status='pending').order_by('created_at'),
+            'notificationbatch_pending_idx',
+        )
+
+
+class ActivityLogBufferTests(TestCase):
+    def setUp(self):
+        self.user = make_user("actor")
+        self.journal_dir = tempfile.mkdtemp()
+        self.buffer = LogBuffer(size=3, interval=3600, journal_dir=self.journal_dir)
+        self.addCleanup(self.buffer.close)
+
+    def entry(self, action="view"):
+        return {
+            'model': 'activity', 'user_id': self.user.pk, 'action': action,
+            'related_object_type': '', 'related_object_id': '',
+            'timestamp': timezone.now().isoformat(),
+        }
+
+    def test_flushes_at_size_threshold(self):
+        self.buffer.add(self.entry())
+        self.buffer.add(self.entry())
+        self.assertFalse(ActivityLog.objects.exists())
+        self.buffer.add(self.entry())
+        self.assertEqual(ActivityLog.objects.count(), 3)
+        self.assertEqual(self.buffer.entries, [])
+
+    def test_journal_holds_unflushed_entries(self):
+        self.buffer.add(self.entry("first"))
+        journal = Path(self.journal_dir) / f"{os.getpid()}-{self.buffer.token}.jsonl"
+        self.assertEqual(json.loads(journal.read_text())['action'], "first")
+        self.buffer.flush()
+        self.assertEqual(journal.read_text(), "")
+        self.assertEqual(len(list(Path(self.journal_dir).iterdir())), 1)
+
+    def test_recovers_journal_of_dead_process(self):
+        dead = Path(self.journal_dir) / "999999999.jsonl"
+        dead.write_text(json.dumps(self.entry("orphaned")) + "\n" + '{"model": "activ')
+
+        self.assertEqual(recover_journals(self.journal_dir), 1)
+        self.assertEqual(ActivityLog.objects.get().action, "orphaned")
+        self.assertFalse(dead.exists())
+
+    def test_recovers_journal_of_earlier_process_with_our_pid(self):
+        stale = Path(self.journal_dir) / f"{os.getpid()}.jsonl"
+        stale.write_text(json.dumps(self.entry("before restart")) + "\n")
+        restarted = LogBuffer(size=3, interval=3600, journal_dir=self.journal_dir)
+        self.addCleanup(restarted.close)
+        restarted.add(self.entry("after restart"))
+        restarted.flush()
+        self.assertIn("before restart", stale.read_text())
+
+        self.buffer.add(self.entry("still buffered"))
+        self.assertEqual(recover_journals(self.journal_dir), 1)
+        self.assertEqual(
+            sorted(ActivityLog.objects.values_list('action', flat=True)), ["after restart", "before restart"],
+        )
+        self.assertFalse(stale.exists())
+        self.assertEqual(self.buffer.entries[0]['action'], "still buffered")
+
+    def test_close_keeps_journal_when_final_flush_fails(self):
+        self.buffer.add(self.entry("unsaved"))
+        journal = Path(self.journal_dir) / f"{os.getpid()}-{self.buffer.token}.jsonl"
+        with mock.patch('AuthApp.activity.write_entries', side_effect=DatabaseError):
+            with self.assertLogs('AuthApp.activity', 'ERROR'):
+                self.buffer.close()
+        self.assertEqual(json.loads(journal.read_text())['action'], "unsaved")
+
+        # The next process does not have the buffer's token.
+        with mock.patch('AuthApp.activity._live_tokens', set()):
+            self.assertEqual(recover_journals(self.journal_dir), 1)
+        self.assertEqual(ActivityLog.objects.get().action, "unsaved")
+        self.buffer.entries = []
+
+    def test_close_buffer_writes_out_the_process_buffer(self):
+        self.buffer.add(self.entry("pending"))
+        with mock.patch('AuthApp.activity._buffer', self.buffer):
+            close_buffer()
+        self.assertEqual(ActivityLog.objects.get().action, "pending")
+        self.assertEqual(list(Path(self.journal_dir).iterdir()), [])
+
+    def test_keeps_event_time(self):
+        entry = self.entry()
+        entry['timestamp'] = (timezone.now() - timedelta(hours=1)).isoformat()
+        self.buffer.add(entry)
+        self.buffer.flush()
+        self.assertLess(ActivityLog.objects.get().timestamp, timezone.now() - timedelta(minutes=59))
+
+    @override_settings(ACTIVITY_LOG_BUFFERED=False)
+    def test_unbuffered_writes_immediately(self):
+        log_activity(self.user, "login")
+        log_audit(self.user, "update", self.user)
+        self.assertEqual(ActivityLog.objects.get().action, "login")
+        audit = AuditLog.objects.get()
+        self.assertEqual((audit.model_name, audit.object_id), ("User", str(self.user.pk)))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.mkdtemp()
+        overrides = override_settings(ARCHIVE_DIR=archive_dir, ARCHIVE_RETENTION_DAYS={'activitylog': 30})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = make_user("archived")
+        now = timezone.now()
+        ActivityLog.objects.bulk_create(
+            [ActivityLog(user=self.user, action=f"old{i}", timestamp=now - timedelta(days=40 + i * 20)) for i in range(5)]
+            + [ActivityLog(user=self.user, action="recent", timestamp=now - timedelta(days=1))]
+        )
+
+    def test_moves_expired_rows_in_chunks(self):
+        self.assertEqual(archive_model('activitylog', chunk_size=2), 5)
+        self.assertEqual(list(ActivityLog.objects.values_list('action', flat=True)), ["recent"])
+
+        archived = list(read_archive('activitylog'))
+        self.assertEqual(sorted(row['action'] for row in archived), [f"old{i}" for i in range(5)])
+        self.assertEqual(archived[0]['user_id'], self.user.pk)
+
+    def test_read_archive_filters_by_range(self):
+        archive_model('activitylog')
+        now = timezone.now()
+        rows = list(read_archive('activitylog', start=now - timedelta(days=65), end=now - timedelta(days=35)))
+        self.assertEqual(sorted(row['action'] for row in rows), ["old0", "old1"])
+        self.assertEqual(list(read_archive('activitylog', action="old4"))[0]['action'], "old4")
+
+    def test_duplicate_chunks_are_read_once(self):
+        archive_model('activitylog')
+        ActivityLog.objects.bulk_create(
+            [ActivityLog(id=row['id'], user_id=row['user_id'], action=row['action'], timestamp=row['timestamp'])
+             for row in read_archive('activitylog')]
+        )
+        archive_model('activitylog')
+        self.assertEqual(len(list(read_archive('activitylog'))), 5)
+
+    def test_trash_snapshots_archived_readable(self):
+        note = Notification.objects.create(user=self.user, message="bye")
+        trash_object(note, self.user)
+        Trash.objects.update(deleted_at=timezone.now() - timedelta(days=100))
+
+        self.assertEqual(archive_model('trash', older_than=timedelta(days=30)), 1)
+        row = next(read_archive('trash'))
+        self.assertEqual(row['object_data']['message'], "bye")
+        self.assertNotIn('payload', row)
+
+    def test_no_retention_configured(self):
+        Trash.objects.create(model_name="User", object_data={})
+        self.assertEqual(archive_model('trash'), 0)
+        self.assertEqual(Trash.objects.count(), 1)
+
+
+class TrashTests(TestCase):
+    def setUp(self):
+        self.user = make_user("deleter", role='admin')
+        self.owner = make_user("owner")
+        self.created = timezone.now() - timedelta(days=3)
+        Notification.objects.bulk_create(
+            [Notification(user=self.owner, message=f"note {i}", is_read=i % 2 == 0) for i in range(5)]
+        )
+        Notification.objects.update(created_at=self.created)
+
+    def test_trash_and_restore_round_trip(self):
+        before = list(Notification.objects.order_by('pk').values())
+        batch = trash_queryset(Notification.objects.all(), self.user, chunk_size=2)
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(Trash.objects.filter(batch=batch).count(), 5)
+        self.assertEqual(restore_batch(batch, chunk_size=2), 5)
+        self.assertEqual(list(Notification.objects.order_by('pk').values()), before)
+        self.assertFalse(Trash.objects.exists())
+
+    def test_repeated_nested_values_stored_once(self):
+        course = {'name': "Math", 'teacher': {'id': 7, 'name': "Rahim"}}
+        Trash.objects.bulk_create(
+            [Trash(model_name="Enrollment", object_data=course) for _ in range(10)]
+            + [Trash(model_name="Enrollment", object_data={'name': "Physics"})]
+        )
+        batch = trash_queryset(Trash.objects.filter(batch__isnull=True), self.user, chunk_size=4)
+
+        # One blob for the column list plus one per distinct object_data.
+        self.assertEqual(TrashBlob.objects.count(), 3)
+        entries = Trash.objects.filter(batch=batch)
+        self.assertEqual(entries.count(), 11)
+        self.assertEqual(
+            sorted(snapshot_data(entry)['object_data']['name'] for entry in entries),
+            ["Math"] * 10 + ["Physics"],
+        )
+
+    def test_snapshot_data(self):
+        note = Notification.objects.first()
+        trash_object(note, self.user)
+        data = snapshot_data(Trash.objects.get())
+        self.assertEqual(data['message'], note.message)
+        self.assertEqual(data['id'], str(note.pk))
+
+    def test_legacy_rows_keep_object_data(self):
+        entry = Trash.objects.create(model_name="Course", object_data={'name': "Math"})
+        self.assertEqual(snapshot_data(entry), {'name': "Math"})
+
+    def test_cascade_is_snapshotted_and_restored(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher = make_user("teacher", role='employee', sub_role='teacher')
+            course = Course.objects.create(name="Geometry", teacher=teacher, total_seats=5)
+            for i in range(3):
+                Enrollment.objects.create(student=make_user(f"s{i}"), course=course)
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = trash_object(course, self.user)
+        self.assertFalse(Enrollment.objects.exists())
+        self.assertEqual(
+            sorted(Trash.objects.filter(batch=batch).values_list('model_name', flat=True)),
+            ['AuthApp.Course', 'AuthApp.CourseSummary'] + ['AuthApp.Enrollment'] * 3,
+        )
+        self.assertEqual([result['id'] for result in search("geometry", kinds=['course'])], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(restore_batch(batch), 5)
+        self.assertEqual(Enrollment.objects.filter(course=course).count(), 3)
+        self.assertEqual(CourseSummary.objects.get(course=course).pending, 3)
+        self.assertEqual([result['id'] for result in search("geometry", kinds=['course'])], [str(course.pk)])
+
+    def test_restored_users_are_indexed_and_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_all()
+            pupil = make_user("pupil", first_name="Zarina")
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = trash_object(pupil, self.user)
+        self.assertEqual(RoleSummary.objects.get(role='student', sub_role='').users, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            restore_batch(batch)
+        self.assertEqual(RoleSummary.objects.get(role='student', sub_role='').users, 2)
+        self.assertEqual([result['id'] for result in search("zarina", kinds=['user'])], [str(pupil.pk)])
+
+    def test_unreferenced_blobs_swept(self):
+        kept = trash_queryset(Notification.objects.filter(is_read=True), self.user)
+        restore_batch(trash_queryset(Notification.objects.all(), self.user))
+        self.assertEqual(TrashBlob.objects.count(), 1)
+
+        self.assertEqual(sweep_blobs(), 0)
+        with override_settings(TRASH_BLOB_GRACE=0):
+            restore_batch(kept)
+            self.assertEqual(sweep_blobs(), 1)
+        self.assertFalse(TrashBlob.objects.exists())
+
+    @override_settings(TRASH_BLOB_GRACE=0)
+    def test_archive_job_sweeps_blobs(self):
+        trash_queryset(Notification.objects.all(), self.user)
+        Trash.objects.update(deleted_at=timezone.now() - timedelta(days=100))
+        with override_settings(ARCHIVE_DIR=tempfile.mkdtemp(), ARCHIVE_RETENTION_DAYS={'trash': 30}):
+            self.addCleanup(shutil.rmtree, settings.ARCHIVE_DIR)
+            moved = archive_all()
+        self.assertEqual((moved['trash'], moved['trashblob']), (5, 1))
+        self.assertFalse(TrashBlob.objects.exists())
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_profile(self):
+        database = database_from_env(Path("/srv"), {})
+        self.assertEqual(database['NAME'], Path("/srv/db.sqlite3"))
+        self.assertEqual(database['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn("PRAGMA journal_mode=WAL;", database['OPTIONS']['init_command'])
+
+    def test_postgres_profile(self):
+        database = database_from_env(Path("/srv"), {'DB_PROFILE': 'postgres', 'DB_NAME': 'ic', 'DB_CONN_MAX_AGE': '60'})
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['NAME'], 'ic')
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            database_from_env(Path("/srv"), {'DB_PROFILE': 'oracle'})
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "SQLite pragmas")
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class RolePermissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user("teacher", role='employee', sub_role='teacher')
+        self.student = make_user("pupil")
+
+    def fresh(self, user):
+        return User.objects.get(pk=user.pk)
+
+    def test_matrix_covers_every_role_pair(self):
+        for role, _ in User.ROLE_CHOICES:
+            self.assertIn((role, None), MATRIX)
+            for sub_role, _ in User.SUBROLE_CHOICES:
+                self.assertIn((role, sub_role), MATRIX)
+
+    def test_sub_roles_only_extend_employees(self):
+        self.assertEqual(role_permissions('student', 'faculty'), role_permissions('student'))
+        self.assertEqual(role_permissions('candidate', 'hr'), role_permissions('candidate'))
+        candidate = make_user("applicant", role='candidate', sub_role='hr')
+        self.assertFalse(candidate.has_perm('AuthApp.add_user'))
+        self.assertFalse(candidate.has_perm('AuthApp.approve_leave'))
+        self.assertIn('AuthApp.add_user', role_permissions('employee', 'hr'))
+
+    def test_role_permissions_need_no_queries(self):
+        teacher = self.fresh(self.teacher)
+        with self.assertNumQueries(0):
+            self.assertTrue(teacher.has_perm('AuthApp.mark_attendance'))
+            self.assertTrue(teacher.has_perm('AuthApp.view_notification'))
+        admin = make_user("boss", role='admin')
+        with self.assertNumQueries(0):
+            self.assertTrue(admin.has_perm('AuthApp.delete_trash'))
+
+    def test_overrides_cached_and_invalidated(self):
+        self.assertFalse(self.fresh(self.student).has_perm('AuthApp.post_announcements'))
+        student = self.fresh(self.student)
+        with self.assertNumQueries(0):
+            self.assertFalse(student.has_perm('AuthApp.post_announcements'))
+
+        permission = Permission.objects.get(codename='post_announcements')
+        self.student.user_permissions.add(permission)
+        self.assertTrue(self.fresh(self.student).has_perm('AuthApp.post_announcements'))
+
+        group = Group.objects.create(name="editors")
+        group.permissions.add(Permission.objects.get(codename='notify_guardians'))
+        group.user_set.add(self.student)
+        self.assertTrue(self.fresh(self.student).has_perm('AuthApp.notify_guardians'))
+        group.permissions.clear()
+        self.assertFalse(self.fresh(self.student).has_perm('AuthApp.notify_guardians'))
+
+    def test_role_change_takes_effect(self):
+        self.assertFalse(self.student.has_perm('AuthApp.approve_salaries'))
+        self.student.role, self.student.sub_role = 'employee', 'finance'
+        self.student.save()
+        self.assertTrue(self.fresh(self.student).has_perm('AuthApp.approve_salaries'))
+
+    def test_inactive_users_have_nothing(self):
+        self.teacher.is_active = False
+        self.assertFalse(self.teacher.has_perm('AuthApp.mark_attendance'))
+
+    def test_role_required(self):
+        view = role_required('employee:teacher', 'admin', raise_exception=True)(lambda request: HttpResponse("ok"))
+        request = RequestFactory().get("/")
+        request.user = self.teacher
+        self.assertEqual(view(request).status_code, 200)
+        request.user = self.student
+        with self.assertRaises(PermissionDenied):
+            view(request)
+
+    def test_role_required_mixin(self):
+        class StudentOnly(RoleRequiredMixin, View):
+            allowed_roles = ['student']
+            raise_exception = True
+
+            def get(self, request):
+                return HttpResponse("ok")
+
+        request = RequestFactory().get("/")
+        request.user = self.student
+        self.assertEqual(StudentOnly.as_view()(request).status_code, 200)
+        request.user = self.teacher
+        with self.assertRaises(PermissionDenied):
+            StudentOnly.as_view()(request)
+
+
+class NotificationStreamTests(TestCase):
+    def test_broker_publishes_across_threads(self):
+        async def listen():
+            local = Broker(max_queue=2)
+            with local.subscribe(7) as queue:
+                self.assertEqual(local.listening([7, 8]), [7])
+                thread = threading.Thread(target=lambda: [local.publish(7, n) for n in range(3)])
+                thread.start()
+                thread.join()
+                # The queue holds two; the oldest event was dropped.
+                return [await asyncio.wait_for(queue.get(), 1) for _ in range(2)], local.connections
+        events, connections = asyncio.run(listen())
+        self.assertEqual(events, [1, 2])
+        self.assertEqual(connections, 1)
+
+    async def test_stream_pushes_new_notifications(self):
+        user = await sync_to_async(make_user)("listener")
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+        first = await asyncio.wait_for(stream.__anext__(), 1)
+        self.assertEqual(first, b'event: unread\ndata: {"count": 0}\n\n')
+
+        notification = await sync_to_async(Notification.objects.create)(user=user, message="Live")
+        await sync_to_async(delivered)([notification])
+        event = (await asyncio.wait_for(stream.__anext__(), 1)).decode()
+        self.assertIn("event: notification", event)
+        self.assertIn(f"id: {notification.pk}", event)
+        self.assertIn('"message": "Live"', event)
+
+        # A client disconnect cancels the task waiting on the stream.
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(broker.connections, 0)
+
+    def test_requires_asgi(self):
+        self.client.force_login(make_user("wsgi"))
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 501)
+
+
+def make_image(size=(800, 600), image_format='JPEG', **save_options):
+    out = io.BytesIO()
+    Image.new('RGB', size, (200, 40, 40)).save(out, image_format, **save_options)
+    return SimpleUploadedFile(f"upload.{image_format.lower()}", out.getvalue())
+
+
+@override_settings(PROFILE_IMAGE_WORKERS=0, PROFILE_IMAGE_SIZES=(32, 96))
+class ProfileImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = make_user("pictured")
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            set_profile_image(self.user, upload)
+        self.user.refresh_from_db()
+
+    def test_strips_metadata_and_applies_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = "Camera maker"
+        self.upload(make_image((800, 600), exif=exif.tobytes()))
+
+        with Image.open(self.user.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (600, 800))
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(PROFILE_IMAGE_MAX_EDGE=500)
+    def test_scales_down_large_uploads(self):
+        self.upload(make_image((1000, 400)))
+        self.assertEqual((self.user.image.width, self.user.image.height), (500, 200))
+
+    def test_renders_square_webp_variants(self):
+        self.upload(make_image())
+        self.assertEqual(set(self.user.image_variants), {'32', '96'})
+        for size, path in self.user.image_variants.items():
+            with Image.open(self.user.image.storage.path(path)) as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertEqual(variant.size, (int(size), int(size)))
+
+    def test_transparent_images_stay_png(self):
+        out = io.BytesIO()
+        Image.new('RGBA', (100, 100), (0, 0, 0, 0)).save(out, 'PNG')
+        self.upload(SimpleUploadedFile("logo.png", out.getvalue()))
+        self.assertTrue(self.user.image.name.endswith('.png'))
+
+    def test_rejects_invalid_uploads(self):
+        with self.assertRaises(ValidationError):
+            set_profile_image(self.user, SimpleUploadedFile("notes.jpg", b"not an image"))
+        with override_settings(PROFILE_IMAGE_MAX_PIXELS=100 * 100), self.assertRaises(ValidationError):
+            set_profile_image(self.user, make_image((200, 200)))
+        with override_settings(PROFILE_IMAGE_FORMATS=('JPEG',)), self.assertRaises(ValidationError):
+            set_profile_image(self.user, make_image(image_format='PNG'))
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
+
+    def test_replacing_deletes_old_files(self):
+        self.upload(make_image())
+        storage = self.user.image.storage
+        old_files = [self.user.image.name, *self.user.image_variants.values()]
+        self.upload(make_image((300, 300)))
+        self.assertFalse(any(storage.exists(name) for name in old_files))
+        self.assertTrue(storage.exists(self.user.image_variants['32']))
+
+    def test_variants_of_replaced_image_are_discarded(self):
+        self.upload(make_image())
+        current = dict(self.user.image_variants)
+        self.assertIsNone(store_variants(self.user.pk, "profiles/replaced.jpg", {32: b"stale"}))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.image_variants, current)
+        self.assertFalse(self.user.image.storage.exists("profiles/variants/replaced-32.webp"))
+
+    def test_admin_uploads_are_cleaned_and_get_variants(self):
+        self.client.force_login(make_user("root", role='admin', is_staff=True, is_superuser=True))
+        url = reverse('admin:AuthApp_user_change', args=[self.user.pk])
+
+        def post(**data):
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(url, {
+                    'username': "pictured", 'role': 'student', 'is_active': 'on',
+                    'date_joined_0': "2026-01-01", 'date_joined_1': "00:00:00", **data,
+                })
+
+        self.assertEqual(post(image=make_image((2400, 1200))).status_code, 302)
+        self.user.refresh_from_db()
+        self.assertNotIn("upload", self.user.image.name)
+        self.assertEqual((self.user.image.width, self.user.image.height), (1600, 800))
+        self.assertEqual(set(self.user.image_variants), {'32', '96'})
+        files = [self.user.image.name, *self.user.image_variants.values()]
+
+        response = post(image=SimpleUploadedFile("upload.jpg", b"not an image"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('image', response.context['adminform'].form.errors)
+
+        self.assertEqual(post(**{'image-clear': 'on'}).status_code, 302)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
+        self.assertEqual(self.user.image_variants, {})
+        self.assertFalse(any(default_storage.exists(name) for name in files))
+
+    def test_rebuilds_missing_variants(self):
+        self.upload(make_image())
+        User.objects.filter(pk=self.user.pk).update(image_variants={})
+        make_user("no picture")
+        self.assertEqual(build_missing_variants(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.image_variants), {'32', '96'})
+
+    def test_template_tag_picks_smallest_covering_variant(self):
+        template = Template("{% load profile_images %}{% profile_image_url user size %}")
+
+        def render(size):
+            return template.render(Context({'user': self.user, 'size': size}))
+
+        self.assertEqual(render(48), "")
+        self.upload(make_image())
+        variants = self.user.image_variants
+        self.assertEqual(render(24), f"/media/{variants['32']}")
+        self.assertEqual(render(48), f"/media/{variants['96']}")
+        self.assertEqual(render(500), f"/media/{variants['96']}")
+
+        self.user.image_variants = {}
+        self.assertEqual(render(48), self.user.image.url)
+
+
+def csv_file(text):
+    return io.BytesIO(text.encode())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkUserTests(TestCase):
+    def test_imports_in_chunks_with_passwords_and_reset_tokens(self):
+        make_user("taken")
+        result = import_users(csv_file(
+            "username,email,first_name,role,sub_role,password\n"
+            "alice,alice@example.com,Alice,,,s3cret\n"
+            "bob,bob@example.com,Bob,employee,hr,\n"
+            ",nobody@example.com,,,,\n"
+            "carol,not-an-email,,,,\n"
+            "alice,again@example.com,,,,\n"
+            "taken,,,,,\n"
+            "dave,,,wizard,,\n"
+            "erin,erin@example.com,,candidate,,\n"
+        ), chunk_size=2)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual([line for line, _ in result.errors], [4, 5, 6, 7, 8])
+        self.assertIn("already exists", result.errors[3][1])
+
+        alice = User.objects.get(username="alice")
+        self.assertEqual(alice.role, 'student')
+        self.assertTrue(alice.check_password("s3cret"))
+        bob = User.objects.get(username="bob")
+        self.assertEqual((bob.role, bob.sub_role), ('employee', 'hr'))
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual([token[0] for token in result.reset_tokens], ["bob", "erin"])
+        self.assertTrue(default_token_generator.check_token(bob, result.reset_tokens[0][3]))
+
+    def test_dry_run_creates_nothing(self):
+        result = import_users(csv_file("username\nfrank\ngrace\n"), dry_run=True)
+        self.assertEqual((result.created, result.errors), (2, []))
+        self.assertFalse(User.objects.exists())
+
+    def test_export_round_trips_through_import(self):
+        make_user("henry", email="henry@example.com", sub_role='other')
+        exported = "".join(csv_lines(export_rows(User.objects.all())))
+        self.assertTrue(exported.startswith("username,email,first_name,last_name,role,sub_role,phone,is_active"))
+
+        User.objects.all().delete()
+        self.assertEqual(import_users(csv_file(exported)).created, 1)
+        self.assertEqual(User.objects.get().email, "henry@example.com")
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl is not installed")
+    def test_xlsx_round_trip(self):
+        make_user("iris", phone="0123")
+        workbook = io.BytesIO()
+        write_xlsx(export_rows(User.objects.all()), workbook)
+        workbook.seek(0)
+        [(line, row)] = list(read_rows(workbook, 'xlsx'))
+        self.assertEqual((line, row['username'], row['phone'], row['role']), (2, "iris", "0123", 'student'))
+
+    def test_commands(self):
+        path = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, path)
+        (path / "intake.csv").write_text("username,email\njack,jack@example.com\n")
+        out = io.StringIO()
+        call_command('import_users', str(path / "intake.csv"), tokens=str(path / "tokens.csv"), stdout=out)
+        self.assertIn("created 1 user(s)", out.getvalue())
+        self.assertIn("jack,jack@example.com", (path / "tokens.csv").read_text())
+
+        out = io.StringIO()
+        call_command('export_users', role='student', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1].split(",")[:2], ["jack", "jack@example.com"])
+
+    def test_admin_export_streams_csv(self):
+        admin = make_user("root", role='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:AuthApp_user_changelist'), {
+            'action': 'export_csv', '_selected_action': [admin.pk],
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn("root,", b"".join(response.streaming_content).decode())
+
+    def test_admin_changelist_renders(self):
+        self.client.force_login(make_user("root", role='admin', is_staff=True, is_superuser=True))
+        response = self.client.get(reverse('admin:AuthApp_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('admin:AuthApp_user_import'))
+
+    def test_admin_import(self):
+        self.client.force_login(make_user("root", role='admin', is_staff=True, is_superuser=True))
+        upload = SimpleUploadedFile("intake.csv", b"username,role\nkate,candidate\n,\n")
+        response = self.client.post(reverse('admin:AuthApp_user_import'), {'file': upload, 'role': 'student'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(username="kate").role, 'candidate')
+        self.assertEqual(len(response.context['result'].errors), 1)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user("reader")
+        now = timezone.now()
+        # Pairs of rows share a timestamp, so pages must break ties on id.
+        self.logs = AuditLog.objects.bulk_create([
+            AuditLog(user=self.user, action=f"a{i}", model_name="User", object_id=str(i), created_at=now - timedelta(seconds=i // 2))
+            for i in range(25)
+        ])
+        self.newest_first = list(AuditLog.objects.order_by('-created_at', '-id'))
+
+    def test_walks_forward_and_back_without_gaps(self):
+        pages = [keyset_page(AuditLog.objects.all(), size=10)]
+        while pages[-1].next_cursor:
+            pages.append(keyset_page(AuditLog.objects.all(), pages[-1].next_cursor, size=10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([row for page in pages for row in page], self.newest_first)
+        self.assertIsNone(pages[0].previous_cursor)
+
+        back = keyset_page(AuditLog.objects.all(), pages[2].previous_cursor, size=10)
+        self.assertEqual(list(back), list(pages[1]))
+        back = keyset_page(AuditLog.objects.all(), back.previous_cursor, size=10)
+        self.assertEqual(list(back), list(pages[0]))
+        self.assertIsNone(back.previous_cursor)
+        self.assertIsNotNone(back.next_cursor)
+
+    def test_rejects_tampered_cursors(self):
+        with self.assertRaises(InvalidCursor):
+            keyset_page(AuditLog.objects.all(), "not-a-cursor")
+
+    def test_approximate_count(self):
+        self.assertEqual(approximate_count(User), 1)
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.admin = make_user("root", role='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        users = [make_user(f"reader{i}") for i in range(30)]
+        Notification.objects.bulk_create(
+            [Notification(user=users[i % 30], message=f"n{i}", is_read=i % 2 == 0) for i in range(150)]
+        )
+        self.url = reverse('admin:AuthApp_notification_changelist')
+
+    def test_changelist_pages_by_cursor_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        sql = [query['sql'] for query in queries]
+        self.assertFalse([q for q in sql if 'COUNT(' in q and 'AuthApp_notification' in q])
+        # Users come from the same query as the rows, not one query per row.
+        self.assertLess(len(queries), 10)
+
+        next_url = response.context['cl'].next_url
+        self.assertIsNone(response.context['cl'].previous_url)
+        response = self.client.get(self.url + next_url)
+        self.assertEqual(len(response.context['cl'].result_list), 50)
+        self.assertContains(response, "about 150 notifications")
+        self.assertIsNone(response.context['cl'].next_url)
+
+    def test_filtered_count_is_capped(self):
+        NotificationAdmin.count_limit = 20
+        self.addCleanup(delattr, NotificationAdmin, 'count_limit')
+        response = self.client.get(self.url, {'is_read__exact': '1'})
+        self.assertContains(response, "more than 20 notifications")
+        self.assertNotIn('cursor', response.context['cl'].get_query_string({'is_read__exact': '0'}))
+
+    def test_bad_cursor_redirects_with_error_flag(self):
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        self.assertRedirects(response, self.url + '?e=1', fetch_redirect_response=False)
+
+    def test_export_streams_csv(self):
+        response = self.client.post(self.url, {'action': 'export_csv', 'select_across': '1', '_selected_action': ['x']})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,user_id,message,action_link,is_read,created_at")
+        self.assertEqual(len(lines), 151)
+
+
+class SeatAllocationTests(TestCase):
+    def setUp(self):
+        teacher = make_user("teacher", role='employee', sub_role='teacher')
+        self.course = Course.objects.create(name="Algebra", teacher=teacher, total_seats=3)
+        self.enrollments = [
+            Enrollment.objects.create(student=make_user(f"applicant{i}"), course=self.course) for i in range(5)
+        ]
+
+    def test_stale_course_cannot_oversell(self):
+        # Every enrollment holds the Course loaded when it had all seats free.
+        stale = [Enrollment.objects.select_related('course').get(pk=e.pk) for e in self.enrollments]
+        for enrollment in stale[:3]:
+            self.assertTrue(enrollment.course.has_available_seat())
+            enrollment.approve()
+        with self.assertRaises(SeatUnavailable):
+            stale[3].approve()
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_filled, 3)
+        self.assertEqual(Enrollment.objects.filter(status='active').count(), 3)
+        self.assertEqual(Enrollment.objects.get(pk=stale[3].pk).status, 'pending')
+        self.assertEqual(sorted(SeatAssignment.objects.values_list('seat_number', flat=True)), [1, 2, 3])
+
+    def test_approving_twice_is_rejected(self):
+        approve_enrollment(self.enrollments[0])
+        with self.assertRaises(EnrollmentStateError):
+            approve_enrollment(self.enrollments[0])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_filled, 1)
+
+    def test_waitlist_fills_free_seats_in_application_order(self):
+        approve_enrollment(self.enrollments[1])
+        # The same statements however long the waitlist is.
+        with self.assertNumQueries(9):
+            approved = approve_waitlist(self.course)
+        self.assertEqual(approved, [self.enrollments[0], self.enrollments[2]])
+        self.assertEqual(
+            list(SeatAssignment.objects.order_by('seat_number').values_list('enrollment_id', 'seat_number')),
+            [(self.enrollments[1].pk, 1), (self.enrollments[0].pk, 2), (self.enrollments[2].pk, 3)],
+        )
+        self.assertEqual(approve_waitlist(self.course), [])
+
+    def test_cancelling_frees_the_seat_but_not_the_number(self):
+        approve_waitlist(self.course, limit=2)
+        cancel_enrollment(self.enrollments[0])
+        with self.assertRaises(EnrollmentStateError):
+            cancel_enrollment(self.enrollments[0])
+
+        approved = approve_waitlist(self.course)
+        self.assertEqual(len(approved), 2)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.seats_filled, self.course.last_seat_number), (3, 4))
+        self.assertEqual(sorted(SeatAssignment.objects.values_list('seat_number', flat=True)), [2, 3, 4])
+
+
+
+class DashboardSummaryTests(TestCase):
+    def test_signals_keep_role_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            admin = make_user("head", role='admin')
+            teacher = make_user("teacher", role='employee', sub_role='teacher')
+            make_user("clerk", role='employee', sub_role='hr')
+            student = make_user("pupil")
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher.sub_role = 'faculty'
+            teacher.save()
+            student.is_active = False
+            student.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.delete()
+
+        totals = dashboard_summary()['totals']
+        self.assertEqual((totals['students'], totals['teachers'], totals['staff']), (0, 0, 2))
+        self.assertEqual(RoleSummary.objects.get(role='student', sub_role='').users, 1)
+        self.assertEqual(RoleSummary.objects.get(role='admin', sub_role='').users, 0)
+
+    def test_enrollment_changes_reach_the_course_summary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher = make_user("teacher", role='employee', sub_role='teacher')
+            course = Course.objects.create(name="Algebra", teacher=teacher, total_seats=2)
+            enrollments = [Enrollment.objects.create(student=make_user(f"s{i}"), course=course) for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_enrollment(enrollments[0])
+            approve_waitlist(course)
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_enrollment(enrollments[0])
+
+        summary = CourseSummary.objects.get(course=course)
+        self.assertEqual((summary.seats, summary.pending, summary.active, summary.cancelled), (2, 1, 1, 1))
+        totals = dashboard_summary()['totals']
+        self.assertEqual((totals['courses'], totals['seats']), (1, 2))
+        self.assertEqual(totals['enrollments']['active'], 1)
+
+    def test_reconcile_corrects_unsignalled_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_user("first")
+        User.objects.bulk_create([User(username=f"bulk{i}", role='student') for i in range(4)])
+        User.objects.filter(username="bulk0").update(is_active=False)
+        self.assertEqual(dashboard_summary()['totals']['students'], 1)
+
+        reconcile_all()
+        summary = dashboard_summary()
+        self.assertEqual(summary['totals']['students'], 4)
+        self.assertEqual(summary['roles'], [{'role': 'student', 'sub_role': '', 'users': 5, 'active_users': 4}])
+        self.assertIsNotNone(summary['reconciled_at'])
+
+    def test_dashboard_reads_one_query(self):
+        reconcile_all()
+        with self.assertNumQueries(1):
+            summary = dashboard_summary()
+        self.assertEqual(summary['totals']['courses'], 0)
+
+    def test_empty_roles_do_not_replace_course_totals(self):
+        now = timezone.now()
+        course_totals = [2, 60] + [1] * (len(COURSE_TOTALS) - 2)
+        rows = [
+            ('', '', 0, 0, *course_totals, now),
+            ('student', None, 3, 2, *[0] * len(COURSE_TOTALS), now),
+            ('employee', 'teacher', 0, 0, *[0] * len(COURSE_TOTALS), now),
+        ]
+        for order in (rows, rows[::-1]):
+            with mock.patch('AuthApp.summaries._summary_rows', return_value=order):
+                summary = dashboard_summary()
+            self.assertEqual((summary['totals']['courses'], summary['totals']['seats']), (2, 60))
+            self.assertEqual([row['role'] for row in summary['roles']], ['student'])
+
+    def test_counts_view_is_for_admins(self):
+        self.client.force_login(make_user("pupil"))
+        self.assertEqual(self.client.get(reverse('dashboard_counts')).status_code, 403)
+        self.client.force_login(make_user("head", role='admin'))
+        response = self.client.get(reverse('dashboard_counts'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max_staleness', response.json())
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.student = make_user("payer")
+
+    def entry(self, transaction_type, amount, when, student=None):
+        return FinanceTransaction.objects.create(
+            transaction_type=transaction_type, amount=Decimal(amount), student=student,
+            created_at=timezone.make_aware(when),
+        )
+
+    def test_balance_moves_with_each_entry(self):
+        fee = post_entry('fee', '500.00', self.student)
+        payment = post_entry('payment', '200.00', self.student)
+        post_entry('income', '75.00', self.student)
+        self.assertEqual((fee.balance_after, payment.balance_after), (Decimal('500.00'), Decimal('300.00')))
+        self.assertEqual(StudentAccount.objects.get(student=self.student).pending_balance, Decimal('300.00'))
+        self.assertEqual(balance_at(self.student, fee.created_at), Decimal('500.00'))
+
+        reversal = reverse_entry(payment)
+        self.assertEqual(reversal.balance_after, Decimal('500.00'))
+        with self.assertRaises(LedgerError):
+            reverse_entry(payment)
+        self.assertEqual(StudentAccount.objects.get(student=self.student).pending_balance, Decimal('500.00'))
+
+    def test_entries_are_append_only(self):
+        entry = post_entry('expense', '10.00')
+        entry.amount = Decimal('1.00')
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+        with self.assertRaises(LedgerError):
+            post_entry('payment', '10.00')
+        with self.assertRaises(LedgerError):
+            post_entry('income', '-5.00')
+
+    def test_statement_uses_closed_periods(self):
+        self.entry('income', '1000.00', datetime(2026, 1, 10))
+        self.entry('salary', '400.00', datetime(2026, 1, 31, 23, 0))
+        self.entry('payment', '250.00', datetime(2026, 2, 3), self.student)
+        self.entry('refund', '50.00', datetime(2026, 2, 20), self.student)
+        self.entry('expense', '30.00', datetime(2026, 3, 2))
+
+        closed = close_periods(now=timezone.make_aware(datetime(2026, 3, 15)))
+        self.assertEqual(closed, [date(2026, 1, 1), date(2026, 2, 1)])
+        self.assertEqual(LedgerPeriod.objects.get(month=date(2026, 1, 1), transaction_type='salary').total, Decimal('400.00'))
+        self.assertEqual(close_periods(now=timezone.make_aware(datetime(2026, 3, 15))), [])
+
+        # Closed months come from LedgerPeriod; only March is read from the ledger.
+        with self.assertNumQueries(2):
+            report = statement(date(2026, 1, 1), date(2026, 3, 31))
+        self.assertEqual(report['income'], Decimal('1250.00'))
+        self.assertEqual(report['expenses'], Decimal('80.00'))
+        self.assertEqual(report['salaries'], Decimal('400.00'))
+        self.assertEqual(report['net'], Decimal('770.00'))
+        self.assertEqual([month['entries'] for month in report['months']], [2, 2, 1])
+
+        partial = statement(date(2026, 1, 15), date(2026, 2, 10))
+        self.assertEqual(partial['totals']['salary'], Decimal('400.00'))
+        self.assertEqual(partial['totals']['income'], Decimal('0.00'))
+        self.assertEqual(partial['income'], Decimal('250.00'))
+
+
+class ResultPublishingTests(TestCase):
+    def setUp(self):
+        teacher = make_user("teacher", role='employee', sub_role='teacher')
+        self.course = Course.objects.create(name="Physics", code="PHY101", teacher=teacher, total_seats=10)
+        self.students = [make_user(f"pupil{i}", first_name=f"Pupil{i}") for i in range(4)]
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course, status='active')
+        self.outsider = make_user("outsider")
+
+    def test_grades_and_percentiles(self):
+        self.assertEqual(assign_grades([100, 80, 79.99, 33, 32.5, 0]), ['A+', 'A+', 'A', 'D', 'F', 'F'])
+        self.assertEqual(assign_grades([55, 45], bands=[(0, 'Fail'), (50, 'Pass')]), ['Pass', 'Fail'])
+        self.assertEqual(percentile_ranks([10, 20, 20, 40]), [12.5, 50.0, 50.0, 87.5])
+
+    def test_import_reports_bad_rows(self):
+        result = import_marks(self.course, csv_file(
+            "username,marks_obtained,total_marks\n"
+            "pupil0,45,50\n"
+            "pupil1,abc,50\n"
+            "pupil2,60,50\n"
+            "outsider,10,50\n"
+            "pupil0,40,50\n"
+            "pupil3,30,\n"
+        ), total_marks='100')
+        self.assertEqual(result.saved, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6])
+        self.assertEqual(
+            dict(Result.objects.values_list('student__username', 'total_marks')),
+            {'pupil0': Decimal('50.00'), 'pupil3': Decimal('100.00')},
+        )
+
+    def test_publish_course_in_one_pass(self):
+        parent_user = make_user("guardian", role='candidate')
+        parent = Parent.objects.create(full_name="Guardian", parent_user=parent_user)
+        parent.students.add(self.students[0])
+        Parent.objects.create(full_name="No account").students.add(self.students[1])
+        ingest_marks(self.course, [
+            {'username': f"pupil{i}", 'marks_obtained': marks} for i, marks in enumerate([92, 71, 50, 20])
+        ], total_marks=100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Results, update, stats, parents and notifications, in a savepoint.
+            with self.assertNumQueries(7):
+                stats = publish_results(self.course, published_by=self.outsider)
+        self.assertEqual(
+            list(Result.objects.order_by('student__username').values_list('grade', 'percentile', 'published')),
+            [('A+', 87.5, True), ('A', 62.5, True), ('B', 37.5, True), ('F', 12.5, True)],
+        )
+        self.assertEqual((stats.students, stats.median, stats.grades), (4, 60.5, {'A+': 1, 'A': 1, 'B': 1, 'F': 1}))
+        self.assertEqual(Notification.objects.filter(user__in=self.students).count(), 4)
+        self.assertEqual(
+            list(Notification.objects.filter(user=parent_user).values_list('message', flat=True)),
+            ["Pupil0's result for Physics has been published."],
+        )
+
+        # Published results are locked; publishing again notifies nobody new.
+        self.assertEqual(ingest_marks(self.course, [{'username': 'pupil0', 'marks_obtained': 1}], 100).saved, 0)
+        publish_results(self.course)
+        self.assertEqual(Notification.objects.count(), 5)
+
+
+class EditHistoryTests(TestCase):
+    def setUp(self):
+        # History queued in a transaction is written by one commit hook, so
+        # run the hook for these before the tests capture their own.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.editor = make_user("editor", role='admin')
+            self.teacher = make_user("teacher", role='employee', sub_role='teacher')
+            self.course = Course.objects.create(name="Physics", teacher=self.teacher, total_seats=10)
+
+    def history(self, obj, action='updated'):
+        return list(
+            EditHistory.objects.filter(object_id=str(obj.pk), action=action)
+            .order_by('timestamp').values_list('changes', flat=True)
+        )
+
+    def test_saves_record_changed_fields_after_commit(self):
+        course = Course.objects.get(pk=self.course.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, acting_as(self.editor):
+            course.name = "Physics I"
+            course.description = "Mechanics"
+            # The UPDATE and the search document; nothing is read back.
+            with self.assertNumQueries(2):
+                course.save()
+            course.total_seats = 12
+            course.save()
+            course.save()
+            self.assertFalse(EditHistory.objects.filter(action='updated').exists())
+        # One commit hook, one INSERT for both saves.
+        self.assertEqual([hook.__qualname__ for hook in callbacks].count('_Queue.write'), 1)
+        self.assertEqual(self.history(course), [
+            {'name': ["Physics", "Physics I"], 'description': ["", "Mechanics"]},
+            {'total_seats': [10, 12]},
+        ])
+        self.assertEqual(set(EditHistory.objects.filter(action='updated').values_list('performed_by', flat=True)), {self.editor.pk})
+
+    def test_update_fields_deferred_fields_and_rollback(self):
+        course = Course.objects.only('name').get(pk=self.course.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            course.name = "Chemistry"
+            course.description = "Not saved"
+            course.save(update_fields=['name'])
+            course.refresh_from_db(fields=['total_seats'])
+            course.total_seats = 20
+            # Unknown at load time, so saved but not diffed.
+            course.save()
+            try:
+                with transaction.atomic():
+                    course.name = "Biology"
+                    course.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.history(course), [{'name': ["Physics", "Chemistry"]}])
+
+    def test_create_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = make_user("pupil", first_name="Pupil")
+            enrollment = Enrollment.objects.create(student=student, course=self.course)
+            enrollment_id = enrollment.pk
+            enrollment.delete()
+        enrollment.pk = enrollment_id
+        created, = self.history(enrollment, 'created')
+        self.assertEqual(created['status'], [None, 'pending'])
+        self.assertEqual(created['course'], [None, str(self.course.pk)])
+        self.assertEqual(self.history(student, 'created')[0]['first_name'], [None, "Pupil"])
+        self.assertNotIn('password', self.history(student, 'created')[0])
+        self.assertEqual(self.history(enrollment, 'deleted'), [None])
+
+    def test_bulk_update_writes_only_changed_objects(self):
+        students = [make_user(f"pupil{i}") for i in range(4)]
+        Enrollment.objects.bulk_create([Enrollment(student=student, course=self.course) for student in students])
+        enrollments = list(Enrollment.objects.order_by('student__username'))
+        for enrollment in enrollments[:3]:
+            enrollment.status = 'active'
+        with self.captureOnCommitCallbacks(execute=True):
+            # History is inserted after commit.
+            with self.assertNumQueries(1):
+                self.assertEqual(history.bulk_update(enrollments, ['status']), 3)
+            self.assertEqual(history.bulk_update(enrollments, ['status']), 0)
+        self.assertEqual(Enrollment.objects.filter(status='active').count(), 3)
+        self.assertEqual(EditHistory.objects.filter(action='updated').count(), 3)
+        self.assertEqual(self.history(enrollments[0]), [{'status': ['pending', 'active']}])
+
+    def test_middleware_attributes_saves_to_request_user(self):
+        course = Course.objects.get(pk=self.course.pk)
+        request = RequestFactory().post('/')
+        request.user = self.editor
+
+        def view(request):
+            course.name = "Physics II"
+            course.save()
+            return HttpResponse()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EditHistoryMiddleware(view)(request)
+        self.assertEqual(EditHistory.objects.get(action='updated').performed_by, self.editor)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.hr = make_user("hr", role='employee', sub_role='hr', first_name="Hasan", last_name="Kabir")
+        self.teacher = make_user("teacher", role='employee', sub_role='teacher', first_name="Tania")
+        self.alice = make_user("arahman", first_name="Alice", last_name="Rahman", location="Dhaka", email="alice@example.com")
+        self.bob = make_user("bob", first_name="Bob", bio="Studies with Alice in Chittagong")
+        self.former = make_user("former", first_name="Alina", is_active=False)
+        self.course = Course.objects.create(name="Algorithms", code="CSE201", teacher=self.teacher, description="Graphs and sorting")
+        self.open_post = JobPost.objects.create(title="Algorithm tutor", description="Teach graphs", hr=self.hr, status='open')
+        self.draft_post = JobPost.objects.create(title="Algebra lecturer", hr=self.hr)
+
+    def ids(self, query, user=None, **kwargs):
+        return [result['id'] for result in search(query, user, **kwargs)]
+
+    def test_prefix_terms_ranked_title_first(self):
+        results = search("ali", kinds=['user'])
+        self.assertEqual({result['id'] for result in results}, {str(self.alice.pk), str(self.former.pk), str(self.bob.pk)})
+        self.assertEqual(results[-1]['id'], str(self.bob.pk))
+        self.assertEqual(self.ids("alice dha"), [str(self.alice.pk)])
+        self.assertEqual(self.ids("example.com"), [str(self.alice.pk)])
+        self.assertEqual(self.ids("   "), [])
+
+    def test_results_limited_to_what_the_user_may_see(self):
+        student = self.bob
+        self.assertEqual(set(self.ids("alg", student)), {str(self.course.pk), str(self.open_post.pk)})
+        self.assertEqual({result['kind'] for result in search("al", student)}, {'course', 'jobpost'})
+        # view_user, but not change_user: no inactive accounts.
+        self.assertNotIn(str(self.former.pk), self.ids("ali", self.teacher))
+        self.assertIn(str(self.alice.pk), self.ids("ali", self.teacher))
+        # HR manages users and job posts.
+        self.assertIn(str(self.former.pk), self.ids("ali", self.hr))
+        self.assertIn(str(self.draft_post.pk), self.ids("alg", self.hr))
+        self.assertEqual(self.ids("kabir", self.hr, roles=['employee:hr']), [str(self.hr.pk)])
+        self.assertEqual(self.ids("kabir", self.hr, roles=['student']), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.alice.first_name = "Alicia"
+        self.alice.location = "Sylhet"
+        self.alice.save()
+        self.assertEqual(self.ids("sylhet"), [str(self.alice.pk)])
+        self.assertEqual(self.ids("dhaka"), [])
+        # Logins do not touch the index.
+        with self.assertNumQueries(1):
+            self.alice.save(update_fields=['last_login'])
+        self.open_post.status = 'closed'
+        self.open_post.save()
+        self.assertNotIn(str(self.open_post.pk), self.ids("tutor", self.bob))
+        course_id = str(self.course.pk)
+        self.course.delete()
+        self.assertNotIn(course_id, self.ids("graphs"))
+
+        import_users(csv_file("username,first_name,last_name\nnewcomer,Nadia,Islam\n"))
+        self.assertEqual([result['title'] for result in search("nadia isl")], ["Nadia Islam newcomer"])
+
+    def test_rebuild_and_view(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.ids("alice"), [])
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn("user: 5 document(s)", out.getvalue())
+        self.assertEqual(self.ids("alice")[0], str(self.alice.pk))
+
+        self.client.force_login(self.bob)
+        response = self.client.get(reverse('search'), {'q': "graphs", 'kind': 'course'})
+        self.assertEqual([result['id'] for result in response.json()['results']], [str(self.course.pk)])
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=False)
+class LeaveCalendarTests(TestCase):
+    def setUp(self):
+        self.hr = make_user("hr", role='employee', sub_role='hr')
+        self.teachers = [make_user(f"teacher{i}", role='employee', sub_role='teacher') for i in range(3)]
+        reconcile_all()
+
+    def test_overlap_lookup_matches_a_scan(self):
+        start = date(2024, 1, 1)
+        leave = []
+        for i in range(120):
+            first = start + timedelta(days=(i * 37) % 700)
+            leave.append(LeaveRequest(
+                user=self.teachers[i % 3], start_date=first, end_date=first + timedelta(days=(i * 13) % 300),
+                status='approved' if i % 4 else 'pending',
+                span=LeaveRequest.span_of(first, first + timedelta(days=(i * 13) % 300)),
+            ))
+        LeaveRequest.objects.bulk_create(leave)
+        for low, high in [(date(2024, 3, 4), date(2024, 3, 10)), (date(2025, 6, 1), date(2025, 6, 1)), (date(2026, 1, 1), date(2026, 12, 31))]:
+            expected = {
+                item.pk for item in leave
+                if item.status == 'approved' and item.start_date <= high and item.end_date >= low
+            }
+            self.assertEqual(set(on_leave(low, high).values_list('pk', flat=True)), expected)
+        self.assertEqual(on_leave(date(2024, 3, 4), roles=['employee:hr']).count(), 0)
+        if connection.vendor == 'sqlite':
+            self.assertIn("leave_interval_idx", query_plan(on_leave(date(2024, 3, 4), date(2024, 3, 10))))
+
+    def test_span_must_cover_the_dates(self):
+        teacher, first = self.teachers[0], date(2025, 5, 5)
+        LeaveRequest.objects.bulk_create([LeaveRequest(user=teacher, start_date=first, end_date=first + timedelta(days=1), span=1)])
+        for end, span in [(first + timedelta(days=2), 1), (first + timedelta(days=9), 0)]:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                LeaveRequest.objects.bulk_create([LeaveRequest(user=teacher, start_date=first, end_date=end, span=span)])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LeaveRequest.objects.update(end_date=first + timedelta(days=30))
+        # Past MAX_SPAN the length classes end, whatever the dates.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LeaveRequest.objects.bulk_create([
+                LeaveRequest(user=teacher, start_date=first, end_date=first, span=LeaveRequest.MAX_SPAN + 1),
+            ])
+
+    def test_requests_may_not_overlap(self):
+        teacher = self.teachers[0]
+        first = request_leave(teacher, date(2025, 5, 5), date(2025, 5, 9))
+        with self.assertRaises(LeaveConflict):
+            request_leave(teacher, date(2025, 5, 9), date(2025, 5, 12))
+        with self.assertRaises(LeaveError):
+            request_leave(teacher, date(2025, 5, 20), date(2025, 5, 19))
+        reject_leave(first, self.hr)
+        second = request_leave(teacher, date(2025, 5, 8), date(2025, 5, 12))
+        # Written around the checks, e.g. by an import.
+        third = LeaveRequest.objects.create(user=teacher, start_date=date(2025, 5, 12), end_date=date(2025, 5, 14))
+        approve_leave(second, self.hr)
+        with self.assertRaises(LeaveConflict):
+            approve_leave(third, self.hr)
+        with self.assertRaises(LeaveError):
+            approve_leave(second, self.hr)
+        self.assertEqual(LeaveRequest.objects.get(pk=second.pk).actioned_by, self.hr)
+
+    def test_approval_and_cancellation_move_availability(self):
+        leave = [
+            request_leave(self.teachers[0], date(2025, 2, 26), date(2025, 3, 3)),
+            request_leave(self.teachers[1], date(2025, 3, 3), date(2025, 3, 4)),
+            request_leave(self.hr, date(2025, 3, 10), date(2025, 3, 10)),
+        ]
+        for item in leave:
+            approve_leave(item, self.hr)
+        cancel_leave(leave[2], self.hr)
+
+        with self.assertNumQueries(1):
+            grid = month_availability(date(2025, 3, 17), roles=['employee'])
+        self.assertEqual(len(grid['days']), 31)
+        self.assertEqual([(row['role'], row['sub_role'], row['staff']) for row in grid['rows']], [
+            ('employee', 'hr', 1), ('employee', 'teacher', 3),
+        ])
+        teachers = grid['rows'][1]
+        self.assertEqual(teachers['on_leave'][:5], [1, 1, 2, 1, 0])
+        self.assertEqual(teachers['available'][:5], [2, 2, 1, 2, 3])
+        self.assertEqual(grid['rows'][0]['on_leave'][9], 0)
+        self.assertEqual(month_availability(date(2025, 3, 1), roles=['student'])['rows'], [])
+
+    def test_counts_follow_the_role_at_approval(self):
+        teacher = self.teachers[0]
+        leave = approve_leave(request_leave(teacher, date(2025, 3, 3), date(2025, 3, 4)), self.hr)
+        User.objects.filter(pk=teacher.pk).update(sub_role='hr')
+        reconcile_availability(date(2025, 3, 1), date(2025, 3, 31))
+        self.assertEqual(
+            list(DailyAvailability.objects.values_list('sub_role', 'on_leave').distinct()), [('teacher', 1)],
+        )
+
+        cancel_leave(leave, self.hr)
+        self.assertEqual(
+            set(DailyAvailability.objects.values_list('sub_role', 'on_leave')), {('teacher', 0)},
+        )
+
+    def test_reconcile_matches_incremental_counts(self):
+        for i, teacher in enumerate(self.teachers):
+            approve_leave(request_leave(teacher, date(2025, 1, 20 + i), date(2025, 2, 3 + i)), self.hr)
+        counted = sorted(DailyAvailability.objects.filter(on_leave__gt=0).values_list('day', 'role', 'sub_role', 'on_leave'))
+        DailyAvailability.objects.all().delete()
+        reconcile_availability(date(2025, 1, 1), date(2025, 3, 31))
+        self.assertEqual(sorted(DailyAvailability.objects.values_list('day', 'role', 'sub_role', 'on_leave')), counted)
+        # Only the window is rewritten.
+        reconcile_availability(date(2025, 2, 1), date(2025, 2, 28))
+        self.assertEqual(DailyAvailability.objects.get(day=date(2025, 1, 22)).on_leave, 3)
+
+    def test_availability_view_is_for_staff(self):
+        approve_leave(request_leave(self.teachers[0], date(2025, 4, 1), date(2025, 4, 2)), self.hr)
+        self.client.force_login(make_user("pupil"))
+        self.assertEqual(self.client.get(reverse('leave_availability')).status_code, 403)
+        self.client.force_login(self.hr)
+        response = self.client.get(reverse('leave_availability'), {'month': '2025-04', 'role': 'employee:teacher'})
+        rows = response.json()['rows']
+        self.assertEqual([row['on_leave'][:3] for row in rows], [[1, 1, 0]])
+        self.assertEqual(response.json()['days'][0], '2025-04-01')
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=False)
+class ApprovalWorkflowTests(TestCase):
+    def setUp(self):
+        self.admin = make_user("head", role='admin')
+        self.hr = make_user("hr", role='employee', sub_role='hr')
+        self.teacher = make_user("teacher", role='employee', sub_role='teacher')
+        self.course = Course.objects.create(name="Algebra", teacher=self.teacher, total_seats=1)
+        self.enrollments = [Enrollment.objects.create(student=make_user(f"s{i}"), course=self.course) for i in range(2)]
+        self.post = JobPost.objects.create(title="Lab assistant", hr=self.hr)
+        self.leave = request_leave(self.teacher, date(2025, 5, 5), date(2025, 5, 6))
+        self.approvals = [
+            request_approval('enroll_student', enrollment, enrollment.student) for enrollment in self.enrollments
+        ] + [
+            request_approval('add_job', self.post, self.hr),
+            request_approval('leave_request', self.leave, self.teacher),
+        ]
+
+    def test_inbox_loads_targets_per_type(self):
+        # The page, then one query for each of the three target types.
+        with self.assertNumQueries(4):
+            page = inbox(self.admin)
+            targets = [str(approval.target) for approval in page]
+        self.assertEqual(len(targets), 4)
+        self.assertIn("s0 -> Algebra (pending)", targets)
+        self.assertEqual([approval.requested_by for approval in page][-1], self.enrollments[0].student)
+        # HR decides job posts and leave, not enrollments.
+        self.assertEqual({approval.action_type for approval in inbox(self.hr)}, {'add_job', 'leave_request'})
+        self.assertEqual(len(inbox(self.hr, action_types=['add_job'])), 1)
+
+    def test_batch_approval_fails_items_alone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = approve(self.approvals, self.admin, note="ok")
+        # One seat: the second enrollment stays pending.
+        self.assertEqual(len(result.decided), 3)
+        self.assertEqual(result.failed, [(self.approvals[1].pk, "No seats available")])
+        self.assertEqual(
+            dict(Approval.objects.values_list('action_type', 'status').filter(pk__in=[a.pk for a in result.decided])),
+            {'enroll_student': 'approved', 'add_job': 'approved', 'leave_request': 'approved'},
+        )
+        self.assertEqual(Approval.objects.get(pk=self.approvals[1].pk).status, 'pending')
+        self.assertEqual(Enrollment.objects.get(pk=self.enrollments[0].pk).status, 'active')
+        self.assertEqual(JobPost.objects.get(pk=self.post.pk).status, 'open')
+        self.assertEqual([r['id'] for r in search("assistant", self.enrollments[0].student)], [str(self.post.pk)])
+        self.assertEqual(LeaveRequest.objects.get(pk=self.leave.pk).status, 'approved')
+        self.assertEqual(approve(self.approvals[:1], self.admin).failed, [(self.approvals[0].pk, "Not pending.")])
+
+    def test_rejection_and_permissions(self):
+        newcomer = make_user("newcomer", is_active=False)
+        signup = request_approval('add_user', newcomer, newcomer)
+        # HR may not decide enrollments.
+        result = reject([*self.approvals, signup], self.hr)
+        self.assertEqual([reason for _, reason in result.failed], ["Not permitted.", "Not permitted."])
+        self.assertEqual(JobPost.objects.get(pk=self.post.pk).status, 'closed')
+        self.assertEqual(LeaveRequest.objects.get(pk=self.leave.pk).status, 'rejected')
+        self.assertFalse(User.objects.filter(pk=newcomer.pk).exists())
+        self.assertTrue(Trash.objects.filter(object_id=str(newcomer.pk)).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reject(self.approvals[:2], self.admin)
+        self.assertEqual(CourseSummary.objects.get(course=self.course).rejected, 2)
+
+    def test_salary_and_user_activation(self):
+        finance = make_user("cashier", role='employee', sub_role='finance')
+        salary = request_approval('salary_approval', self.teacher, self.hr, amount=Decimal('1200.00'))
+        newcomer = make_user("newcomer", is_active=False)
+        signup = request_approval('add_user', newcomer, newcomer)
+        approve([salary], finance)
+        entry = FinanceTransaction.objects.get(transaction_type='salary')
+        self.assertEqual((entry.amount, entry.created_by), (Decimal('1200.00'), finance))
+        approve([signup], self.admin)
+        self.assertTrue(User.objects.get(pk=newcomer.pk).is_active)
+        with self.assertRaises(ValueError):
+            request_approval('add_job', self.course, self.hr)
+
+    def test_inbox_view(self):
+        self.client.force_login(self.hr)
+        response = self.client.get(reverse('approval_inbox'))
+        self.assertEqual(
+            {row['action_type']: row['target'] for row in response.json()['approvals']},
+            {'add_job': "Lab assistant (pending)", 'leave_request': str(self.leave)},
+        )
+        response = self.client.post(reverse('approval_inbox'), {'id': [str(self.approvals[2].pk)], 'decision': 'approve'})
+        self.assertEqual(response.json(), {'decided': [str(self.approvals[2].pk)], 'failed': []})
+        self.assertEqual(self.client.post(reverse('approval_inbox'), {'decision': 'maybe'}).status_code, 400)
+
+
+def make_docx(*paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+    return buffer.getvalue()
+
+
+def make_pdf(*lines):
+    content = b"BT /F1 12 Tf " + b" T* ".join(b"(" + line.encode() + b") Tj" for line in lines) + b" ET"
+    stream = zlib.compress(content)
+    return (
+        b"%PDF-1.4\n4 0 obj\n<< /Length " + str(len(stream)).encode() + b" /Filter /FlateDecode >>\nstream\n"
+        + stream + b"\nendstream\nendobj\n%%EOF\n"
+    )
+
+
+@override_settings(RESUME_TEXT_WORKERS=0)
+class JobApplicationTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media_root = Path(media_root)
+        hr = make_user("recruiter", role='employee', sub_role='hr')
+        self.post = JobPost.objects.create(title="Lab assistant", hr=hr, status='open')
+        self.other = JobPost.objects.create(title="Librarian", hr=hr, status='open')
+
+    def apply(self, job, email, content=None, name="cv.txt"):
+        resume = SimpleUploadedFile(name, content) if content is not None else None
+        with self.captureOnCommitCallbacks(execute=True):
+            return apply_for_job(job, "Applicant", email, resume=resume)
+
+    def test_identical_resumes_stored_once(self):
+        first = self.apply(self.post, "a@example.com", b"Ten years of pipettes.")
+        second = self.apply(self.other, "b@example.com", b"Ten years of pipettes.")
+        third = self.apply(self.post, "c@example.com", b"Something else.")
+
+        self.assertEqual(first.resume.name, second.resume.name)
+        self.assertEqual(first.resume.name, f"resumes/{first.resume_digest[:2]}/{first.resume_digest}.txt")
+        self.assertNotEqual(first.resume.name, third.resume.name)
+        self.assertEqual(len([path for path in self.media_root.rglob('*') if path.is_file()]), 2)
+        self.assertEqual(ResumeText.objects.count(), 2)
+        with self.assertRaises(ApplicationError):
+            self.apply(self.post, "d@example.com", b"MZ", name="cv.exe")
+
+    def test_one_application_per_address(self):
+        self.apply(self.post, "Ada@Example.com")
+        with self.assertRaises(DuplicateApplication):
+            self.apply(self.post, "ada@example.COM")
+        self.apply(self.other, "ada@example.com")
+        # The index also refuses what the check does not see.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            JobApplication.objects.create(job=self.post, applicant_name="Ada", applicant_email="ADA@example.com")
+
+        with CaptureQueriesContext(connection) as queries:
+            already_applied(self.post, "ADA@example.com")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+            self.assertIn("jobapplication_unique_applicant", plan)
+
+    def test_extracts_text(self):
+        docx = self.apply(self.post, "a@example.com", make_docx("Ada Lovelace", "Analytical engines"), "cv.docx")
+        pdf = self.apply(self.post, "b@example.com", make_pdf("Grace Hopper", "Compilers (and bugs)"), "cv.pdf")
+        self.assertEqual(ResumeText.objects.get(digest=docx.resume_digest).text, "Ada Lovelace\nAnalytical engines")
+        self.assertEqual(ResumeText.objects.get(digest=pdf.resume_digest).text, "Grace Hopper\nCompilers (and bugs)")
+
+        # Whatever the pool missed is picked up by the job.
+        ResumeText.objects.all().delete()
+        self.assertEqual(extract_pending(), 2)
+        self.assertEqual(extract_pending(), 0)
+        self.assertEqual(ResumeText.objects.get(digest=docx.resume_digest).error, '')
+
+    def test_apply_view(self):
+        url = reverse('apply_for_job', args=[self.post.pk])
+        data = {'applicant_name': "Ada", 'applicant_email': "ada@example.com"}
+        response = self.client.post(url, {**data, 'resume': SimpleUploadedFile("cv.txt", b"Engines.")})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['resume'].startswith("resumes/"))
+        self.assertEqual(self.client.post(url, data).status_code, 409)
+
+        with override_settings(RESUME_MAX_BYTES=1000):
+            response = self.client.post(url, {
+                'applicant_name': "Bo", 'applicant_email': "bo@example.com",
+                'resume': SimpleUploadedFile("cv.txt", b"x" * 5000),
+            })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(JobApplication.objects.filter(applicant_email="bo@example.com").exists())
+
+        self.other.status = 'closed'
+        self.other.save()
+        self.assertEqual(self.client.post(reverse('apply_for_job', args=[self.other.pk]), data).status_code, 400)
+
+
+class StartupProfileTests(TestCase):
+    def test_cold_start_within_budget(self):
+        profile = run_probe('/admin/login/')
+        self.assertEqual(profile.status, 200)
+        self.assertLess(profile.startup_ms, settings.STARTUP_BUDGET_MS)
+        self.assertGreater(profile.import_ms('apps'), 0)
+        self.assertIn('AuthApp.models', {record.module for record in profile.imports if record.phase == 'apps'})
+        # Optional dependencies load when their feature is first used.
+        self.assertFalse({'PIL', 'openpyxl', 'pypdf'} & profile.ready_modules)
+
+    def test_collector_paused_only_while_loading(self):
+        self.assertTrue(gc.isenabled())
+        with self.assertRaises(ImportError):
+            with gc_paused():
+                self.assertFalse(gc.isenabled())
+                raise ImportError("a broken app")
+        self.assertTrue(gc.isenabled())
+        with override_settings(STARTUP_FREEZE_GC=False), gc_paused():
+            self.assertTrue(gc.isenabled())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.admin = make_user("metrics-admin", role='admin')
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0)
+    def test_requests_recorded_by_url_name(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('dashboard_counts'))
+        self.client.get('/no/such/page/')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('instracore_requests_total{view="dashboard_counts",status="200"} 1', text)
+        self.assertIn('instracore_requests_total{view="<unresolved>",status="404"} 1', text)
+        self.assertIn('instracore_request_duration_seconds_bucket{view="dashboard_counts",le="+Inf"} 1', text)
+        self.assertRegex(text, r'instracore_request_queries_sum\{view="dashboard_counts"\} [1-9]')
+        self.assertIn('instracore_request_cpu_seconds_count{view="dashboard_counts"} 1', text)
+        self.assertIn('instracore_response_size_bytes_count{view="dashboard_counts"} 1', text)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_only_timed(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('dashboard_counts'))
+        text = metrics.exposition()
+        self.assertIn('instracore_request_duration_seconds_count{view="dashboard_counts"} 1', text)
+        self.assertNotIn('instracore_request_queries_count{view="dashboard_counts"}', text)
+
+    @override_settings(METRICS_DUPLICATE_QUERY_WARNING=5)
+    def test_duplicate_queries(self):
+        users = [make_user(f"dup{i}") for i in range(6)]
+        with recording_queries() as queries:
+            for user in users:
+                User.objects.get(pk=user.pk)
+            User.objects.count()
+        self.assertEqual((queries.count, queries.duplicates), (7, 5))
+        sql, times = queries.most_repeated()
+        self.assertEqual(times, 6)
+        with self.assertLogs('AuthApp.metrics', 'WARNING') as logs:
+            warn_duplicates('users', queries)
+        self.assertIn("ran 7 queries, 5 repeating", logs.output[0])
+
+    def test_endpoint_requires_token_or_admin(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+            response = self.client.get(url, headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SeedAndLoadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.timings = seed(400, prefix='t')
+
+    def test_seeded_data_is_consistent(self):
+        self.assertEqual(self.timings['users'][0], User.objects.count())
+        self.assertEqual(
+            {(role, sub_role) for role, sub_role, _ in ROLE_MIX},
+            set(User.objects.values_list('role', 'sub_role').distinct()),
+        )
+        self.assertEqual(Notification.objects.count(), 400 * 50)
+        for course in Course.objects.annotate(active=Count('enrollments', filter=Q(enrollments__status='active'))):
+            self.assertEqual(course.active, course.seats_filled)
+            self.assertLessEqual(course.seats_filled, course.total_seats)
+            self.assertEqual(course.seat_assignments.count(), course.seats_filled)
+        self.assertEqual(
+            Result.objects.count(), Enrollment.objects.filter(status='completed').count(),
+        )
+        self.assertEqual(snapshot_data(Trash.objects.first())['is_read'], True)
+        self.assertEqual(dashboard_summary()['totals']['courses'], Course.objects.count())
+        self.assertTrue(search("Rahman", User.objects.filter(role='admin').first()))
+        with self.assertRaises(SeedError):
+            seed(10, prefix='t')
+
+    def test_load_run_and_baseline(self):
+        report = run_load(clients=1, requests=4, warmup=1).as_dict()
+        self.assertEqual(set(report['scenarios']), set(SCENARIOS))
+        for name, result in report['scenarios'].items():
+            self.assertEqual((result['requests'], result['errors']), (4, 0), name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+        self.assertEqual(report['users'], User.objects.count())
+
+        baseline = json.loads(json.dumps(report))
+        self.assertEqual(compare(report, baseline), [])
+        baseline['scenarios']['search']['p95_ms'] = report['scenarios']['search']['p95_ms'] / 2
+        baseline['scenarios']['dashboard']['throughput_rps'] *= 2
+        self.assertEqual(
+            sorted((name, metric) for name, metric, _, _ in compare(report, baseline, tolerance=0.25)),
+            [('dashboard', 'throughput_rps'), ('search', 'p95_ms')],
+        )
+        User.objects.filter(role='admin').update(is_active=False)
+        with self.assertRaises(LoadTestError):
+            run_load(['dashboard'], clients=1, requests=1)
+
+
+class SessionFastPathTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        # Two aliases over one store stand in for two processes sharing a cache server.
+        shared_cache = self.settings(
+            CACHES={**settings.CACHES, 'sessions': shared, 'other-worker': shared},
+            SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+            SESSION_CACHE_ALIAS='sessions',
+            USER_CACHE='sessions',
+        )
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        cache.clear()
+        self.admin = make_user("fast-admin", role='admin', bio="Long profile text")
+        self.client.force_login(self.admin)
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard_counts'))
+        return response, [
+            query['sql'] for query in queries
+            if 'django_session' in query['sql'] or '"AuthApp_user"' in query['sql']
+        ]
+
+    def test_signed_in_request_without_session_or_user_queries(self):
+        self.auth_queries()
+        response, queries = self.auth_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertEqual(response.wsgi_request.user, self.admin)
+        self.assertEqual(response.wsgi_request.user.get_deferred_fields() & {'bio', 'password'}, {'bio', 'password'})
+
+    def test_saving_the_user_drops_the_projection(self):
+        self.auth_queries()
+        self.admin.role = 'student'
+        self.admin.save()
+        self.assertEqual(self.auth_queries()[0].status_code, 403)
+
+        self.admin.role = 'admin'
+        self.admin.set_password("a new password")
+        self.admin.save()
+        response = self.auth_queries()[0]
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_logout_reaches_other_processes(self):
+        other = Client()
+        self.assertEqual(self.auth_queries()[0].status_code, 200)
+        other.cookies = self.client.cookies
+        with self.settings(SESSION_CACHE_ALIAS='other-worker', USER_CACHE='other-worker'):
+            self.assertEqual(other.get(reverse('dashboard_counts')).status_code, 200)
+
+        self.client.logout()
+        with self.settings(SESSION_CACHE_ALIAS='other-worker', USER_CACHE='other-worker'):
+            response = other.get(reverse('dashboard_counts'))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_per_process_cache_rejected(self):
+        self.assertEqual(check_session_cache(None), [])
+        with self.settings(USER_CACHE='default'):
+            self.assertEqual([error.id for error in check_session_cache(None)], ['AuthApp.E001'])
+        with self.settings(SESSION_CACHE_ALIAS='default', USER_CACHE=None):
+            self.assertEqual([error.id for error in check_session_cache(None)], ['AuthApp.E001'])
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db', USER_CACHE=None):
+            self.assertEqual(check_session_cache(None), [])
+
+    def test_slim_user_loads_and_saves_other_fields(self):
+        user = slim_user(user_projection(self.admin.pk)[0])
+        self.assertEqual((user.username, user.role, user.is_active), ("fast-admin", 'admin', True))
+        user.first_name = "Fast"
+        user.save()
+        self.admin.refresh_from_db()
+        self.assertEqual((self.admin.first_name, self.admin.bio), ("Fast", "Long profile text"))
+        # Saved through signals, so the projection was dropped and reloads.
+        self.assertIn("Fast", user_projection(self.admin.pk)[0])
+        self.assertIsNone(user_projection(0))
+
+    def test_sweep_expired_sessions(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f"old{i}", session_data="", expire_date=now - timedelta(days=1)) for i in range(5)]
+            + [Session(session_key="fresh", session_data="", expire_date=now + timedelta(days=1))]
+        )
+        self.assertEqual(sweep_expired(batch_size=2), 5)
+        self.assertTrue(Session.objects.filter(session_key="fresh").exists())
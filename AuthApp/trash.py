@@ -0,0 +1,275 @@
+"""
+Soft delete into Trash with compact snapshots.
+
+trash_queryset() walks a queryset once in primary-key chunks. For every
+chunk it collects the objects and everything on_delete=CASCADE removes with
+them, writes one Trash row per deleted row and then deletes them, all in one
+transaction. A row's payload is the zlib-compressed JSON list of its
+column values. The column names, and any nested dict/list value such as a
+JSONField, are stored as TrashBlob rows keyed by content hash and
+referenced as {"$blob": digest}, so a value repeated across thousands of
+rows is stored once. restore_batch() rebuilds the objects with
+bulk_create and then does what their signals would have: it reindexes them
+for search and recounts the dashboard rollups and unread counters. Rows that
+on_delete=SET_NULL detached are not re-linked.
+
+Blobs are shared between batches. Every write touches their last_used, and
+sweep_blobs(), run by the archive job, deletes the ones no Trash row refers
+to any more once they have gone unused for TRASH_BLOB_GRACE seconds.
+"""
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from .models import Course, Enrollment, JobPost, Notification, Trash, TrashBlob, User
+from .notifications import delivered
+from .search import index_objects
+from .summaries import reconcile_courses, users_added
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    raise TypeError(f"Cannot snapshot {type(value).__name__}")
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=_encode).encode()
+
+
+class BlobStore:
+    """Collects blobs for one operation and writes each digest at most once."""
+
+    def __init__(self):
+        self.pending = {}
+        self.saved = set()
+        self.loaded = {}
+
+    def put(self, value):
+        raw = _dumps(value)
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in self.saved and digest not in self.pending:
+            self.pending[digest] = zlib.compress(raw)
+        return digest
+
+    def save(self):
+        if self.pending:
+            # Existing blobs are touched rather than skipped, so sweep_blobs()
+            # leaves alone any that this transaction is about to refer to.
+            now = timezone.now()
+            TrashBlob.objects.bulk_create(
+                [TrashBlob(digest=digest, data=data, last_used=now) for digest, data in self.pending.items()],
+                update_conflicts=True, unique_fields=['digest'], update_fields=['last_used'],
+            )
+            self.saved.update(self.pending)
+            self.pending = {}
+
+    def get(self, digest):
+        if digest not in self.loaded:
+            self.load([digest])
+        return self.loaded[digest]
+
+    def load(self, digests):
+        missing = set(digests).difference(self.loaded)
+        if not missing:
+            return
+        for digest, data in TrashBlob.objects.filter(digest__in=missing).values_list('digest', 'data'):
+            self.loaded[digest] = json.loads(zlib.decompress(data))
+
+
+def _is_ref(value):
+    return isinstance(value, dict) and len(value) == 1 and '$blob' in value
+
+
+def _collected(collector):
+    """(model, queryset of its rows) for every model `collector` will delete from."""
+    for model, instances in collector.data.items():
+        yield model, model._base_manager.filter(pk__in=[obj.pk for obj in instances])
+    for queryset in collector.fast_deletes:
+        yield queryset.model, queryset
+
+
+def _snapshots(model, queryset, batch, user, blobs):
+    columns = [field.attname for field in model._meta.concrete_fields]
+    pk_index = columns.index(model._meta.pk.attname)
+    columns_digest = blobs.put(columns)
+    return [
+        Trash(
+            model_name=model._meta.label,
+            object_id=str(row[pk_index]),
+            batch=batch,
+            columns_id=columns_digest,
+            payload=zlib.compress(_dumps([
+                {'$blob': blobs.put(value)} if isinstance(value, (dict, list)) else value
+                for value in row
+            ])),
+            deleted_by=user,
+        )
+        for row in queryset.order_by('pk').values_list(*columns)
+    ]
+
+
+def trash_queryset(queryset, user=None, chunk_size=None):
+    """
+    Snapshot every object of `queryset`, and every row deleted with it by
+    cascade, into Trash and delete them. Returns the batch id to pass to
+    restore_batch().
+    """
+    model = queryset.model
+    chunk_size = chunk_size or settings.TRASH_CHUNK_SIZE
+    using = router.db_for_write(model)
+    keys = queryset.order_by('pk').values_list('pk', flat=True)
+    batch = uuid.uuid4()
+    blobs = BlobStore()
+
+    with transaction.atomic(using=using):
+        last_pk = None
+        while True:
+            pks = list((keys if last_pk is None else keys.filter(pk__gt=last_pk))[:chunk_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            collector = Collector(using=using, origin=queryset)
+            collector.collect(model._base_manager.using(using).filter(pk__in=pks))
+            # A user trashing themselves cannot be recorded as the deleter.
+            deleted_by = user
+            if user is not None and user.pk in {obj.pk for obj in collector.data.get(User, ())}:
+                deleted_by = None
+            entries = []
+            for deleted_model, rows in _collected(collector):
+                entries.extend(_snapshots(deleted_model, rows, batch, deleted_by, blobs))
+            blobs.save()
+            Trash.objects.bulk_create(entries, batch_size=chunk_size)
+            collector.delete()
+    return batch
+
+
+def trash_object(obj, user=None):
+    """Snapshot and delete a single object."""
+    return trash_queryset(type(obj)._base_manager.filter(pk=obj.pk), user)
+
+
+def decode_payload(payload, columns_digest, blobs=None):
+    """The {column: value} dict of a compressed snapshot, JSON-typed."""
+    blobs = blobs or BlobStore()
+    values = json.loads(zlib.decompress(payload))
+    blobs.load([columns_digest] + [value['$blob'] for value in values if _is_ref(value)])
+    values = [blobs.get(value['$blob']) if _is_ref(value) else value for value in values]
+    return dict(zip(blobs.get(columns_digest), values))
+
+
+def snapshot_data(trash):
+    """The deleted object's data for any Trash row, old or new format."""
+    if trash.payload is None:
+        return trash.object_data
+    return decode_payload(trash.payload, trash.columns_id)
+
+
+def _instance(model, data):
+    fields = {}
+    for name, value in data.items():
+        field = model._meta.get_field(name)
+        fields[name] = value if value is None else field.to_python(value)
+    return model(**fields)
+
+
+def _bulk_restore(model, instances):
+    # A raw insert, like loaddata's, so auto_now/auto_now_add fields keep
+    # their snapshotted values instead of being stamped with the current time.
+    fields = model._meta.local_concrete_fields
+    batch_size = connections[router.db_for_write(model)].ops.bulk_batch_size(fields, instances)
+    for start in range(0, len(instances), batch_size):
+        model._base_manager._insert(instances[start:start + batch_size], fields=fields, raw=True)
+
+
+def _restored(by_model):
+    """Bookkeeping the save signals would have done for restored objects."""
+    users = by_model.get(User, [])
+    users_added(users)
+    for model in (User, Course, JobPost):
+        if by_model.get(model):
+            index_objects(by_model[model])
+    course_ids = {course.pk for course in by_model.get(Course, [])}
+    course_ids.update(enrollment.course_id for enrollment in by_model.get(Enrollment, []))
+    if course_ids:
+        transaction.on_commit(lambda: reconcile_courses(course_ids))
+    unread = [notification for notification in by_model.get(Notification, []) if not notification.is_read]
+    if unread:
+        transaction.on_commit(lambda: delivered(unread))
+
+
+def restore_batch(batch, chunk_size=None):
+    """Re-insert every object of a trash batch with bulk_create. Returns the count."""
+    chunk_size = chunk_size or settings.TRASH_CHUNK_SIZE
+    entries = Trash.objects.filter(batch=batch, payload__isnull=False).order_by('pk')
+    blobs = BlobStore()
+    restored = 0
+    # Kept for _restored(); other models need nothing after the insert.
+    tracked = {}
+
+    with transaction.atomic():
+        while True:
+            chunk = list(entries.values_list('pk', 'model_name', 'columns_id', 'payload')[:chunk_size])
+            if not chunk:
+                break
+            by_model = {}
+            for _, model_name, columns_digest, payload in chunk:
+                model = apps.get_model(model_name)
+                by_model.setdefault(model, []).append(
+                    _instance(model, decode_payload(payload, columns_digest, blobs))
+                )
+            for model, instances in by_model.items():
+                _bulk_restore(model, instances)
+                if model in (User, Course, Enrollment, JobPost, Notification):
+                    tracked.setdefault(model, []).extend(instances)
+            Trash.objects.filter(pk__in=[pk for pk, *_ in chunk]).delete()
+            restored += len(chunk)
+        _restored(tracked)
+    return restored
+
+
+def sweep_blobs(chunk_size=None):
+    """
+    Delete the blobs no Trash row refers to, such as those of restored or
+    archived batches. Blobs used in the last TRASH_BLOB_GRACE seconds are
+    kept: a trash_queryset() still running may refer to them once it
+    commits. Returns how many were deleted.
+    """
+    chunk_size = chunk_size or settings.TRASH_CHUNK_SIZE
+    cutoff = timezone.now() - timedelta(seconds=settings.TRASH_BLOB_GRACE)
+    entries = Trash.objects.filter(payload__isnull=False).order_by('pk').values_list('pk', 'columns_id', 'payload')
+    referenced = set()
+    last_pk = None
+    while True:
+        chunk = list((entries if last_pk is None else entries.filter(pk__gt=last_pk))[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+        for _, columns_digest, payload in chunk:
+            referenced.add(columns_digest)
+            referenced.update(value['$blob'] for value in json.loads(zlib.decompress(payload)) if _is_ref(value))
+
+    unused = [
+        digest for digest in TrashBlob.objects.filter(last_used__lt=cutoff).values_list('digest', flat=True).iterator()
+        if digest not in referenced
+    ]
+    deleted = 0
+    for start in range(0, len(unused), chunk_size):
+        # last_used is checked again in case a trash_queryset() touched the blob since.
+        deleted += TrashBlob.objects.filter(digest__in=unused[start:start + chunk_size], last_used__lt=cutoff).delete()[0]
+    return deleted
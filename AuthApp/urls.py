@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('approvals/', views.approval_inbox, name='approval_inbox'),
+    path('dashboard/counts/', views.dashboard_counts, name='dashboard_counts'),
+    path('jobs/<uuid:job_id>/apply/', views.apply_for_job, name='apply_for_job'),
+    path('metrics/', views.metrics_exposition, name='metrics'),
+    path('leave/availability/', views.leave_availability, name='leave_availability'),
+    path('search/', views.search_results, name='search'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
+]
@@ -1,3 +1,205 @@
-from django.shortcuts import render
+import asyncio
+import datetime
+import json
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
+
+from .applications import ApplicationError, DuplicateApplication, ResumeUploadHandler, apply
+from .approvals import approve, inbox, reject
+from .keyset import InvalidCursor
+from .leave import month_availability
+from .metrics import metrics
+from .models import JobPost
+from .notifications import unread_count
+from .permissions import has_role, role_required
+from .pubsub import broker
+from .search import SOURCES, search
+from .summaries import dashboard_summary
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _notification_events(user_id, unread):
+    heartbeat = settings.NOTIFICATION_STREAM_HEARTBEAT
+    with broker.subscribe(user_id) as queue:
+        yield _sse('unread', {'count': unread})
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # A comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse('notification', event, event['id'])
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the user's new notifications.
+
+    Starts with an `unread` event carrying the current count, then sends a
+    `notification` event for each new row. Needs the ASGI entry point;
+    under WSGI each stream would hold a worker thread for good.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Notification streaming requires the ASGI server.", status=501)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    unread = await sync_to_async(unread_count)(user)
+    # The stream outlives the ORM work. Close this request's connection now
+    # rather than holding it (and its page cache) until the client leaves.
+    await sync_to_async(connections.close_all)()
+    response = StreamingHttpResponse(_notification_events(user.pk, unread), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metrics_exposition(request):
+    """
+    This process's request metrics in the Prometheus text format. Scrapers
+    authenticate with `Authorization: Bearer <METRICS_TOKEN>`; admins may
+    also look from a browser session.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if not (token and constant_time_compare(header, f"Bearer {token}")) and not has_role(request.user, 'admin'):
+        raise PermissionDenied
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@role_required('admin', raise_exception=True)
+def dashboard_counts(request):
+    """
+    The admin dashboard's counts as JSON, from the rollup tables in one
+    query. See AuthApp.summaries for how stale they can be.
+    """
+    return JsonResponse(dashboard_summary())
+
+
+@login_required
+def search_results(request):
+    """
+    Ranked search over users, courses and job posts, as JSON. Parameters:
+    q, kind (repeatable), role (repeatable: student, employee:hr) and
+    limit (at most 50). Only what the user may see is returned.
+    """
+    kinds = [kind for kind in request.GET.getlist('kind') if kind in SOURCES]
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    results = search(
+        request.GET.get('q', ''), request.user,
+        kinds=kinds or None, roles=request.GET.getlist('role') or None, limit=limit,
+    )
+    return JsonResponse({'results': results})
+
+
+@role_required('admin', 'employee', raise_exception=True)
+def leave_availability(request):
+    """
+    Staff availability for each day of a month as JSON, from the rollups in
+    one query. Parameters: month (YYYY-MM, default this month) and role
+    (repeatable: employee, employee:hr).
+    """
+    try:
+        month = datetime.datetime.strptime(request.GET['month'], '%Y-%m').date()
+    except (KeyError, ValueError):
+        month = timezone.localdate()
+    return JsonResponse(month_availability(month, roles=request.GET.getlist('role') or None))
+
+
+@login_required
+def approval_inbox(request):
+    """
+    GET: a page of the pending approvals the user may decide, as JSON, with
+    their targets. Parameters: type (repeatable) and cursor.
+    POST: decide the approvals in `id` (repeatable) with decision=approve
+    or reject and an optional note.
+    """
+    if request.method == 'POST':
+        decide = {'approve': approve, 'reject': reject}.get(request.POST.get('decision'))
+        if decide is None:
+            return HttpResponseBadRequest("decision must be approve or reject.")
+        try:
+            result = decide(request.POST.getlist('id'), request.user, note=request.POST.get('note', ''))
+        except ValidationError:
+            return HttpResponseBadRequest("Invalid approval id.")
+        return JsonResponse({
+            'decided': [str(approval.pk) for approval in result.decided],
+            'failed': [{'id': str(approval_id), 'reason': reason} for approval_id, reason in result.failed],
+        })
+    try:
+        page = inbox(request.user, action_types=request.GET.getlist('type') or None, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return JsonResponse({
+        'approvals': [
+            {
+                'id': str(approval.pk),
+                'action_type': approval.action_type,
+                'requested_by': approval.requested_by.username,
+                'timestamp': approval.timestamp,
+                'note': approval.note,
+                'amount': approval.amount,
+                'target_id': approval.target_id,
+                'target': str(approval.target) if approval.target is not None else None,
+            }
+            for approval in page
+        ],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@csrf_exempt
+@require_POST
+def apply_for_job(request, job_id):
+    """
+    Apply for an open job post: applicant_name, applicant_email and an
+    optional resume file, as multipart form data. The resume is streamed to
+    disk rather than read into memory (see AuthApp.applications). 201 with
+    the application's id; 409 when the address has applied already.
+    """
+    # Before anything reads the body, CSRF checking included.
+    request.upload_handlers = [ResumeUploadHandler(request)]
+    return _apply_for_job(request, job_id)
+
+
+@csrf_protect
+def _apply_for_job(request, job_id):
+    job = get_object_or_404(JobPost, pk=job_id)
+    handler = request.upload_handlers[0]
+    name = request.POST.get('applicant_name', '').strip()
+    email = request.POST.get('applicant_email', '').strip()
+    if handler.skipped:
+        return JsonResponse({'error': "The resume is too large."}, status=400)
+    if not name or not email:
+        return JsonResponse({'error': "applicant_name and applicant_email are required."}, status=400)
+    applicant = request.user if request.user.is_authenticated else None
+    try:
+        application = apply(job, name, email, resume=request.FILES.get('resume'), applicant=applicant)
+    except DuplicateApplication as error:
+        return JsonResponse({'error': str(error)}, status=409)
+    except ApplicationError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'id': str(application.pk), 'resume': application.resume.name or None}, status=201)
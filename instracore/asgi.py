@@ -2,6 +2,10 @@
 ASGI config for instracore project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn instracore.asgi:application``) for the notification
+stream at /notifications/stream/, which holds one connection per open page.
+Django keeps a sync thread per open request, so each idle stream still costs
+a parked thread; the view closes its database connection before streaming.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -11,6 +15,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from AuthApp.startup import gc_paused
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instracore.settings')
 
-application = get_asgi_application()
+with gc_paused():
+    application = get_asgi_application()
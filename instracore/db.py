@@ -0,0 +1,84 @@
+"""
+Database profiles for settings.DATABASES, chosen by environment variables.
+
+DB_PROFILE=sqlite (the default)
+    SQLITE_PATH      database file (default BASE_DIR/db.sqlite3)
+    SQLITE_PRAGMAS below are applied on every new connection, and write
+    transactions start with BEGIN IMMEDIATE so concurrent writers queue on
+    busy_timeout instead of failing with "database is locked".
+
+DB_PROFILE=postgres
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    DB_CONN_MAX_AGE  seconds to keep a connection open (default 600)
+    DB_POOL          "1" to use psycopg's connection pool instead of
+                     persistent connections (needs psycopg[pool])
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+"""
+import os
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative means KiB, so 64 MiB
+    'temp_store': 'MEMORY',
+}
+
+
+def _flag(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite_init_command(pragmas=None):
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    return "".join(f"PRAGMA {name}={value};" for name, value in pragmas.items())
+
+
+def sqlite_database(base_dir, environ):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': environ.get('SQLITE_PATH') or base_dir / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': sqlite_init_command(),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+    }
+
+
+def postgres_database(environ):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('DB_NAME', 'instracore'),
+        'USER': environ.get('DB_USER', ''),
+        'PASSWORD': environ.get('DB_PASSWORD', ''),
+        'HOST': environ.get('DB_HOST', ''),
+        'PORT': environ.get('DB_PORT', ''),
+        'OPTIONS': {},
+    }
+    if _flag(environ.get('DB_POOL', '')):
+        from psycopg_pool import ConnectionPool
+
+        # Django refuses persistent connections together with a pool.
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': int(environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Validate pooled connections before handing them out.
+            'check': ConnectionPool.check_connection,
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(environ.get('DB_CONN_MAX_AGE', 600))
+        database['CONN_HEALTH_CHECKS'] = True
+    return database
+
+
+def database_from_env(base_dir, environ=None):
+    environ = os.environ if environ is None else environ
+    profile = environ.get('DB_PROFILE', 'sqlite')
+    if profile == 'sqlite':
+        return sqlite_database(base_dir, environ)
+    if profile == 'postgres':
+        return postgres_database(environ)
+    raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected 'sqlite' or 'postgres'.")
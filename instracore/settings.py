@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db import database_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,27 +44,45 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'AuthApp.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'AuthApp.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'AuthApp.middleware.ActivityLogMiddleware',
+    'AuthApp.middleware.EditHistoryMiddleware',
 ]
 
 ROOT_URLCONF = 'instracore.urls'
 
+AUTH_USER_MODEL = 'AuthApp.User'
+
+# Role permissions come from AuthApp.permissions.MATRIX without queries;
+# per-user and group grants are cached overrides.
+AUTHENTICATION_BACKENDS = [
+    'AuthApp.permissions.RolePermissionBackend',
+]
+
+PERMISSION_CACHE = 'default'
+
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        # AuthApp keeps its templates in TEMPLATES/, which APP_DIRS (looking
+        # for templates/) only finds on case-insensitive filesystems.
+        'DIRS': [BASE_DIR / 'AuthApp' / 'TEMPLATES'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'AuthApp.context_processors.unread_notifications',
             ],
         },
     },
@@ -69,14 +90,29 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'instracore.wsgi.application'
 
+ASGI_APPLICATION = 'instracore.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Chosen with DB_PROFILE=sqlite|postgres; see instracore/db.py for the
+# other variables and the SQLite pragmas.
 
 DATABASES = {
+    'default': database_from_env(BASE_DIR),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process. When running several worker processes on one
+# host, switch to FileBasedCache (or a shared cache server) so every process
+# sees the same unread counters.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'instracore',
     }
 }
 
@@ -117,7 +153,247 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Notifications
+# Audience announcements are queued as NotificationBatch rows and fanned out
+# by a worker thread (or `manage.py notification_worker`) in bulk_create chunks.
+# Per-user unread counts are kept in UNREAD_COUNT_CACHE and adjusted in place.
+# New notifications are pushed to /notifications/stream/ (ASGI only), with a
+# keep-alive comment every NOTIFICATION_STREAM_HEARTBEAT seconds.
+
+NOTIFICATION_BATCH_SIZE = 2000
+
+NOTIFICATION_FANOUT_ASYNC = True
+
+NOTIFICATION_WORKER_POLL_INTERVAL = 5
+
+NOTIFICATION_STREAM_HEARTBEAT = 25
+
+UNREAD_COUNT_CACHE = 'default'
+
+UNREAD_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+# Activity and audit logs
+# log_activity()/log_audit() buffer entries in memory and write them with
+# bulk_create. Entries are journaled to ACTIVITY_LOG_JOURNAL_DIR first so a
+# killed process loses nothing; set it to None to disable the journal.
+
+ACTIVITY_LOG_BUFFERED = True
+
+ACTIVITY_LOG_BUFFER_SIZE = 500
+
+ACTIVITY_LOG_FLUSH_INTERVAL = 2
+
+ACTIVITY_LOG_JOURNAL_DIR = BASE_DIR / 'var' / 'activity-journal'
+
+
+# Retention
+# `manage.py archive_logs` (or the archive_logs job of `manage.py run_jobs`)
+# moves rows older than these windows into gzip JSONL files under ARCHIVE_DIR.
+# Archived trash can be read back but is no longer restorable.
+
+ARCHIVE_DIR = BASE_DIR / 'var' / 'archive'
+
+ARCHIVE_RETENTION_DAYS = {
+    'auditlog': 365,
+    'activitylog': 90,
+    'trash': 90,
+}
+
+ARCHIVE_CHUNK_SIZE = 1000
+
+ARCHIVE_INTERVAL = 60 * 60 * 24
+
+# Trash
+# trash_queryset() snapshots and deletes this many objects per statement.
+# The archive job deletes snapshot blobs no trash row refers to once they
+# have gone unused for TRASH_BLOB_GRACE seconds, which must outlast the
+# longest trash transaction.
+
+TRASH_CHUNK_SIZE = 2000
+
+TRASH_BLOB_GRACE = 60 * 60
+
+
+# Profile images
+# Uploads are validated and re-encoded without metadata in the request;
+# square WebP thumbnails of each PROFILE_IMAGE_SIZES are rendered after
+# commit by a pool of PROFILE_IMAGE_WORKERS processes (None: one per CPU,
+# 0: inline). Use {% profile_image_url user size %} from profile_images.
+
+PROFILE_IMAGE_SIZES = (64, 160, 400)
+
+PROFILE_IMAGE_QUALITY = 80
+
+PROFILE_IMAGE_WORKERS = None
+
+PROFILE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+PROFILE_IMAGE_MAX_PIXELS = 40_000_000
+
+PROFILE_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+# Larger uploads are scaled down to this many pixels on the long side.
+PROFILE_IMAGE_MAX_EDGE = 1600
+
+PROFILE_IMAGE_REBUILD_INTERVAL = 60 * 10
+
+
+# Bulk user import
+# `manage.py import_users` and the admin import validate and bulk_create
+# this many rows at a time, hashing passwords on USER_IMPORT_HASH_WORKERS
+# threads (None: one per CPU).
+
+USER_IMPORT_CHUNK_SIZE = 1000
+
+USER_IMPORT_HASH_WORKERS = None
+
+
+# Dashboard rollups
+# Signals keep the role and course summaries current as changes commit; the
+# reconcile_summaries job of `manage.py run_jobs` recounts them from scratch
+# this often, which bounds how stale the dashboard can be after bulk writes.
+
+SUMMARY_RECONCILE_INTERVAL = 60 * 5
+
+
+# Finance ledger
+# The close_ledger_periods job snapshots each month's totals once it has
+# been over for LEDGER_CLOSE_DELAY seconds, so statements only aggregate
+# the open month and partial months from the ledger itself.
+
+LEDGER_CLOSE_DELAY = 60 * 60
+
+LEDGER_CLOSE_INTERVAL = 60 * 60
+
+
+# Results
+# Grades by percentage of total marks, as (lowest percentage, grade). The
+# lowest band must start at 0.
+
+RESULT_GRADE_BANDS = [(80, 'A+'), (70, 'A'), (60, 'A-'), (50, 'B'), (40, 'C'), (33, 'D'), (0, 'F')]
+
+
+# Leave calendar
+# Leave longer than LEAVE_MAX_DAYS is refused (1024 days at most). The
+# reconcile_leave_calendar job recounts staff availability from the first
+# of last month to LEAVE_CALENDAR_DAYS ahead.
+
+LEAVE_MAX_DAYS = 366
+
+LEAVE_CALENDAR_DAYS = 366
+
+LEAVE_RECONCILE_INTERVAL = 60 * 60
+
+
+# Approvals
+# approve()/reject() decide approvals in transactions of this many.
+
+APPROVAL_BATCH_SIZE = 500
+
+
+# Job applications
+# Resumes stream to disk in chunks of RESUME_UPLOAD_CHUNK_SIZE and are
+# refused past RESUME_MAX_BYTES. Their text is extracted after upload on
+# RESUME_TEXT_WORKERS threads (0: inline) and kept to RESUME_TEXT_MAX_CHARS;
+# the extract_resume_text job catches up on anything missed.
+
+RESUME_MAX_BYTES = 10 * 1024 * 1024
+
+RESUME_UPLOAD_CHUNK_SIZE = 256 * 1024
+
+RESUME_EXTENSIONS = ('.pdf', '.docx', '.doc', '.odt', '.rtf', '.txt')
+
+RESUME_TEXT_WORKERS = 2
+
+RESUME_TEXT_MAX_CHARS = 100_000
+
+RESUME_EXTRACT_INTERVAL = 60 * 10
+
+# Request bodies are held in memory up to this size before spilling to a
+# temporary file; under ASGI that is per request in flight, so many large
+# uploads at once would otherwise hold 2.5 MB each.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+
+# Startup
+# `manage.py profile_startup` measures a worker's cold start; the startup
+# test fails when it takes longer than STARTUP_BUDGET_MS. With
+# STARTUP_FREEZE_GC the WSGI and ASGI entry points pause the cyclic garbage
+# collector while the apps load and then freeze the objects they created
+# out of later collections; management commands and tests are left alone.
+
+STARTUP_BUDGET_MS = 1500
+
+STARTUP_FREEZE_GC = True
+
+
+# Request metrics
+# RequestMetricsMiddleware times every request and, for a
+# METRICS_SAMPLE_RATE fraction of them, also counts CPU time and SQL queries
+# (see AuthApp.metrics). A sampled request with
+# METRICS_DUPLICATE_QUERY_WARNING or more queries repeating earlier SQL is
+# logged. /metrics/ serves the numbers to admins and to scrapers sending
+# `Authorization: Bearer <METRICS_TOKEN>`.
+
+METRICS_SAMPLE_RATE = 0.1
+
+METRICS_DUPLICATE_QUERY_WARNING = 10
+
+METRICS_TOKEN = os.environ.get('INSTRACORE_METRICS_TOKEN', '')
+
+
+# Load testing
+# `manage.py seed_benchmark` fills a database with a synthetic institute;
+# `manage.py loadtest` then drives the URLconf with concurrent clients and
+# compares p50/p95 latency and throughput per scenario with the run saved
+# in LOADTEST_BASELINE (`loadtest --save`), failing when any is worse by
+# more than LOADTEST_TOLERANCE.
+
+LOADTEST_BASELINE = BASE_DIR / 'loadtest-baseline.json'
+
+LOADTEST_TOLERANCE = 0.25
+
+
+# Sessions and authentication
+# Sessions are kept in the database and request.user is found as usual
+# unless INSTRACORE_SESSION_CACHE names a Redis server every process
+# shares (redis://host:6379/1). Then sessions are written to the database
+# and that cache and read from the cache, and
+# CachedAuthenticationMiddleware builds request.user from a slim
+# projection of the user cached there for USER_CACHE_TIMEOUT seconds and
+# dropped when the user is saved (see AuthApp.sessions). A per-process
+# cache would hide a logout, password change or deactivation from the
+# other processes, so a system check rejects LocMemCache for either. The
+# sweep_sessions job deletes expired sessions SESSION_SWEEP_BATCH_SIZE at
+# a time.
+
+SESSION_CACHE_URL = os.environ.get('INSTRACORE_SESSION_CACHE', '')
+
+if SESSION_CACHE_URL:
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SESSION_CACHE_URL,
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    SESSION_CACHE_ALIAS = 'sessions'
+    USER_CACHE = 'sessions'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    USER_CACHE = None
+
+USER_CACHE_TIMEOUT = 60 * 5
+
+SESSION_SWEEP_INTERVAL = 60 * 60
+
+SESSION_SWEEP_BATCH_SIZE = 1000
@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from AuthApp.startup import gc_paused
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instracore.settings')
 
-application = get_wsgi_application()
+with gc_paused():
+    application = get_wsgi_application()